@@ -46,17 +46,20 @@ MAX_LOGIN_ATTEMPTS = 3
 USER_INACTIVITY_TIMEOUT = 900
 OVERRIDE_USER_INACTIVITY_TIMEOUT = True
 
+# Keycloak base URL, differs per stack instance (see docker-compose.yml)
+KEYCLOAK_REALM_URL = os.getenv('AV_KEYCLOAK_URL', 'http://host.docker.internal:8080').rstrip('/') + '/realms/avalanchecms'
+
 OAUTH2_CONFIG = [{
     
     'OAUTH2_NAME': 'Keycloak',
     'OAUTH2_DISPLAY_NAME': 'Keycloak',
     'OAUTH2_CLIENT_ID': 'pgadmin',
     
-    'OAUTH2_TOKEN_URL': 'http://host.docker.internal:8080/realms/avalanchecms/protocol/openid-connect/token',
-    'OAUTH2_AUTHORIZATION_URL': 'http://host.docker.internal:8080/realms/avalanchecms/protocol/openid-connect/auth',
-    'OAUTH2_SERVER_METADATA_URL': 'http://host.docker.internal:8080/realms/avalanchecms/.well-known/openid-configuration',
-    'OAUTH2_USERINFO_ENDPOINT': 'http://host.docker.internal:8080/realms/avalanchecms/protocol/openid-connect/userinfo',
-    'OAUTH2_API_BASE_URL': 'http://host.docker.internal:8080/realms/avalanchecms',
+    'OAUTH2_TOKEN_URL': f'{KEYCLOAK_REALM_URL}/protocol/openid-connect/token',
+    'OAUTH2_AUTHORIZATION_URL': f'{KEYCLOAK_REALM_URL}/protocol/openid-connect/auth',
+    'OAUTH2_SERVER_METADATA_URL': f'{KEYCLOAK_REALM_URL}/.well-known/openid-configuration',
+    'OAUTH2_USERINFO_ENDPOINT': f'{KEYCLOAK_REALM_URL}/protocol/openid-connect/userinfo',
+    'OAUTH2_API_BASE_URL': KEYCLOAK_REALM_URL,
     
     'OAUTH2_SCOPE': 'openid email profile',
     'OAUTH2_AUTO_CREATE_USER': False,
@@ -26,6 +26,9 @@ set -e
 # You need to pass the path to the original entrypoint via AV_ORIGINAL_ENTRYPOINT, 
 # otherwise, /entrypoint.sh is used.
 #
+# Both _FILE options are handled in a single pass over the environment using
+# shell builtins, and the duration of the pre-entrypoint stage is printed.
+#
 # Note: This script is designed to be POSIX sh compliant, to support a wide range 
 # of shells inside 3rd party containers.
 
@@ -35,117 +38,185 @@ set -e
 
 # Functions
 
-# Validate the actual files referenced in _FILE envs
-validate_file_envs() {
+# Sets uptime_ms to the system uptime in milliseconds (10 ms resolution).
+# Reads /proc/uptime with builtins only, empty if unavailable.
+read_uptime_ms() {
 
-    # Skip file checks if AV_SKIP_FILE_CHECKS is set
-    if [ -n "$AV_SKIP_FILE_CHECKS" ]; then
-        echo "Skipping file checks for _FILE environment variables."
-    else
+    uptime_ms=""
 
-        echo "Validating file paths in _FILE environment variables."
+    if [ -r /proc/uptime ]; then
+        read -r uptime_ms _ < /proc/uptime
 
-        total_env_vars=0
-        file_env_vars=0
+        # "12345.67" seconds -> "12345670" ms, without leading zeros
+        uptime_ms="${uptime_ms%.*}${uptime_ms#*.}0"
+        while :; do
+            case $uptime_ms in
+                0?*) uptime_ms=${uptime_ms#0} ;;
+                *) break ;;
+            esac
+        done
+    fi
+}
 
-        # Iterate over all _FILE envs
-        for env_var in $(env); do
+# Scans a file with builtins only, stops after the second line.
+# Sets file_lines (0, 1 or 2 for "more than one"), file_first_line and
+# file_has_content (non-empty if a scanned line has non-whitespace).
+scan_file() {
 
-            var_name=$(echo "$env_var" | cut -d '=' -f 1)
-            var_value=$(echo "$env_var" | cut -d '=' -f 2-)
+    file_lines=0
+    file_first_line=""
+    file_has_content=""
 
-            total_env_vars=$((total_env_vars + 1))
+    while IFS= read -r line || [ -n "$line" ]; do
 
-            case $var_name in
-                *_FILE)
+        file_lines=$((file_lines + 1))
 
-                    if [ -z "$(echo "$var_value" | tr -d '[:space:]')" ]; then
-                        echo "Error: $var_name is blank or whitespace only." >&2
-                        return 1
+        if [ "$file_lines" -eq 1 ]; then
+            file_first_line=$line
+        fi
 
-                    elif [ ! -f "$var_value" ]; then
-                        echo "Error: File in $var_name does not exist." >&2
-                        return 1
+        case $line in
+            *[![:space:]]*) file_has_content=1 ;;
+        esac
 
-                    elif [ ! -r "$var_value" ]; then
-                        echo "Error: File in $var_name is not readable." >&2
-                        return 1
+        if [ "$file_lines" -ge 2 ] && [ -n "$file_has_content" ]; then
+            break
+        fi
+    done < "$1"
+}
 
-                    elif ! grep -q '[^[:space:]]' "$var_value"; then
-                        echo "Error: File in $var_name is empty or all whitespace." >&2
-                        return 1
-                    fi
+# Validates the file referenced in a _FILE env: set, existing, readable and
+# not empty or all whitespace.
+#
+# Arguments:
+#   $1 - Env var name.
+#   $2 - Env var value (file path).
+validate_file_env() {
+
+    case $2 in
+        *[![:space:]]*) ;;
+        *)
+            echo "Error: $1 is blank or whitespace only." >&2
+            return 1
+            ;;
+    esac
 
-                    file_env_vars=$((file_env_vars + 1))
+    if [ ! -f "$2" ]; then
+        echo "Error: File in $1 does not exist." >&2
+        return 1
 
-                    ;;
-            esac
-        done
+    elif [ ! -r "$2" ]; then
+        echo "Error: File in $1 is not readable." >&2
+        return 1
+    fi
 
-        echo "_FILE validation results: total env vars: $total_env_vars, _FILE env vars: $file_env_vars"
+    scan_file "$2"
+
+    if [ -z "$file_has_content" ]; then
+        echo "Error: File in $1 is empty or all whitespace." >&2
+        return 1
     fi
 }
 
-# Load secrets into environment variables if enabled with AV_LOAD_SECRET_ENVS
-load_secret_envs() {
+# Exports the trimmed single-line content of the file referenced in a _FILE
+# env as a new env var without the _FILE suffix.
+#
+# Arguments:
+#   $1 - Env var name.
+#   $2 - Env var value (file path).
+load_secret_env() {
+
+    # Check if file is readable and non-empty
+    if [ ! -r "$2" ] || [ ! -s "$2" ]; then
+        echo "Error: '$1' is unreadable or empty." >&2
+        return 1
+    fi
 
-    # Check if secret env loading is enabled
-    if [ -n "$AV_LOAD_SECRET_ENVS" ]; then
+    scan_file "$2"
 
-        echo "Loading secrets from designated _FILE env vars."
+    # Ensure file has a single non-blank line
+    case $file_first_line in
+        *[![:space:]]*) ;;
+        *) file_lines=0 ;;
+    esac
 
-        total_env_vars=0
-        file_env_vars=0
-        exported_secrets=0        
+    if [ "$file_lines" -ne 1 ]; then
+        echo "Error: '$1' must have 1 non-blank line." >&2
+        return 1
+    fi
 
-        # Iterate over all _FILE envs
-        for env_var in $(env); do
+    # Trim and export the content as a new variable
+    secret=${file_first_line#"${file_first_line%%[![:space:]]*}"}
+    secret=${secret%"${secret##*[![:space:]]}"}
+    export "${1%_FILE}=$secret"
 
-            var_name=$(echo "$env_var" | cut -d '=' -f 1)
-            var_value=$(echo "$env_var" | cut -d '=' -f 2-)
+    exported_secrets=$((exported_secrets + 1))
+}
 
-            total_env_vars=$((total_env_vars + 1))
+# Validates _FILE envs unless AV_SKIP_FILE_CHECKS is set, and loads secrets
+# from them if AV_LOAD_SECRET_ENVS is set. Single pass over the environment,
+# the only subprocess is 'env' itself.
+process_file_envs() {
 
-            case $var_name in
-                *_FILE)
-
-                    file_env_vars=$((file_env_vars + 1))
-
-                    # Filter for PASSWORD and SECRET keywords
-                    if echo "$var_name" | grep -q -e PASSWORD -e SECRET; then
-
-                        # Check if file is non-empty
-                        if [ -s "$var_value" ]; then
-
-                            # Ensure file has a single non-blank line
-                            line_count=$(sed -n '$=' "$var_value")
-                            if [ "$line_count" -eq 1 ] && [ -n "$(sed -n '/^[ \t]*[^ \t]/p;q' "$var_value")" ]; then
-                                
-                                # Trim and export the content as a new variable
-                                new_var_name="${var_name%_FILE}"
-                                var_content_trimmed=$(sed 's/^[ \t]*//;s/[ \t]*$//' "$var_value")
-                                export "$new_var_name=$var_content_trimmed"
-
-                                exported_secrets=$((exported_secrets + 1))
-
-                            else
-                                echo "Error: '$var_name' must have 1 non-blank line." >&2
-                                return 1
-                            fi
-                        else
-                            echo "Error: '$var_name' is unreadable or empty." >&2
-                            return 1
-                        fi
-                    fi
-                    ;;
-            esac
-        done
+    total_env_vars=0
+    file_env_vars=0
+    exported_secrets=0
 
-        echo "_FILE secret loading results: total env vars: $total_env_vars, _FILE env vars: $file_env_vars, secret exports: $exported_secrets"
+    if [ -n "$AV_SKIP_FILE_CHECKS" ]; then
+        echo "Skipping file checks for _FILE environment variables."
+    else
+        echo "Validating file paths in _FILE environment variables."
+    fi
 
+    if [ -n "$AV_LOAD_SECRET_ENVS" ]; then
+        echo "Loading secrets from designated _FILE env vars."
     else
         echo "Skipping secret envs loading."
     fi
+
+    if [ -n "$AV_SKIP_FILE_CHECKS" ] && [ -z "$AV_LOAD_SECRET_ENVS" ]; then
+        return 0
+    fi
+
+    # Split 'env' output on newlines only, without glob expansion
+    saved_ifs=$IFS
+    IFS='
+'
+    set -f
+
+    for env_var in $(env); do
+
+        var_name=${env_var%%=*}
+        total_env_vars=$((total_env_vars + 1))
+
+        # Skip non-_FILE envs and continuation lines of multi-line values
+        case $var_name in
+            *_FILE) ;;
+            *) continue ;;
+        esac
+        case $var_name in
+            [0-9]*|*[!A-Za-z0-9_]*) continue ;;
+        esac
+
+        eval "var_value=\${$var_name}"
+        file_env_vars=$((file_env_vars + 1))
+
+        if [ -z "$AV_SKIP_FILE_CHECKS" ]; then
+            validate_file_env "$var_name" "$var_value" || return 1
+        fi
+
+        # Filter for PASSWORD and SECRET keywords
+        if [ -n "$AV_LOAD_SECRET_ENVS" ]; then
+            case $var_name in
+                *PASSWORD*|*SECRET*) load_secret_env "$var_name" "$var_value" || return 1 ;;
+            esac
+        fi
+    done
+
+    set +f
+    IFS=$saved_ifs
+
+    echo "_FILE processing results: total env vars: $total_env_vars, _FILE env vars: $file_env_vars, secret exports: $exported_secrets"
 }
 
 # Execute custom script if AV_CUSTOM_SCRIPT is defined
@@ -170,15 +241,24 @@ exec_custom_script() {
 # Main
 main() {
 
-    # Validate file envs unless AV_SKIP_FILE_CHECKS is set
-    validate_file_envs
+    read_uptime_ms
+    stage_start_ms=$uptime_ms
 
-    # Load secrets from files if AV_LOAD_SECRET_ENVS is set
-    load_secret_envs
+    # Validate file envs unless AV_SKIP_FILE_CHECKS is set, and load secrets
+    # from files if AV_LOAD_SECRET_ENVS is set
+    process_file_envs
+
+    read_uptime_ms
+    env_done_ms=$uptime_ms
 
     # Execute custom script if AV_CUSTOM_SCRIPT is set
     exec_custom_script
 
+    read_uptime_ms
+    if [ -n "$stage_start_ms" ] && [ -n "$uptime_ms" ]; then
+        echo "Pre-entrypoint stage took $((uptime_ms - stage_start_ms)) ms (env processing: $((env_done_ms - stage_start_ms)) ms)"
+    fi
+
     # Echo the app name, original entrypoint and passed arguments, if any
     echo "Starting ${AV_APP_NAME} using ${AV_ORIGINAL_ENTRYPOINT}"
     if [ $# -ne 0 ]; then
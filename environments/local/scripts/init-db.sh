@@ -1,6 +1,8 @@
 # Script automates PostgreSQL setup for Avalanche CMS and Keycloak.
 # Executed in initialization, mounted at /docker-entrypoint-initdb.d/.
 # Retrieves user passwords from secret files securely.
+# All databases and users are created over a single psql connection, and
+# existing ones are skipped, so a rerun on a partially set up volume is safe.
 
 #!/bin/bash
 set -eou pipefail
@@ -34,44 +36,61 @@ read_secret_from_file() {
     }
 }
 
-# Creates a PostgreSQL database and a user with a password from a secret file.
+# Quotes a value for a psql meta-command argument: backslashes and single
+# quotes are escaped inside single quotes.
 #
 # Arguments:
-#   $1 - Database name to create.
-#   $2 - Username for managing the database.
-#   $3 - Path to secret file with user's password.
+#   $1 - Value to quote.
 #
-# Returns:
-#   0 on success, non-zero on error (e.g., psql command failure, unreadable secret).
-create_db_and_user() {
-
-    local db_name=$1
-    local user_name=$2
-    local secret_file=$3
-
-    echo "Creating '$db_name' database, '$user_name' user, and setting privileges..."
-
-    # Retrieve the secret password
-    local db_password=$(read_secret_from_file "$secret_file") || exit 1
-
-    # execute PostgreSQL commands
-    psql -v ON_ERROR_STOP=1 --dbname "$POSTGRES_DB" --username "$POSTGRES_USER" <<EOSQL
-        CREATE USER $user_name WITH PASSWORD '$db_password';
-        CREATE DATABASE $db_name;
-        ALTER DATABASE $db_name OWNER TO $user_name;
-        GRANT ALL PRIVILEGES ON DATABASE $db_name TO $user_name;
-        GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO $user_name;
-        ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON TABLES TO $user_name;
+# Outputs:
+#   Quoted value, e.g. 'it''s'.
+#
+psql_quote() {
+    local value=${1//\\/\\\\}
+    echo "'${value//\'/\'\'}'"
+}
+
+# Appends idempotent SQL for one database and its user to the bootstrap
+# script. Values are passed as psql variables, never spliced into SQL.
+#
+# Arguments:
+#   $1 - Index of the database, suffix of its psql variables.
+#
+# Outputs:
+#   SQL for the database, psql variables db_<n>, user_<n>, password_<n>.
+#
+generate_db_sql() {
+
+    local n=$1
+
+    cat <<EOSQL
+\echo Creating database :'db_$n', user :'user_$n', and setting privileges...
+SELECT format('CREATE ROLE %I WITH LOGIN', :'user_$n')
+    WHERE NOT EXISTS (SELECT FROM pg_roles WHERE rolname = :'user_$n') \gexec
+SELECT format('ALTER ROLE %I WITH PASSWORD %L', :'user_$n', :'password_$n') \gexec
+SELECT format('CREATE DATABASE %I OWNER %I', :'db_$n', :'user_$n')
+    WHERE NOT EXISTS (SELECT FROM pg_database WHERE datname = :'db_$n') \gexec
+SELECT format('ALTER DATABASE %I OWNER TO %I', :'db_$n', :'user_$n') \gexec
+SELECT format('GRANT ALL PRIVILEGES ON DATABASE %I TO %I', :'db_$n', :'user_$n') \gexec
+SELECT format('GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO %I', :'user_$n') \gexec
+SELECT format('ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON TABLES TO %I', :'user_$n') \gexec
 EOSQL
 }
 
+# Current time in milliseconds, from bash's EPOCHREALTIME (no fork).
+now_ms() {
+    local now=${EPOCHREALTIME/[.,]/}
+    echo $(( now / 1000 ))
+}
+
 # Normalizes strings: lowercase, spaces to underscores
 #
 # Returns:
 #   Normalized input string
 #
 normalize_input() {
-    echo "$1" | tr '[:upper:]' '[:lower:]' | tr ' ' '_'
+    local value=${1,,}
+    echo "${value// /_}"
 }
 
 # Generates DB username from DB type, DB name, app name
@@ -97,30 +116,45 @@ generate_db_username() {
 main() {
 
     secrets_dir="/run/secrets/avalanchecms"
-    files_found=false
+    started_ms=$(now_ms)
 
-    # Create DBs and users for postgres-<dbname>-db-user-secret.env files
+    local psql_vars=()
+    local sql=""
+    local count=0
+
+    # Collect DBs and users for postgres-<dbname>-db-user-secret.env files
     for file in "$secrets_dir"/postgres-*-db-user-secret.env; do
 
         if [ -e "$file" ]; then
-            files_found=true
-
-            db_name=$(echo "$file" | sed -n 's|.*/postgres-\(.*\)-db-user-secret.env|\1|p')
-            if [ -n "$db_name" ]; then
 
-                create_db_and_user "${db_name}" "$(generate_db_username "${db_name}")" "${file}"
+            db_name=${file##*/postgres-}
+            db_name=${db_name%-db-user-secret.env}
 
-            else
+            if [ -z "$db_name" ]; then
                 echo "Database name extraction failed: $file"
                 return 1
             fi
+
+            count=$((count + 1))
+            db_password=$(read_secret_from_file "$file") || return 1
+
+            # passwords are set in the script on stdin, argv is visible to other processes
+            psql_vars+=(-v "db_$count=$db_name" -v "user_$count=$(generate_db_username "$db_name")")
+            sql+="\\set password_$count $(psql_quote "$db_password")"$'\n'
+            sql+=$(generate_db_sql "$count")$'\n'
         fi
     done
 
     # Check for no files post-loop
-    if [ "$files_found" = false ]; then
+    if [ "$count" -eq 0 ]; then
         echo "No matches in $secrets_dir."
+        return 0
     fi
+
+    # Bootstrap all databases over a single connection
+    psql -v ON_ERROR_STOP=1 "${psql_vars[@]}" --dbname "$POSTGRES_DB" --username "$POSTGRES_USER" <<< "$sql"
+
+    echo "Provisioned $count database(s) in $(( $(now_ms) - started_ms )) ms."
 }
 
 main "$@"
@@ -0,0 +1,78 @@
+"""
+Avalanche CMS local stack command line.
+
+Single entry point for the lifecycle scripts, e.g. 'python avalanche.py
+start -c -d'. A subcommand's module is imported only when it runs: 'stop'
+and 'status' don't load setup's hashing or the image pull code, and the
+command list and completion don't load any of them. Options are those of
+the scripts, see 'python avalanche.py <command> --help'. Runs from any
+directory, commands run in scripts/local like the scripts themselves.
+
+Commands:
+- setup: Sets up secrets and generated configs (setup.py).
+- start: Starts the stack and waits until it is ready (start.py).
+- stop: Stops or suspends the stack (stop.py).
+- cleanup: Removes containers, volumes and secrets (cleanup.py).
+- pull: Pulls, exports or loads Docker images (pull.py).
+- status: Shows service status and ports (status.py).
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+# Subcommand to module and summary, modules provide cli(argv)
+COMMANDS = {
+    "setup": ("setup", "Sets up secrets and generated configs."),
+    "start": ("start", "Starts the stack and waits until it is ready."),
+    "stop": ("stop", "Stops or suspends the stack."),
+    "cleanup": ("cleanup", "Removes containers, volumes and secrets."),
+    "pull": ("pull", "Pulls, exports or loads Docker images."),
+    "status": ("status", "Shows service status and ports.")
+}
+
+def parse_args(argv=None):
+
+    """
+    Splits the command line into subcommand and its arguments, which are
+    left to its module. Prints the help or an error and exits unless the
+    first argument is a subcommand.
+
+    Returns tuple (command, argv).
+    """
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+
+    if argv and argv[0] in COMMANDS:
+        return argv[0], argv[1:]
+
+    parser = argparse.ArgumentParser(description="Avalanche CMS local stack.")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+    for command, (_, summary) in COMMANDS.items():
+        subparsers.add_parser(command, help=summary)
+
+    parser.parse_args(argv[:1]) # exits with help or error
+    parser.error(f"invalid command: {argv[0]}")
+
+def run(command, argv):
+
+    """
+    Imports the subcommand's module and runs it with 'argv'. Its help and
+    errors show 'avalanche.py <command>' as program name. The scripts read
+    './config' and './bench' relative to their directory, so it becomes the
+    working directory.
+    """
+
+    module_name, _ = COMMANDS[command]
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    sys.argv = [f"{os.path.basename(sys.argv[0])} {command}", *argv]
+
+    module = importlib.import_module(module_name)
+    module.cli(argv)
+
+if __name__ == "__main__":
+    command, argv = parse_args()
+    run(command, argv)
@@ -0,0 +1,98 @@
+"""
+fake_docker.py
+
+Stand-in for the 'docker' and 'docker-compose' executables, used by
+benchmark.py. Records every invocation and simulates latency, no Docker
+engine is needed.
+
+Environment:
+- AV_FAKE_DOCKER_LOG: JSONL file, one line per invocation (required).
+- AV_FAKE_DOCKER_LATENCY: Default latency per call in seconds (default: 0.05).
+- AV_FAKE_DOCKER_LATENCIES: JSON object of per-command latencies, keyed by
+  the first argument(s), e.g. '{"pull": 0.5, "compose up": 1.0}'.
+"""
+
+import json
+import os
+import sys
+import time
+
+# Volumes reported by 'docker volume ls'
+FAKE_VOLUMES = ["avalanchecms_postgres-data"]
+
+# Flags followed by a value, e.g. 'docker compose -p <project> up'
+VALUE_FLAGS = ("-p", "--project-name", "--env-file", "-f", "--file", "--filter", "--format", "--label")
+
+def command_key(argv):
+
+    """
+    Returns the command key, e.g. 'pull' or 'compose up'. The standalone
+    'docker-compose' binary is mapped to 'compose'.
+    """
+
+    name = os.path.basename(argv[0])
+    args = []
+    skip = False
+    for arg in argv[1:]:
+        if not skip and not arg.startswith('-'):
+            args.append(arg)
+        skip = arg in VALUE_FLAGS
+
+    if name.startswith("docker-compose"):
+        args = ["compose"] + args
+
+    if args and args[0] in ("compose", "volume", "image", "container"):
+        return " ".join(args[:2])
+
+    return args[0] if args else ""
+
+def latency_for(key):
+
+    """
+    Looks up the simulated latency for a command key.
+    """
+
+    latencies = json.loads(os.environ.get("AV_FAKE_DOCKER_LATENCIES", "{}"))
+    default = float(os.environ.get("AV_FAKE_DOCKER_LATENCY", "0.05"))
+
+    # most specific key wins, 'compose up' before 'compose'
+    for candidate in (key, key.split(' ')[0]):
+        if candidate in latencies:
+            return float(latencies[candidate])
+
+    return default
+
+def respond(key):
+
+    """
+    Writes a plausible response for the command. Returns the exit code.
+    """
+
+    if key == "volume ls":
+        print("\n".join(FAKE_VOLUMES))
+    elif key == "image inspect":
+        print("Error: No such image", file=sys.stderr)
+        return 1
+    elif key == "inspect":
+        print(json.dumps({"Status": "running", "Health": {"Status": "healthy"}}))
+    elif key == "compose logs":
+        service = sys.argv[-1]
+        print(f"{service} INFO started\n{service} WARNING slow\n{service} ERROR failed\n  at stack frame")
+    elif key == "save":
+        sys.stdout.write("fake image archive\n")
+
+    return 0
+
+def main():
+
+    key = command_key(sys.argv)
+
+    with open(os.environ["AV_FAKE_DOCKER_LOG"], 'a') as log:
+        log.write(json.dumps({"ts": time.time(), "key": key, "argv": sys.argv[1:]}) + "\n")
+
+    time.sleep(latency_for(key))
+
+    sys.exit(respond(key))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Benchmarks the Avalanche CMS local stack scripts.
+
+Runs setup.py, pull.py, start.py, stop.py and cleanup.py against a fake
+'docker' executable (./bench/fake_docker.py) in a sandbox copy of the
+project, so no Docker engine is needed and no real secrets are touched.
+Reports wall time, docker subprocess count and hashing time per phase, and
+fails if a phase exceeds the baseline by more than the margin, or if there
+is no baseline. Baselines record the host and latency they were taken with,
+a run on another host or with another latency is compared with a warning.
+
+Options:
+- -m, --margin: Allowed relative regression over the baseline (default: 0.25).
+- -l, --latency: Simulated latency per docker call in seconds (default: 0.05).
+- -u, --update-baseline: Writes the results as new baseline.
+- -o, --output: Writes the results as JSON to a file.
+
+Note: Requires a POSIX shell for the fake executables (Linux, macOS, WSL).
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from utils.output import print
+
+# Baseline results, compared on every run
+BASELINE_PATH = './bench/baseline.json'
+
+# Lifecycle phases, run in order in the same sandbox: (name, script, args)
+PHASES = [
+    ("setup", "setup.py", ["-a"]),
+    ("setup-rerun", "setup.py", ["-a"]),
+    ("pull", "pull.py", []),
+    ("start", "start.py", ["-d"]),
+    ("stop", "stop.py", []),
+    ("cleanup", "cleanup.py", []),
+    ("start-clean", "start.py", ["-c", "-d", "-ip"]),
+]
+
+# Metrics compared against the baseline
+METRICS = ("wall_seconds", "subprocesses", "hash_seconds")
+
+# Absolute slack per metric, keeps near-zero baselines from flagging noise
+METRIC_SLACK = {"wall_seconds": 0.1, "subprocesses": 0, "hash_seconds": 0.05}
+
+def create_sandbox(root):
+
+    """
+    Copies scripts and the local environment into a sandbox project root.
+
+    Returns the sandboxed 'scripts/local' directory.
+    """
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    ignore = shutil.ignore_patterns('__pycache__', '*.pyc')
+
+    shutil.copytree(script_dir, os.path.join(root, 'scripts', 'local'), ignore=ignore)
+    shutil.copytree(os.path.join(project_root, 'environments', 'local'),
+                    os.path.join(root, 'environments', 'local'), ignore=ignore)
+
+    return os.path.join(root, 'scripts', 'local')
+
+def install_fake_docker(bin_dir, sandbox_dir):
+
+    """
+    Installs 'docker' and 'docker-compose' wrappers around fake_docker.py.
+    """
+
+    os.makedirs(bin_dir)
+    fake_docker = os.path.join(sandbox_dir, 'bench', 'fake_docker.py')
+
+    for name in ("docker", "docker-compose"):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w', newline='\n') as file:
+            file.write(f'#!/bin/sh\nexec "{sys.executable}" "{fake_docker}" "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+def count_lines(path):
+
+    """
+    Counts lines of a file, 0 if it does not exist.
+    """
+
+    try:
+        with open(path, 'r') as file:
+            return sum(1 for _ in file)
+    except FileNotFoundError:
+        return 0
+
+def run_phase(sandbox_dir, env, script, args):
+
+    """
+    Runs one lifecycle script via bench/runner.py and measures it.
+
+    Returns dict of metrics, raises RuntimeError if the script fails.
+    """
+
+    log_path = env["AV_FAKE_DOCKER_LOG"]
+    result_path = env["AV_BENCH_RESULT"]
+    calls_before = count_lines(log_path)
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join('bench', 'runner.py'), script, *args],
+                            cwd=sandbox_dir, env=env, stdin=subprocess.DEVNULL,
+                            capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start
+
+    if result.returncode != 0:
+        raise RuntimeError(f"{script} {' '.join(args)} failed:\n{result.stdout}{result.stderr}")
+
+    with open(result_path, 'r') as file:
+        hashing = json.load(file)
+
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "subprocesses": count_lines(log_path) - calls_before,
+        "hash_calls": hashing["hash_calls"],
+        "hash_seconds": round(hashing["hash_seconds"], 3)
+    }
+
+def run_benchmark(latency):
+
+    """
+    Runs all phases in a fresh sandbox.
+
+    Returns dict of phase name to metrics.
+    """
+
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix='avalanchecms-bench-') as root:
+
+        sandbox_dir = create_sandbox(root)
+        bin_dir = os.path.join(root, 'bin')
+        install_fake_docker(bin_dir, sandbox_dir)
+
+        env = os.environ.copy()
+        env["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+        env["DOCKER_HOST"] = "unix://" + os.path.join(root, 'no-engine.sock') # force CLI path
+        env["AV_FAKE_DOCKER_LOG"] = os.path.join(root, 'docker-calls.jsonl')
+        env["AV_FAKE_DOCKER_LATENCY"] = str(latency)
+        env["AV_BENCH_RESULT"] = os.path.join(root, 'result.json')
+
+        for name, script, args in PHASES:
+            print(f"Running phase: {name}")
+            results[name] = run_phase(sandbox_dir, env, script, args)
+
+    return results
+
+def compare_to_baseline(results, baseline, margin, metrics=METRICS, slack=METRIC_SLACK):
+
+    """
+    Compares results to the baseline, per phase and metric.
+
+    Returns list of regression messages, empty if within margin.
+    """
+
+    regressions = []
+
+    for name, values in results.items():
+        for metric in metrics:
+
+            expected = baseline.get(name, {}).get(metric)
+            if expected is None:
+                continue
+
+            limit = expected * (1 + margin) + slack[metric]
+            if values[metric] > limit:
+                regressions.append(f"{name}: {metric} {values[metric]} exceeds baseline {expected} (limit {limit:.3f})")
+
+    return regressions
+
+def print_report(results, baseline):
+
+    """
+    Prints a table of results, with baseline values in parentheses.
+    """
+
+    print(f"{'phase':<14}{'wall [s]':>18}{'subprocesses':>18}{'hashing [s]':>18}")
+
+    for name, metrics in results.items():
+        expected = baseline.get(name, {})
+        cells = []
+        for metric in METRICS:
+            value = metrics[metric]
+            cells.append(f"{value} ({expected[metric]})" if metric in expected else f"{value}")
+        print(f"{name:<14}" + "".join(f"{cell:>18}" for cell in cells))
+
+def host_info():
+
+    """
+    Describes the host, recorded with baselines: results are host-specific.
+    """
+
+    return {
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": sys.version.split()[0]
+    }
+
+def read_baseline(path=BASELINE_PATH):
+
+    """
+    Reads the baseline, dict with 'phases', 'host' and the settings it was
+    taken with. Empty if there is none.
+    """
+
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def write_baseline(results, path=BASELINE_PATH, **settings):
+
+    """
+    Writes results as baseline, with the host and settings, e.g. latency.
+    """
+
+    with open(path, 'w', newline='\n') as file:
+        json.dump({**settings, "host": host_info(), "phases": results}, file, indent=2)
+        file.write('\n')
+    print(f"Baseline updated: {path}")
+
+def check_baseline(baseline, path=BASELINE_PATH, **settings):
+
+    """
+    Exits with 1 if there is no baseline, a gate without one never fails.
+    Warns if the baseline was taken on another host or with other settings.
+    """
+
+    if not baseline:
+        print(f"Error: No baseline at {path}, run with '--update-baseline' on this host to create one.", level="error")
+        sys.exit(1)
+
+    if baseline.get("host") != host_info():
+        print(f"Warning: Baseline taken on another host ({baseline.get('host', 'unknown')}), "
+              "results may not be comparable. Run with '--update-baseline' to replace it.", level="warning")
+
+    for name, value in settings.items():
+        if baseline.get(name) != value:
+            print(f"Warning: Baseline taken with {name} {baseline.get(name)}, not {value}.", level="warning")
+
+def main(margin=0.25, latency=0.05, update_baseline=False, output=None):
+
+    """
+    Runs the benchmark, exits with 1 on regressions or without baseline.
+    """
+
+    print(f"Benchmarking lifecycle scripts (docker latency: {latency}s).")
+
+    try:
+        results = run_benchmark(latency)
+    except RuntimeError as e:
+        print(f"Benchmark failed: {e}")
+        sys.exit(1)
+
+    baseline = read_baseline()
+    print_report(results, baseline.get("phases", {}))
+
+    if output:
+        with open(output, 'w', newline='\n') as file:
+            json.dump({"latency": latency, "host": host_info(), "phases": results}, file, indent=2)
+
+    if update_baseline:
+        write_baseline(results, latency=latency)
+        return
+
+    check_baseline(baseline, latency=latency)
+
+    regressions = compare_to_baseline(results, baseline["phases"], margin)
+
+    if regressions:
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1)
+
+    print(f"All phases within {margin:.0%} of baseline.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Avalanche CMS local stack script benchmark.")
+    parser.add_argument('-m', '--margin', type=float, default=0.25, help="Allowed regression over baseline (default: 0.25).")
+    parser.add_argument('-l', '--latency', type=float, default=0.05, help="Simulated docker call latency in seconds.")
+    parser.add_argument('-u', '--update-baseline', action='store_true', help="Writes results as new baseline.")
+    parser.add_argument('-o', '--output', type=str, help="Writes results as JSON to a file.")
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(margin=args.margin, latency=args.latency, update_baseline=args.update_baseline, output=args.output)
@@ -0,0 +1,93 @@
+"""
+Calibrates the password hashing cost of the Avalanche CMS local stack.
+
+Benchmarks the PBKDF2 variants Keycloak supports on this host, picks the
+iterations meeting a time budget per hash and records the chosen algorithm
+in ./config/hash_cost.json. setup.py hashes user secrets with it and sets
+it as the realm's password policy, so Keycloak verifies logins at the same
+cost. Run setup.py afterwards: hash files are re-hashed, secrets are kept.
+
+A smaller budget raises load-test login throughput, a larger one makes
+leaked hashes harder to crack; the table shows both sides per algorithm.
+
+Options:
+- -t, --target-ms: Time budget per hash in milliseconds (default: 25).
+- -a, --algorithm: Algorithm to record (default: pbkdf2-sha256).
+- -r, --rounds: Measurements per algorithm, the median counts (default: 5).
+- -n, --dry-run: Prints the results without recording them.
+"""
+
+import argparse
+import os
+import sys
+from utils import hashcost
+from utils import output
+from utils.output import emit, print
+from utils import tracing
+
+def print_results(results, target_ms):
+
+    """
+    Prints per algorithm the calibrated iterations, the measured time per
+    hash and the resulting logins per second on one core and on all cores.
+    """
+
+    cpus = os.cpu_count() or 1
+
+    print(f"Target: {target_ms:g} ms per hash, {cpus} CPU(s).")
+    print(f"{'algorithm':<16}{'iterations':>12}{'ms/hash':>10}{'us/iter':>10}{'logins/s/core':>15}{'logins/s':>10}")
+
+    for algorithm, result in results.items():
+        per_core = 1000 / result["ms_per_hash"]
+        print(f"{algorithm:<16}{result['iterations']:>12}{result['ms_per_hash']:>10.1f}{result['us_per_iteration']:>10.3f}"
+              f"{per_core:>15.0f}{per_core * cpus:>10.0f}")
+
+def main(target_ms=hashcost.DEFAULT_TARGET_MS, algorithm=hashcost.DEFAULT_ALGORITHM, rounds=5, dry_run=False):
+
+    """
+    Calibrates all algorithms and records the chosen one unless 'dry_run'.
+    """
+
+    if target_ms <= 0:
+        print("Error: Target must be positive.", level="error")
+        sys.exit(1)
+
+    print(f"Calibrating password hashing ({', '.join(hashcost.ALGORITHMS)}).")
+
+    with tracing.phase("calibrate", category="hashing"):
+        results = hashcost.calibrate(target_ms, rounds=rounds)
+
+    print_results(results, target_ms)
+
+    chosen = results[algorithm]
+    if chosen["iterations"] == hashcost.MIN_ITERATIONS and chosen["ms_per_hash"] > target_ms:
+        print(f"Warning: {algorithm} exceeds the target at the minimum of {hashcost.MIN_ITERATIONS} iterations.",
+              level="warning")
+
+    if dry_run:
+        print("Dry run, nothing recorded.")
+        return
+
+    hashcost.write_cost(algorithm, target_ms, results)
+    emit("hash_cost", f"Hash cost recorded: {algorithm}, {chosen['iterations']} iterations "
+         f"({chosen['ms_per_hash']:.1f} ms), {hashcost.COST_FILE_PATH}. Run setup.py to apply.",
+         algorithm=algorithm, iterations=chosen["iterations"], ms_per_hash=chosen["ms_per_hash"], results=results)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Avalanche CMS local password hashing calibration.")
+    parser.add_argument('-t', '--target-ms', type=float, default=hashcost.DEFAULT_TARGET_MS,
+                        help=f"Time budget per hash in ms (default: {hashcost.DEFAULT_TARGET_MS:g}).")
+    parser.add_argument('-a', '--algorithm', choices=list(hashcost.ALGORITHMS), default=hashcost.DEFAULT_ALGORITHM,
+                        help=f"Algorithm to record (default: {hashcost.DEFAULT_ALGORITHM}).")
+    parser.add_argument('-r', '--rounds', type=int, default=5, help="Measurements per algorithm (default: 5).")
+    parser.add_argument('-n', '--dry-run', action='store_true', help="Prints results without recording them.")
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
+    main(target_ms=args.target_ms, algorithm=args.algorithm, rounds=args.rounds, dry_run=args.dry_run)
@@ -7,76 +7,135 @@ optional retention of volumes and secrets.
 Options:
 - -kv, --keep-volumes: Retain Docker volumes.
 - -ks, --keep-secrets: Retain '.secrets'.
+- -i, --instance: Cleans an isolated stack instance, others are untouched.
+- -q, --quiet / --json / --flush: Output options, see utils/output.py.
 """
 
 import argparse
 import os
-import re
 import shutil
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from utils.decorators import require_docker_running
-from utils.output import print
+from utils.engine import DockerEngineError, get_engine
+from utils import instance
+from utils import output
+from utils.output import emit, print
+from utils import tracing
+from utils.tracing import traced
+
+# Label set on all stack volumes in docker-compose.yml
+STACK_VOLUME_LABEL = "com.github.cmaksymenko.avalanchecms.stack=local"
+
+# Max concurrent volume removal requests
+VOLUME_REMOVAL_WORKERS = 8
 
 @require_docker_running
-def get_docker_volumes():
+def get_docker_volumes(label=None):
 
     """
-    Fetches Docker volume names.
+    Fetches Docker volume names, filtered engine-side by label if given.
+
+    Args:
+        label (str or list, optional): Label filter, 'key' or 'key=value',
+            volumes must match all labels of a list.
 
     Returns list of names or empty list on failure.
     """
 
-    result = subprocess.run(["docker", "volume", "ls", "-q"], capture_output=True, text=True)
+    labels = [label] if isinstance(label, str) else list(label or [])
+
+    engine = get_engine()
+
+    if engine is not None:
+        try:
+            filters = {"label": labels} if labels else None
+            return [volume["Name"] for volume in engine.list_volumes(filters=filters)]
+        except DockerEngineError as e:
+            print(f"Error listing Docker volumes: {e}", level="error")
+            return []
+
+    command = ["docker", "volume", "ls", "-q"]
+    for label in labels:
+        command += ["--filter", f"label={label}"]
+
+    result = tracing.run(command, capture_output=True, text=True)
 
     if result.returncode != 0:
-        print("Error listing Docker volumes")
+        print("Error listing Docker volumes", level="error")
         return []  # return empty on failure
 
     # return list of volume names
     return result.stdout.splitlines()
 
+def get_stack_volumes():
+
+    """
+    Fetches the volumes of the selected instance's stack: labeled with
+    STACK_VOLUME_LABEL and its Compose project. Volumes created before the
+    stack label only carry the Compose labels, they are matched by project.
+
+    Returns list of names.
+    """
+
+    project_label = f"com.docker.compose.project={instance.project_name()}"
+
+    volumes = get_docker_volumes(label=[STACK_VOLUME_LABEL, project_label])
+    unlabeled = [volume for volume in get_docker_volumes(label=project_label) if volume not in volumes]
+
+    if unlabeled:
+        print(f"Volumes without stack label, matched by project: {', '.join(unlabeled)}")
+
+    return volumes + unlabeled
+
 @require_docker_running
 def remove_volumes(volumes):
     
     """
-    Removes specified Docker volumes.
+    Removes specified Docker volumes in one batch: concurrent engine requests,
+    or a single 'docker volume rm' without engine socket.
 
     Args:
         volumes (list): Volumes to remove.
     """
 
-    for volume in volumes:
-        
-        print(f"Removing volume {volume}...")
-        
-        # remove volume
-        subprocess.run(["docker", "volume", "rm", volume], check=True)
-        
-        print(f"Removed volume {volume}")
+    engine = get_engine()
+
+    print(f"Removing volumes: {', '.join(volumes)}")
+
+    if engine is not None:
+        with ThreadPoolExecutor(max_workers=min(len(volumes), VOLUME_REMOVAL_WORKERS)) as executor:
+            list(executor.map(engine.remove_volume, volumes)) # re-raises first failure
+    else:
+        tracing.run(["docker", "volume", "rm", *volumes], check=True, stdout=subprocess.DEVNULL)
 
+@traced
 def purge_avalanchecms_volumes():
     
     """
-    Purges all Avalanche CMS Docker volumes.
+    Purges all Docker volumes labeled as part of the Avalanche CMS stack,
+    of the selected instance's Compose project only.
     """
     
     print("Removing Docker volumes.")
 
-    volumes = get_docker_volumes() # Get all Docker volumes
-    pattern = re.compile('avalanchecms_.*') # regex
+    start = time.perf_counter()
 
-    # filter volumes matching the regex
-    filtered_volumes = [volume for volume in volumes if pattern.match(volume)]
+    volumes = get_stack_volumes()
 
-    if not filtered_volumes:
-        print("No volumes match the pattern: avalanchecms_.*")
+    if not volumes:
+        print(f"No volumes of project {instance.project_name()}.")
         return
 
-    remove_volumes(filtered_volumes)
+    remove_volumes(volumes)
     
-    print("Docker volumes removed.")
+    elapsed = time.perf_counter() - start
+    emit("volumes_removed", f"Docker volumes removed: {len(volumes)} in {elapsed:.1f}s.",
+         volumes=volumes, seconds=round(elapsed, 3))
 
+@traced
 @require_docker_running
 def purge_docker_environment(keep_volumes=False):
     
@@ -91,45 +150,37 @@ def purge_docker_environment(keep_volumes=False):
         
         print("Stopping/removing Docker containers and networks.")
         
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        env_dir = os.path.join(script_dir, '../../environments/local')
-        original_dir = os.getcwd()
-
-        os.chdir(env_dir) # change to docker compose dir
-
-        # stop/remove containers and networks
-        subprocess.run(["docker", "compose", "down"], check=True)
+        # stop/remove containers and networks, run in the docker compose dir
+        tracing.run(instance.compose_command("down"), check=True, cwd=instance.env_dir())
         
-        print("Docker containers and networks stopped/removed.")
+        emit("containers_removed", "Docker containers and networks stopped/removed.")
 
         if keep_volumes:
             print("Volume purge skipped.")
         else:
             purge_avalanchecms_volumes()  # purge volumes by default
 
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to purge Docker environment: {e}")
+    except (subprocess.CalledProcessError, DockerEngineError) as e:
+        print(f"Failed to purge Docker environment: {e}", level="error")
         sys.exit(1)
 
-    finally:
-        os.chdir(original_dir) # return to original dir
-
 def remove_secret_folder():
     
     """
-    Removes the '.secrets' directory if it exists.
+    Removes the '.secrets' directory (of the selected instance) if it exists.
     """
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    secrets_dir = os.path.join(script_dir, '../../.secrets')
+    secrets_dir = instance.secrets_path()
+    name = os.path.basename(secrets_dir)
    
     try:
         shutil.rmtree(secrets_dir) # remove the .secrets dir
-        print("/.secrets folder removed successfully.")
+        print(f"/{name} folder removed successfully.")
     except FileNotFoundError:
         # .secrets dir does not exist
-        print("/.secrets folder does not exist or has already been removed.")
+        print(f"/{name} folder does not exist or has already been removed.")
 
+@traced
 def purge_secrets(keep_secrets=False):
     
     """
@@ -144,7 +195,7 @@ def purge_secrets(keep_secrets=False):
     else:
         print("Removing secrets.")
         remove_secret_folder()  # remove .secrets directory
-        print("Secrets removed.")
+        emit("secrets_removed", "Secrets removed.")
 
 
 def main(keep_volumes=False, keep_secrets=False):
@@ -162,16 +213,29 @@ def main(keep_volumes=False, keep_secrets=False):
     purge_docker_environment(keep_volumes)
     purge_secrets(keep_secrets)
 
-    print("Local development environment cleanup is complete.")
+    emit("cleanup_done", "Local development environment cleanup is complete.",
+         keep_volumes=keep_volumes, keep_secrets=keep_secrets)
 
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Avalanche CMS Cleanup.")
     parser.add_argument('-kv', '--keep-volumes', action='store_true', help='Keeps Docker volumes')
     parser.add_argument('-ks', '--keep-secrets', action='store_true', help='Keeps secrets in /.secrets')
-    args = parser.parse_args()
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    instance.add_instance_argument(parser)
+    args = parser.parse_args(argv)
+    instance.select_from_args(parser, args)
     return args
 
+def cli(argv=None):
+
+    """Runs the cleanup with command line arguments, sys.argv by default."""
+
+    args = parse_args(argv)
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
+    main(keep_volumes=args.keep_volumes, keep_secrets=args.keep_secrets)
+
 if __name__ == "__main__":
-    args = parse_args()
-    main(keep_volumes=args.keep_volumes, keep_secrets=args.keep_secrets)
\ No newline at end of file
+    cli()
@@ -0,0 +1,162 @@
+"""
+Benchmarks startup of the Avalanche CMS local stack command line.
+
+Measures per subcommand of avalanche.py, in fresh interpreters, the import
+time and number of modules imported by its module ('python -X importtime')
+and the wall time of 'avalanche.py <command> --help', i.e. interpreter
+start, imports and argument parsing. 'avalanche' is the command list
+without subcommand. Medians of all runs are compared to a host-specific
+baseline; the benchmark fails if a metric exceeds it by more than the
+margin, e.g. after an eager import of a sibling script, or if there is no
+baseline. A baseline taken on another host is compared with a warning.
+
+Options:
+- -n, --runs: Runs per command (default: 10).
+- -m, --margin: Allowed relative regression over the baseline (default: 0.25).
+- -u, --update-baseline: Writes the results to ./bench/cli_baseline.json.
+- -o, --output: Writes the results as JSON to a file.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from avalanche import COMMANDS
+from benchmark import check_baseline, compare_to_baseline, host_info, read_baseline, write_baseline
+from utils.output import print
+
+# Baseline results, host-specific
+BASELINE_PATH = './bench/cli_baseline.json'
+
+# Metrics compared against the baseline
+METRICS = ("import_ms", "modules", "help_ms")
+
+# Absolute slack per metric, keeps small baselines from flagging noise
+METRIC_SLACK = {"import_ms": 5, "modules": 0, "help_ms": 20}
+
+# The command line itself, without subcommand
+ENTRY_MODULE = "avalanche"
+
+def measure_import(module):
+
+    """
+    Imports a module in a fresh interpreter with '-X importtime'.
+
+    Returns tuple (cumulative import time in ms, number of modules it
+    imported). Modules loaded by the interpreter itself are not counted.
+    """
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+
+    lines = [line.split("|") for line in result.stderr.splitlines() if line.startswith("import time:")][1:]
+    names = [name for _, _, name in lines]
+
+    # entries are in completion order, the module's imports precede it, indented
+    index = max(i for i, name in enumerate(names) if name.strip() == module and not name[1:].startswith(" "))
+    count = 0
+    while index - count > 0 and names[index - count - 1][1:].startswith(" "):
+        count += 1
+
+    return int(lines[index][1]) / 1000, count
+
+def measure_help(command):
+
+    """
+    Returns the wall time in ms of 'avalanche.py <command> --help'.
+    """
+
+    args = [command, "--help"] if command != ENTRY_MODULE else ["--help"]
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "avalanche.py", *args], stdout=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start) * 1000
+
+def run_benchmark(runs):
+
+    """
+    Measures all commands, 'runs' times each.
+
+    Returns dict of command to metrics, medians of all runs.
+    """
+
+    results = {}
+
+    for command in (ENTRY_MODULE, *COMMANDS):
+
+        module = COMMANDS[command][0] if command in COMMANDS else ENTRY_MODULE
+        imports = [measure_import(module) for _ in range(runs)]
+        helps = [measure_help(command) for _ in range(runs)]
+
+        results[command] = {
+            "import_ms": round(statistics.median(ms for ms, _ in imports), 1),
+            "modules": max(count for _, count in imports),
+            "help_ms": round(statistics.median(helps), 1)
+        }
+
+    return results
+
+def print_report(results, baseline):
+
+    """
+    Prints a table of results, with baseline values in parentheses.
+    """
+
+    print(f"{'command':<12}{'import [ms]':>18}{'modules':>14}{'--help [ms]':>18}")
+
+    for command, metrics in results.items():
+        expected = baseline.get(command, {})
+        cells = [f"{metrics[metric]} ({expected[metric]})" if metric in expected else f"{metrics[metric]}"
+                 for metric in METRICS]
+        print(f"{command:<12}{cells[0]:>18}{cells[1]:>14}{cells[2]:>18}")
+
+def main(runs=10, margin=0.25, update_baseline=False, output=None):
+
+    """
+    Runs the benchmark, exits with 1 on regressions or without baseline.
+    """
+
+    print(f"Benchmarking command line startup ({runs} runs per command).")
+
+    try:
+        results = run_benchmark(runs)
+    except subprocess.CalledProcessError as e:
+        print(f"Benchmark failed: {e}\n{e.stderr or ''}")
+        sys.exit(1)
+
+    baseline = read_baseline(BASELINE_PATH)
+    print_report(results, baseline.get("phases", {}))
+
+    if output:
+        with open(output, 'w', newline='\n') as file:
+            json.dump({"host": host_info(), "phases": results}, file, indent=2)
+
+    if update_baseline:
+        write_baseline(results, BASELINE_PATH)
+        return
+
+    check_baseline(baseline, BASELINE_PATH)
+
+    regressions = compare_to_baseline(results, baseline["phases"], margin, metrics=METRICS, slack=METRIC_SLACK)
+
+    if regressions:
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1)
+
+    print(f"All commands within {margin:.0%} of baseline.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Avalanche CMS local command line startup benchmark.")
+    parser.add_argument('-n', '--runs', type=int, default=10, help="Runs per command (default: 10).")
+    parser.add_argument('-m', '--margin', type=float, default=0.25, help="Allowed regression over baseline (default: 0.25).")
+    parser.add_argument('-u', '--update-baseline', action='store_true', help="Writes results as new baseline.")
+    parser.add_argument('-o', '--output', type=str, help="Writes results as JSON to a file.")
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(runs=args.runs, margin=args.margin, update_baseline=args.update_baseline, output=args.output)
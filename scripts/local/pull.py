@@ -2,52 +2,386 @@
 Pulls Docker images for Avalanche CMS local dev setup.
 
 Automates image pulling to ensure consistency. Reads image list from
-./config/docker_images.json.
+./config/docker_images.json. Images are pulled concurrently with a bounded
+number of workers; per-image and total wall time is reported.
 
-Usage: Run without arguments.
+Images of optional compose profiles (e.g. PgBouncer for 'pooler') are only
+pulled if the profile is enabled, see setup.py --pooler, or with --pooler.
+
+Images pinned in ./config/docker_images.lock.json are pulled by digest and
+skipped if the local image already matches the pinned digest. Pinned images
+can be exported to and loaded from a compressed archive for offline setups.
+
+Options:
+- -w, --workers: Max concurrent pulls (default: 4, 1 = sequential).
+- -u, --update-lock: Pull latest tags and record their digests in the lockfile.
+- -e, --export: Export images to a compressed archive.
+- -l, --load: Load images from a compressed archive instead of pulling.
+- --pooler: Include the PgBouncer image, even if the pooler is not enabled.
+- -q, --quiet / --json / --flush: Output options, see utils/output.py.
 """
 
 import argparse
+import gzip
 import json
 import os
+import shutil
 import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from utils.decorators import require_docker_running
-from utils.output import print
+from utils.engine import get_engine
+from utils import instance
+from utils import output
+from utils.output import emit, print
+from utils import tracing
+from utils.tracing import traced
+
+# Default number of concurrent 'docker pull' processes
+DEFAULT_PULL_WORKERS = 4
+
+# Image list, with the images of optional compose profiles
+IMAGES_PATH = './config/docker_images.json'
+
+# Digest lockfile, next to the image list
+LOCK_FILE_PATH = './config/docker_images.lock.json'
+
+# Default offline image archive, in the project root
+DEFAULT_ARCHIVE_PATH = os.path.join(instance.project_root(), 'avalanchecms-images.tar.gz')
+
+# Chunk size for streaming image archives
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+def read_images(profiles=()):
+
+    """
+    Reads the image list from './config/docker_images.json': the stack's
+    images and those of the given compose profiles, e.g. 'pooler'.
+    """
+
+    with open(IMAGES_PATH, 'r') as file:
+        config = json.load(file)
+
+    images = list(config["images"])
+    for profile in profiles:
+        images += config.get("profiles", {}).get(profile, [])
+    return images
+
+def read_lock():
+
+    """
+    Reads pinned images from the lockfile.
+
+    Returns dict of image to pin ('digest' and 'id'), empty if there is no
+    lockfile.
+    """
+
+    try:
+        with open(LOCK_FILE_PATH, 'r') as file:
+            return json.load(file)["images"]
+    except FileNotFoundError:
+        return {}
+
+def write_lock(pins):
+
+    """
+    Writes pinned images to the lockfile.
+
+    Args:
+        pins (dict): Image to pin, with repo 'digest' (e.g. 'postgres@sha256:...')
+            and image 'id'. The id survives 'docker save/load', repo digests don't.
+    """
+
+    with open(LOCK_FILE_PATH, 'w', newline='\n') as file:
+        json.dump({"images": pins}, file, indent=2)
+        file.write('\n')
+
+def inspect_local_image(image):
+
+    """
+    Fetches id and repo digests of a local image.
+
+    Returns dict with 'id' and 'digests', None if the image is not present.
+    """
+
+    engine = get_engine()
 
+    if engine is not None:
+        details = engine.inspect_image(image)
+        return {"id": details["Id"], "digests": details.get("RepoDigests") or []} if details else None
+
+    result = tracing.run(["docker", "image", "inspect", "--format", "{{json .Id}} {{json .RepoDigests}}", image],
+                         capture_output=True, text=True)
+
+    if result.returncode != 0:
+        return None
+
+    image_id, digests = result.stdout.split(' ', 1)
+    return {"id": json.loads(image_id), "digests": json.loads(digests) or []}
+
+def matches_pin(local, pin):
+
+    """
+    Checks if a local image (see inspect_local_image) matches a lockfile pin.
+    """
+
+    return bool(local and pin) and (pin["digest"] in local["digests"] or pin["id"] == local["id"])
+
+@traced
+def pull_image(image, env, capture_output=False, pin=None):
+
+    """
+    Pulls a single Docker image and times it.
+
+    Pinned images are skipped if already present locally, otherwise pulled
+    by digest and tagged with the configured reference.
+
+    Args:
+        image (str): Image reference to pull.
+        env (dict): Environment for the docker CLI.
+        capture_output (bool): Capture CLI output instead of streaming it.
+        pin (dict, optional): Pinned digest and id from the lockfile.
+
+    Returns tuple (image, status, elapsed seconds, error or None), status
+    is 'pulled', 'skipped' or 'failed'.
+    """
+
+    start = time.perf_counter()
+
+    if pin and matches_pin(inspect_local_image(image), pin):
+        return image, "skipped", time.perf_counter() - start, None
+
+    try:
+        if pin:
+            tracing.run(["docker", "pull", pin["digest"]], check=True, env=env,
+                        capture_output=capture_output, text=True)
+            tracing.run(["docker", "tag", pin["digest"], image], check=True, env=env,
+                        capture_output=True, text=True)
+        else:
+            tracing.run(["docker", "pull", image], check=True, env=env,
+                        capture_output=capture_output, text=True)
+        return image, "pulled", time.perf_counter() - start, None
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.strip() if e.stderr else str(e)
+        return image, "failed", time.perf_counter() - start, error
+
+@traced
 @require_docker_running
-def pull_docker_images():
-    
+def pull_docker_images(workers=DEFAULT_PULL_WORKERS, update_lock=False, profiles=()):
+
     """
     Pulls Docker images for Avalanche CMS from './config/docker_images.json'.
+
+    Args:
+        workers (int): Max concurrent pulls, 1 pulls sequentially.
+        update_lock (bool): Ignore pinned digests, record new ones after pull.
+        profiles (iterable): Compose profiles to pull the images of.
+
+    Returns list of images that failed to pull.
     """
-    
-    json_file_path = './config/docker_images.json'
-    with open(json_file_path, 'r') as file:
-        images = json.load(file)["images"]
-    
-    print("Pulling Docker images.")
-    
+
+    images = read_images(profiles)
+    lock = {} if update_lock else read_lock()
+
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    workers = min(workers, len(images)) or 1
+
+    print(f"Pulling Docker images ({len(images)} images, {workers} worker(s)).")
+
     env = os.environ.copy()
     env["DOCKER_CLI_HINTS"] = "false" # disable hints for cleaner output
 
+    # concurrent pulls capture output, interleaved progress bars are unreadable,
+    # as do '--quiet' and '--json', progress bars are no events
+    capture_output = workers > 1 or not output.streams_commands()
+
+    start = time.perf_counter()
+    failed = []
+
     for image in images:
-        print(f"Pulling image: {image}")
-        try:
-            subprocess.run(["docker", "pull", image], check=True, env=env)
-            print(f"Successfully pulled {image}")
-        except subprocess.CalledProcessError as e:
-            print(f"Failed to pull {image}. Error: {e}")
-
-    print("Docker images pulled successfully.")
-
-def main():  
-    pull_docker_images()
-    
-def parse_args():
+        emit("image_pull_started", f"Pulling image: {image}", image=image)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        # results are yielded in config order, regardless of completion order
+        results = executor.map(lambda image: pull_image(image, env, capture_output, lock.get(image)), images)
+
+        for image, status, elapsed, error in results:
+            if status == "pulled":
+                message = f"Successfully pulled {image} in {elapsed:.1f}s"
+            elif status == "skipped":
+                message = f"Up to date {image}, matches pinned digest"
+            else:
+                message = f"Failed to pull {image} after {elapsed:.1f}s. Error: {error}"
+                failed.append(image)
+
+            emit("image_pulled", message, level="error" if error else "info",
+                 image=image, status=status, seconds=round(elapsed, 3), error=error)
+
+    total = time.perf_counter() - start
+
+    if failed:
+        message = f"Pulled {len(images) - len(failed)}/{len(images)} Docker images in {total:.1f}s."
+    else:
+        message = f"Docker images pulled successfully in {total:.1f}s."
+
+    emit("pull_done", message, images=len(images), failed=failed, seconds=round(total, 3))
+
+    if update_lock and not failed:
+        update_lock_file(images)
+
+    return failed
+
+def update_lock_file(images):
+
+    """
+    Records the local repo digests and ids of images in the lockfile. Pins of
+    other configured images, e.g. of profiles not pulled, are kept.
+    """
+
+    configured = read_images(read_profiles())
+    pins = {image: pin for image, pin in read_lock().items() if image in configured}
+    for image in images:
+
+        local = inspect_local_image(image) or {"id": None, "digests": []}
+
+        # an image may be known under several repos, pick the configured one
+        repo = image.rsplit(':', 1)[0] if ':' in image.rsplit('/', 1)[-1] else image
+        matches = [digest for digest in local["digests"] if digest.startswith(f"{repo}@")]
+
+        if not matches:
+            raise RuntimeError(f"No repo digest found for {image}")
+
+        pins[image] = {"digest": matches[0], "id": local["id"]}
+
+    write_lock(pins)
+    print(f"Lockfile updated: {LOCK_FILE_PATH}, images: {len(pins)}")
+
+@traced
+@require_docker_running
+def export_docker_images(archive_path=DEFAULT_ARCHIVE_PATH, profiles=()):
+
+    """
+    Streams pinned images from 'docker save' into a gzip archive.
+
+    Args:
+        archive_path (str): Target archive file.
+        profiles (iterable): Compose profiles to export the images of.
+    """
+
+    images = read_images(profiles)
+    lock = read_lock()
+
+    for image in images:
+        if lock.get(image) and not matches_pin(inspect_local_image(image), lock[image]):
+            print(f"Warning: local {image} does not match pinned digest", level="warning")
+
+    print(f"Exporting {len(images)} Docker images to {archive_path}.")
+
+    start = time.perf_counter()
+
+    with tracing.phase("docker save", category="command"):
+        process = subprocess.Popen(["docker", "save", *images], stdout=subprocess.PIPE)
+        with gzip.open(archive_path, 'wb', compresslevel=6) as archive:
+            shutil.copyfileobj(process.stdout, archive, ARCHIVE_CHUNK_SIZE)
+        returncode = process.wait()
+
+    if returncode != 0:
+        os.remove(archive_path)
+        raise RuntimeError(f"Failed to export Docker images to {archive_path}")
+
+    size_mb = os.path.getsize(archive_path) / (1024 * 1024)
+    print(f"Docker images exported in {time.perf_counter() - start:.1f}s ({size_mb:.0f} MB).")
+
+@traced
+@require_docker_running
+def load_docker_images(archive_path=DEFAULT_ARCHIVE_PATH):
+
+    """
+    Loads images from a gzip archive created by export_docker_images.
+
+    Args:
+        archive_path (str): Source archive file.
+    """
+
+    if not os.path.exists(archive_path):
+        raise RuntimeError(f"Image archive not found: {archive_path}")
+
+    print(f"Loading Docker images from {archive_path}.")
+
+    start = time.perf_counter()
+
+    # 'docker load' decompresses gzip archives natively
+    try:
+        tracing.run(["docker", "load", "-i", archive_path], check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load Docker images: {e}")
+
+    print(f"Docker images loaded in {time.perf_counter() - start:.1f}s.")
+
+def read_profiles():
+
+    """
+    Returns all compose profiles with images in './config/docker_images.json'.
+    """
+
+    with open(IMAGES_PATH, 'r') as file:
+        return list(json.load(file).get("profiles", {}))
+
+def main(workers=DEFAULT_PULL_WORKERS, update_lock=False, export_path=None, load_path=None, profiles=None):
+
+    """
+    Pulls, exports or loads images, raises RuntimeError on failures.
+    Profile images are included for 'profiles', the instance's enabled
+    compose profiles by default.
+    """
+
+    if load_path:
+        load_docker_images(load_path)
+        return
+
+    profiles = instance.compose_profiles() if profiles is None else profiles
+
+    failed = pull_docker_images(workers=workers, update_lock=update_lock, profiles=profiles)
+
+    if failed:
+        raise RuntimeError(f"Failed to pull {len(failed)} image(s): {', '.join(failed)}")
+
+    if export_path:
+        export_docker_images(export_path, profiles=profiles)
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Avalanche CMS Local Docker Image Pull.")
-    args = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_PULL_WORKERS,
+                        help=f"Max concurrent pulls (default: {DEFAULT_PULL_WORKERS}, 1 = sequential).")
+    parser.add_argument('-u', '--update-lock', action='store_true', help="Records pulled image digests in the lockfile.")
+    parser.add_argument('-e', '--export', nargs='?', const=DEFAULT_ARCHIVE_PATH, metavar='PATH',
+                        help="Exports images to a compressed archive after pulling.")
+    parser.add_argument('-l', '--load', nargs='?', const=DEFAULT_ARCHIVE_PATH, metavar='PATH',
+                        help="Loads images from a compressed archive instead of pulling.")
+    parser.add_argument('--pooler', action='store_true', help="Includes the PgBouncer image, even if the pooler is not enabled.")
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    args = parser.parse_args(argv)
     return args
 
+def cli(argv=None):
+
+    """Runs the pull with command line arguments, sys.argv by default."""
+
+    args = parse_args(argv)
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
+    try:
+        profiles = sorted(set(instance.compose_profiles()) | ({"pooler"} if args.pooler else set()))
+        main(workers=args.workers, update_lock=args.update_lock, export_path=args.export, load_path=args.load,
+             profiles=profiles)
+    except RuntimeError as e:
+        print(e, level="error")
+        sys.exit(1)
+
 if __name__ == "__main__":
-    args = parse_args()
-    main()
\ No newline at end of file
+    cli()
@@ -0,0 +1,215 @@
+"""
+Samples CPU and memory usage of the Avalanche CMS local Docker stack.
+
+Reads the stats of the stack's containers at a fixed interval, e.g. during
+a test run, and streams them as a time series to a CSV or JSONL file, one
+row per service and sample. Prints average and peak per service on exit
+(after the duration or on CTRL+C).
+
+Columns: 't' (seconds since start), 'service', 'cpu' (percent of one core,
+like 'docker stats'), 'memory_mb' and 'memory_limit_mb'. The first engine
+sample has no CPU value, CPU usage is averaged over each interval.
+
+Options:
+- -n, --interval: Seconds between samples (default: 2).
+- -d, --duration: Seconds to sample (default: until CTRL+C).
+- -o, --output: Time series file, '.csv' or '.jsonl' (default: none, summary only).
+- --format: 'csv' or 'jsonl', overrides the output file's extension.
+- -s, --services: Services to sample (default: all of the stack).
+- -i, --instance: Samples an isolated stack instance.
+- -q, --quiet / --json / --flush: Output options, see utils/output.py.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.decorators import require_docker_running
+from utils.engine import DockerEngineError
+from utils import instance
+from utils import output
+from utils.output import emit, print
+from utils import resources
+from utils import tracing
+
+# Default seconds between samples
+DEFAULT_INTERVAL = 2.0
+
+# 'docker stats' takes about a second per call without engine socket
+MIN_INTERVAL = 0.5
+
+FORMATS = ("csv", "jsonl")
+COLUMNS = ("t", "service", "cpu", "memory_mb", "memory_limit_mb")
+
+class SeriesWriter:
+
+    """
+    Streams samples to a CSV or JSONL file, flushed per sample so the
+    series survives an aborted run. Discards samples without path.
+    """
+
+    def __init__(self, path=None, format="csv"):
+        self.file = open(path, 'w', newline='') if path else None
+        self.format = format
+        if self.file and format == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=COLUMNS)
+            self.csv.writeheader()
+
+    def write(self, rows):
+        if not self.file:
+            return
+        for row in rows:
+            if self.format == "csv":
+                self.csv.writerow({key: "" if value is None else value for key, value in row.items()})
+            else:
+                self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+def to_row(elapsed, service, sample):
+
+    """Converts a sample to a compact time series row."""
+
+    return {
+        "t": round(elapsed, 2),
+        "service": service,
+        "cpu": None if sample["cpu"] is None else round(sample["cpu"], 1),
+        "memory_mb": round(sample["memory"] / resources.MB, 1),
+        "memory_limit_mb": round(sample["memory_limit"] / resources.MB) if sample.get("memory_limit") else None
+    }
+
+def read_samples(reader, services, executor):
+
+    """
+    Reads all services once, concurrently via the engine or in one
+    'docker stats' call. Returns dict of service to sample, running
+    services only.
+    """
+
+    containers = {instance.container_name(service): service for service in services}
+
+    if reader.engine is None:
+        return {containers[name]: sample for name, sample in reader.read_cli(list(containers)).items()}
+
+    samples = dict(zip(containers.values(), executor.map(reader.read, containers)))
+    return {service: sample for service, sample in samples.items() if sample is not None}
+
+@require_docker_running
+def sample(services, interval=DEFAULT_INTERVAL, duration=None, writer=None):
+
+    """
+    Samples services every 'interval' seconds until 'duration' is over or
+    CTRL+C. Reads are scheduled at fixed ticks, a slow read skips ticks
+    instead of shifting all later ones.
+
+    Returns list of rows.
+    """
+
+    reader = resources.StatsReader()
+    writer = writer or SeriesWriter()
+    rows = []
+    start = time.perf_counter()
+    tick = 0
+
+    print(f"Sampling {', '.join(services)} every {interval:g}s"
+          f"{f' for {duration:g}s' if duration else ', CTRL+C to stop'}.")
+
+    with ThreadPoolExecutor(max_workers=len(services)) as executor:
+        try:
+            while True:
+
+                with tracing.phase("sample", category="stats"):
+                    samples = read_samples(reader, services, executor)
+
+                elapsed = time.perf_counter() - start
+                batch = [to_row(elapsed, service, sample) for service, sample in samples.items()]
+                writer.write(batch)
+                rows += batch
+
+                for row in batch: # silent in text mode
+                    emit("stats_sample", **row)
+
+                tick = max(tick + 1, int(elapsed // interval) + 1)
+                if duration is not None and tick * interval > duration:
+                    break
+                time.sleep(max(0, start + tick * interval - time.perf_counter()))
+
+        except KeyboardInterrupt:
+            print("Interrupted.")
+
+    return rows
+
+def print_summary(summary):
+
+    """
+    Prints average and peak CPU and memory per service.
+    """
+
+    if not summary:
+        print("No samples, is the stack running?", level="warning")
+        return
+
+    if not output.is_json(): # the event carries the summary
+        print(f"{'service':<12}{'samples':>8}{'cpu avg':>10}{'cpu peak':>10}{'mem avg':>10}{'mem peak':>10}")
+        for service, stats in summary.items():
+            cpu_avg = "-" if stats["cpu_avg"] is None else f"{stats['cpu_avg']:.1f}%"
+            cpu_peak = "-" if stats["cpu_peak"] is None else f"{stats['cpu_peak']:.1f}%"
+            print(f"{service:<12}{stats['samples']:>8}{cpu_avg:>10}{cpu_peak:>10}"
+                  f"{stats['memory_avg_mb']:>8.0f}MB{stats['memory_peak_mb']:>8.0f}MB")
+
+    emit("stats_summary", f"Sampled {len(summary)} service(s).", services=summary)
+
+def main(interval=DEFAULT_INTERVAL, duration=None, output_path=None, format=None, services=None):
+
+    """
+    Samples the stack, writes the time series and prints the summary.
+    """
+
+    if interval < MIN_INTERVAL:
+        print(f"Error: Interval must be at least {MIN_INTERVAL:g}s.", level="error")
+        sys.exit(1)
+
+    format = format or ("jsonl" if output_path and output_path.endswith((".jsonl", ".json")) else "csv")
+    writer = SeriesWriter(output_path, format)
+
+    try:
+        rows = sample(services or list(resources.LIMITED_SERVICES), interval=interval, duration=duration, writer=writer)
+    except DockerEngineError as e:
+        print(f"Sampling failed: {e}", level="error")
+        sys.exit(1)
+    finally:
+        writer.close()
+
+    if output_path:
+        emit("stats_written", f"Time series written: {output_path} ({len(rows)} rows, {format}).",
+             path=output_path, rows=len(rows), format=format)
+
+    print_summary(resources.summarize(rows))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Avalanche CMS local stack resource sampler.")
+    parser.add_argument('-n', '--interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f"Seconds between samples (default: {DEFAULT_INTERVAL:g}).")
+    parser.add_argument('-d', '--duration', type=float, help="Seconds to sample (default: until CTRL+C).")
+    parser.add_argument('-o', '--output', type=str, help="Time series file, '.csv' or '.jsonl'.")
+    parser.add_argument('--format', choices=FORMATS, help="Time series format (default: from the file extension, csv).")
+    parser.add_argument('-s', '--services', nargs='+', choices=resources.LIMITED_SERVICES, metavar='SERVICE',
+                        help=f"Services to sample (default: {', '.join(resources.LIMITED_SERVICES)}).")
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    instance.add_instance_argument(parser)
+    args = parser.parse_args()
+    instance.select_from_args(parser, args)
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
+    main(interval=args.interval, duration=args.duration, output_path=args.output, format=args.format,
+         services=args.services)
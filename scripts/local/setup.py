@@ -10,20 +10,36 @@ Options:
 - -s, --salt-base: Set salt base (debug).
 - -p, --password: Specify a password (debug)
 - -ip, --image-pull: Update Docker images.
+- --pg-profile: Postgres tuning profile, 'laptop' (default) or 'load-test'.
+- --parallel: Runs independent steps concurrently as a task graph.
+- --pooler: Routes Keycloak and pgAdmin through the PgBouncer pooler.
+- --resource-profile: Per-service CPU and memory limits, see ./config/resource_limits.json.
+- -i, --instance: Sets up an isolated stack instance with its own secrets and ports.
+- -q, --quiet / --json / --flush: Output options, see utils/output.py.
 """
 
 import argparse
 import base64
+import glob
 import hashlib
 import json
 import os
 import random
+import re
 import string
 import sys
-from cleanup import main as cleanup_main
-from pull import main as pull_main
+import time
+from concurrent.futures import ThreadPoolExecutor
 from utils.decorators import require_docker_running
-from utils.output import print
+from utils import output
+from utils.output import emit, print
+from utils import hashcost
+from utils import instance
+from utils import pgtuning
+from utils import resources
+from utils import tracing
+from utils.taskgraph import TaskGraph, TaskGraphError
+from utils.tracing import traced
 
 # Special characters for secure passwords
 SECRET_SPECIAL_CHARS = "!@#$%^&*()-_=+[]{};:,.<>/?|"
@@ -31,6 +47,37 @@ SECRET_SPECIAL_CHARS = "!@#$%^&*()-_=+[]{};:,.<>/?|"
 # Pool of characters for generating secrets: includes letters, digits, and special characters
 SECRET_CHAR_POOL = string.ascii_letters + string.digits + SECRET_SPECIAL_CHARS
 
+# Length of generated secrets
+SECRET_LENGTH = 22
+
+# Manifest in '.secrets', records which config entry generated which files
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 2
+
+# Keycloak realm template, relative to the project root
+REALM_TEMPLATE_PATH = os.path.join('environments', 'local', 'config', 'keycloak-realm-config.json')
+
+# Rendered Keycloak realm in '.secrets', mounted into the Keycloak container
+REALM_FILENAME = "keycloak-realm-config.json"
+
+# Keys required in hash files
+HASH_FILE_KEYS = ("ALGORITHM", "ITERATIONS", "SALT", "HASH")
+
+# Generated Postgres config in '.secrets', replaces the server's config file
+POSTGRES_CONFIG_FILENAME = "postgresql.conf"
+
+# Config written by initdb in the Postgres container, included before tuning
+POSTGRES_BASE_CONFIG = "/var/lib/postgresql/data/postgresql.conf"
+
+# PgBouncer pool settings, and the generated config and user list in '.secrets'
+POOLER_CONFIG_PATH = './config/pgbouncer.json'
+POOLER_CONFIG_FILENAME = "pgbouncer.ini"
+POOLER_USERLIST_FILENAME = "pgbouncer-userlist.txt"
+
+# PgBouncer endpoint in the compose network
+POOLER_HOST = "pgbouncer"
+POOLER_PORT = 6432
+
 def read_credentials():
     
     """
@@ -106,7 +153,8 @@ def generate_deterministic_salt(base_string, salt_length=16):
     hashed = hashlib.sha256(stripped_string.encode()).digest()
     return hashed[:salt_length]
 
-def hash_secret(secret, salt_length=16, iterations=27500, salt_base=None):
+@traced
+def hash_secret(secret, salt_length=16, iterations=None, salt_base=None, algorithm=None):
     
     """
     Hashes a secret using PBKDF2, supports deterministic salts for debugging.
@@ -115,6 +163,8 @@ def hash_secret(secret, salt_length=16, iterations=27500, salt_base=None):
         secret (str): Secret to hash.
         salt_length, iterations (int, optional): Salt length and iterations.
         salt_base (str, optional): Debugging use only.
+        algorithm (str, optional): Keycloak algorithm id, e.g. 'pbkdf2-sha256'.
+            Algorithm and iterations default to the calibrated cost.
 
     Returns hash details or raises errors on failure.
     """
@@ -122,6 +172,11 @@ def hash_secret(secret, salt_length=16, iterations=27500, salt_base=None):
     if not isinstance(secret, str) or not secret:
         raise ValueError("Invalid secret provided.")
 
+    if iterations is None or algorithm is None:
+        cost = hashcost.load_cost()
+        iterations = iterations or cost["iterations"]
+        algorithm = algorithm or cost["algorithm"]
+
     try:
 
         salt = os.urandom(salt_length) # generate salt
@@ -132,14 +187,14 @@ def hash_secret(secret, salt_length=16, iterations=27500, salt_base=None):
             salt = os.urandom(salt_length) # generate salt
 
         # Hash using PBKDF2
-        hashed_secret = hashlib.pbkdf2_hmac('sha256', secret.encode(), salt, iterations)
+        hashed_secret = hashlib.pbkdf2_hmac(hashcost.ALGORITHMS[algorithm], secret.encode(), salt, iterations)
 
         # Encode
         encoded_hash = base64.b64encode(hashed_secret).decode()
         encoded_salt = base64.b64encode(salt).decode()
 
         return {
-            "algorithm": "pbkdf2-sha256",
+            "algorithm": algorithm,
             "iterations": iterations,
             "salt": encoded_salt,
             "hash": encoded_hash
@@ -148,7 +203,7 @@ def hash_secret(secret, salt_length=16, iterations=27500, salt_base=None):
     except Exception as e:
         raise RuntimeError(f"Error during secret hashing: {e}")
 
-def write_pgpass_file(folder, hostname, port=5432, triplets=None):
+def write_pgpass_file(folder, hostname, port=5432, triplets=None, endpoints=None):
     
     """
     Writes .pgpass for PostgreSQL connections in specified folder.
@@ -157,6 +212,8 @@ def write_pgpass_file(folder, hostname, port=5432, triplets=None):
         folder (str): Target directory.
         hostname (str), port (int), database (str): Connection details.
         triplets (list of triplets): Database, Username, Password triplets.
+        endpoints (list of (hostname, port), optional): Further endpoints for
+            the same credentials, e.g. the connection pooler.
 
     Returns path to .pgpass or raises ValueError on missing info.
     """
@@ -169,19 +226,304 @@ def write_pgpass_file(folder, hostname, port=5432, triplets=None):
 
     # create the file
     with open(pgpass_file_path, 'w', newline='\n') as file:
-        for database, username, password in triplets:
-            
-            # format connection string for each database-username-password triplet
-            connection_string = f"{hostname}:{port}:{database}:{username}:{password}\n"
-            
-            file.write(connection_string)
+        file.write(format_pgpass(hostname, port, triplets))
+        for endpoint_hostname, endpoint_port in endpoints or ():
+            file.write(format_pgpass(endpoint_hostname, endpoint_port, triplets))
 
     # secure the .pgpass file by setting its file permission to 0600 (read/write for owner only)
     os.chmod(pgpass_file_path, 0o600)
     
     return pgpass_file_path
 
-def generate_random_password(length=22):
+def format_pgpass(hostname, port, triplets):
+
+    """
+    Formats .pgpass content, one connection string per triplet.
+    """
+
+    # format connection string for each database-username-password triplet
+    return ''.join(f"{hostname}:{port}:{database}:{username}:{password}\n"
+                   for database, username, password in triplets)
+
+def pooler_users(credentials):
+
+    """
+    Collects the Postgres users of the credentials config with their
+    secrets: entries with a 'username', and database users from
+    'postgres-<db>-db-user-secret' entries, named like in init-db.sh.
+
+    Returns list of (username, secret) tuples.
+    """
+
+    users = {}
+    for entry in credentials:
+
+        match = re.match(r'^postgres-(.+)-db-user-secret$', entry["base_filename"])
+        username = entry.get("username") or (f"postgres_{match.group(1).lower().replace(' ', '_')}_client" if match else None)
+
+        if username and (match or entry.get("in_pgpass_file", False)):
+            users[username] = entry["secret_value"]
+
+    return sorted(users.items())
+
+def format_pooler_userlist(users):
+
+    """
+    Formats a PgBouncer auth file. Passwords are stored in plain text, like
+    in the '.env' files, so PgBouncer can log in to Postgres whatever
+    verifier the server has for the role.
+    """
+
+    def quote(value):
+        return '"' + value.replace('"', '""') + '"'
+
+    return ''.join(f"{quote(username)} {quote(secret)}\n" for username, secret in users)
+
+def format_pooler_config(settings):
+
+    """
+    Formats pgbouncer.ini from the pool settings in './config/pgbouncer.json'.
+    All databases are forwarded to the postgres service.
+    """
+
+    lines = [
+        "; Generated by setup.py from config/pgbouncer.json, changes are overwritten.",
+        "[databases]",
+        "* = host=postgres port=5432",
+        "",
+        "[pgbouncer]",
+        "listen_addr = 0.0.0.0",
+        f"listen_port = {POOLER_PORT}",
+        "auth_type = scram-sha-256",
+        "auth_file = /etc/pgbouncer/userlist.txt",
+        "ignore_startup_parameters = extra_float_digits,options", # sent by JDBC clients like Keycloak
+        "server_reset_query = DISCARD ALL"
+    ]
+    lines += [f"{key} = {value}" for key, value in settings.items()]
+
+    return "\n".join(lines) + "\n"
+
+def write_generated_file(path, content, description, mode=None):
+
+    """
+    Writes a generated file unless its content is unchanged.
+
+    Returns True if the file was written.
+    """
+
+    try:
+        with open(path, 'r') as file:
+            if file.read() == content:
+                emit("file_written", f"Unchanged {description}: {path}, skipped", path=path, status="unchanged")
+                return False
+    except FileNotFoundError:
+        pass
+
+    with open(path, 'w', newline='\n') as file:
+        file.write(content)
+
+    if mode is not None:
+        os.chmod(path, mode)
+
+    emit("file_written", f"{description[0].upper()}{description[1:]} created: {path}", path=path, status="created")
+    return True
+
+def read_secret_file(path):
+
+    """
+    Reads the secret value from an existing secret file.
+    """
+
+    with open(path, 'r') as file:
+        return file.read().strip()
+
+def read_manifest(secrets_path):
+
+    """
+    Reads the secrets manifest. Returns an empty manifest if there is none
+    or it has an unknown version.
+    """
+
+    try:
+        with open(os.path.join(secrets_path, MANIFEST_FILENAME), 'r') as file:
+            manifest = json.load(file)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    return {"version": MANIFEST_VERSION, "entries": {}}
+
+def write_manifest(secrets_path, manifest):
+
+    """
+    Writes the secrets manifest to '.secrets'.
+    """
+
+    with open(os.path.join(secrets_path, MANIFEST_FILENAME), 'w', newline='\n') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+def fingerprint_entry(entry):
+
+    """
+    Fingerprints what defines a credentials config entry's secret: its name,
+    file and generated length. Hashing inputs are fingerprinted separately,
+    see fingerprint_hash, they only affect the derived hash file.
+    """
+
+    material = {"name": entry.get("name"), "base_filename": entry.get("base_filename"), "length": SECRET_LENGTH}
+
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+def fingerprint_hash(cost, salt_base=None):
+
+    """
+    Fingerprints the inputs of a hash file besides the secret: algorithm,
+    iterations and salt base.
+    """
+
+    material = {"algorithm": cost["algorithm"], "iterations": cost["iterations"], "salt_base": salt_base}
+
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+def hash_cost_changed(path, cost):
+
+    """
+    Checks if a hash file was written with another algorithm or iteration
+    count than 'cost', see hashcost.load_cost.
+    """
+
+    data = read_hash_file(path)
+    return data["ALGORITHM"] != cost["algorithm"] or int(data["ITERATIONS"]) != cost["iterations"]
+
+def read_hash_file(path):
+
+    """
+    Reads a hash file written by create_hash_file.
+
+    Returns dict of upper-case keys to values, raises ValueError if keys
+    are missing.
+    """
+
+    with open(path, 'r') as file:
+        data = dict(line.strip().split('=', 1) for line in file if '=' in line)
+
+    missing = [key for key in HASH_FILE_KEYS if key not in data]
+    if missing:
+        raise ValueError(f"Missing keys in hash file {path}: {', '.join(missing)}")
+
+    return data
+
+def collect_realm_inputs(secrets_path):
+
+    """
+    Collects user hashes and client secrets for the Keycloak realm.
+
+    User ids are taken from '<prefix>-<user>-secret.hash' files, client ids
+    from '<client>-keycloak-client-secret.env' files.
+
+    Returns tuple (dict of user id to hash data, dict of client id to secret).
+    """
+
+    hashes = {}
+    for path in sorted(glob.glob(os.path.join(secrets_path, "hashes", "*.hash"))):
+        match = re.match(r'^.*-(.*)-secret\.hash$', os.path.basename(path))
+        if match:
+            hashes[match.group(1)] = read_hash_file(path)
+        else:
+            print(f"Warning: {path} does not follow hash pattern, skipping.", level="warning")
+
+    clients = {}
+    for path in sorted(glob.glob(os.path.join(secrets_path, "*[!-]-keycloak-client-secret.env"))):
+        client_id = os.path.basename(path)[:-len("-keycloak-client-secret.env")]
+        clients[client_id] = read_secret_file(path)
+
+    return hashes, clients
+
+def render_realm(realm, hashes, clients, epoch_ms, cost=None):
+
+    """
+    Applies user timestamps, user credentials, client secrets and the hash
+    cost to a realm in a single pass.
+
+    Args:
+        realm (dict): Realm template, modified in place.
+        hashes (dict): User id to hash data, see read_hash_file.
+        clients (dict): Client id to client secret.
+        epoch_ms (int): Timestamp for 'createdTimestamp' and 'createdDate'.
+        cost (dict, optional): Hash algorithm and iterations for the password
+            policy, so Keycloak hashes new passwords like the imported ones
+            and doesn't re-hash them on login.
+
+    Returns the realm.
+    """
+
+    if cost:
+        realm["passwordPolicy"] = hashcost.password_policy(cost, realm.get("passwordPolicy"))
+
+    for user in realm.get("users") or []:
+
+        user["createdTimestamp"] = epoch_ms
+
+        hash_data = hashes.get(user.get("username"))
+        if hash_data:
+            user["credentials"] = [{
+                "type": "password",
+                "userLabel": "Password",
+                "createdDate": epoch_ms,
+                "secretData": json.dumps({"value": hash_data["HASH"], "salt": hash_data["SALT"], "additionalParameters": {}},
+                                         separators=(',', ':')),
+                "credentialData": json.dumps({"hashIterations": int(hash_data["ITERATIONS"]), "algorithm": hash_data["ALGORITHM"],
+                                              "additionalParameters": {}}, separators=(',', ':'))
+            }]
+
+    for client in realm.get("clients") or []:
+        if client.get("clientId") in clients:
+            client["secret"] = clients[client["clientId"]]
+
+    return realm
+
+@traced
+def write_realm_config(project_root, secrets_path, previous_fingerprint=None):
+
+    """
+    Renders the Keycloak realm template with credentials from '.secrets'
+    into '.secrets/keycloak-realm-config.json'. Skips rendering if template
+    and credentials are unchanged since 'previous_fingerprint'.
+
+    Returns the fingerprint of the rendering inputs.
+    """
+
+    template_path = os.path.join(project_root, REALM_TEMPLATE_PATH)
+    realm_path = os.path.join(secrets_path, REALM_FILENAME)
+
+    with open(template_path, 'r') as file:
+        template = instance.localize_urls(file.read()) # redirect URIs with the instance's ports
+
+    hashes, clients = collect_realm_inputs(secrets_path)
+    cost = hashcost.load_cost()
+
+    inputs = json.dumps({"template": template, "hashes": hashes, "clients": clients, "cost": cost}, sort_keys=True)
+    fingerprint = hashlib.sha256(inputs.encode()).hexdigest()
+
+    if fingerprint == previous_fingerprint and os.path.exists(realm_path):
+        emit("realm_rendered", f"Unchanged Keycloak realm: {realm_path}, skipped", path=realm_path, status="unchanged")
+        return fingerprint
+
+    realm = render_realm(json.loads(template), hashes, clients, int(time.time() * 1000), cost)
+
+    with open(realm_path, 'w', newline='\n') as file:
+        json.dump(realm, file, indent=2)
+
+    os.chmod(realm_path, 0o600) # contains client secrets
+
+    emit("realm_rendered", f"Keycloak realm rendered: {realm_path}, users with credentials: {len(hashes)}, client secrets: {len(clients)}",
+         path=realm_path, status="created", users=len(hashes), clients=len(clients))
+
+    return fingerprint
+
+def generate_random_password(length=SECRET_LENGTH):
     
     """
     Generates a random password of specified length. Default length is 22.
@@ -205,6 +547,28 @@ def prompt_for_secret(description, auto=False):
     
     return generate_random_password()
 
+def collect_secrets(clean=False, keep_secrets=None):
+
+    """
+    Prompts for the secrets create_secrets will create, before the setup
+    steps run concurrently and their output interleaves with the prompts.
+
+    Returns dict of base filename to secret value.
+    """
+
+    if keep_secrets:
+        return {}
+
+    secrets_path = instance.secrets_path()
+    secrets = {}
+
+    for entry in read_credentials():
+        base_filename = entry.get("base_filename")
+        if clean or not os.path.exists(os.path.join(secrets_path, f"{base_filename}.env")):
+            secrets[base_filename] = prompt_for_secret(entry.get("name"))
+
+    return secrets
+
 def create_secret_file(path, secret):
     
     """
@@ -214,20 +578,21 @@ def create_secret_file(path, secret):
     if not os.path.exists(path):
         with open(path, 'w', newline='\n') as file:
             file.write(secret)
-        print(f"Secret file created: {path}")
+        emit("secret_file", f"Secret file created: {path}", path=path, status="created")
     else:
-        print(f"Existing secret file: {path}, skipped")
+        emit("secret_file", f"Existing secret file: {path}, skipped", path=path, status="unchanged")
 
-def create_hash_file(path, secret, salt_base=None):
+def create_hash_file(path, secret, salt_base=None, hashed_data=None):
     
     """
     Creates a hash file from a secret at 'path', with optional 'salt_base'.
-    Skips if file exists.
+    Uses precomputed 'hashed_data' if given. Skips if file exists.
     """
 
     if not os.path.exists(path):
 
-        hashed_data = hash_secret(secret=secret, salt_base=salt_base)
+        if hashed_data is None:
+            hashed_data = hash_secret(secret=secret, salt_base=salt_base)
         
         os.makedirs(os.path.dirname(path), exist_ok=True)
         
@@ -235,10 +600,34 @@ def create_hash_file(path, secret, salt_base=None):
             for key, value in hashed_data.items():
                 file.write(f"{key.upper()}={value}\n")
 
-        print(f"Hash file created: {path}")
+        emit("hash_file", f"Hash file created: {path}", path=path, status="created")
     else:
-        print(f"Existing hash file: {path}, skipped")       
+        emit("hash_file", f"Existing hash file: {path}, skipped", path=path, status="unchanged")
+
+@traced
+def create_hash_files(jobs, salt_base=None, workers=None):
 
+    """
+    Creates hash files for (path, secret) pairs. Hashing runs in parallel
+    threads, as hashlib.pbkdf2_hmac releases the GIL; files are written in
+    the given order. Existing files are skipped, like in create_hash_file.
+    """
+
+    pending = [(path, secret) for path, secret in jobs if not os.path.exists(path)]
+
+    hashes = {}
+    if pending:
+        cost = hashcost.load_cost()
+        workers = min(len(pending), workers or os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(lambda job: hash_secret(secret=job[1], salt_base=salt_base, iterations=cost["iterations"],
+                                                           algorithm=cost["algorithm"]), pending)
+            hashes = {path: hashed_data for (path, _), hashed_data in zip(pending, results)}
+
+    for path, secret in jobs:
+        create_hash_file(path, secret, salt_base, hashed_data=hashes.get(path))
+
+@traced
 def clean_environment(clean=False, keep_volumes=None, keep_secrets=None):
     
     """
@@ -246,37 +635,50 @@ def clean_environment(clean=False, keep_volumes=None, keep_secrets=None):
     """
     
     if clean:
+        from cleanup import main as cleanup_main # only needed for clean setups
         print("Cleaning environment.")
         try:
 
             cleanup_main(keep_volumes, keep_secrets)
 
         except Exception as e:
-            print("Error during cleanup:", e)
+            print("Error during cleanup:", e, level="error")
             sys.exit(1)
 
-def create_secrets(keep_secrets=None, auto=False, password=None, salt_base=None):
+@traced
+def create_secrets(keep_secrets=None, auto=False, password=None, salt_base=None, secrets=None):
     
     """
     Creates secrets and hash files, supporting auto-generation, common password,
-    and interactive prompting. Optionally skips creation.
+    and interactive prompting. Optionally skips creation. 'secrets' are values
+    prompted beforehand, by base filename, see collect_secrets.
     """
     
     if password is not None and password.strip():
         print("Common password set.")
     else:
         if password is not None:
-            print("Error: Invalid password.")
+            print("Error: Invalid password.", level="error")
             sys.exit(1)
     
     if not keep_secrets:
 
         project_root = find_project_root(__file__)
-        secrets_path = os.path.join(project_root, '.secrets')
-        if not os.path.exists(secrets_path):
-            os.makedirs(secrets_path)
+        secrets_path = instance.secrets_path()
+        os.makedirs(secrets_path, exist_ok=True) # may run alongside write_postgres_config
         
         credentials = read_credentials()  # load credentials config
+        manifest = read_manifest(secrets_path)
+
+        try:
+            cost = hashcost.load_cost()
+        except (ValueError, json.JSONDecodeError) as e:
+            print(f"Error: {e}", level="error")
+            sys.exit(1)
+
+        manifest_entries = {}
+        hash_jobs = []
+        unchanged = 0
 
         for entry in credentials:
             
@@ -287,16 +689,65 @@ def create_secrets(keep_secrets=None, auto=False, password=None, salt_base=None)
             secret_file_hash = None
             if generate_hash:
                 secret_file_hash = os.path.join(secrets_path, "hashes", f"{base_filename}.hash")
+
+            recorded = manifest["entries"].get(base_filename)
+            fingerprint = fingerprint_entry(entry)
+            hash_fingerprint = fingerprint_hash(cost, salt_base) if generate_hash else None
+
+            manifest_entries[base_filename] = {
+                "fingerprint": fingerprint,
+                "files": [os.path.relpath(path, secrets_path) for path in (secret_file, secret_file_hash) if path]
+            }
+            if generate_hash:
+                manifest_entries[base_filename]["hash"] = hash_fingerprint
                 entry["secret_file_hash"] = secret_file_hash
 
+            if os.path.exists(secret_file):
+
+                # never rotate an existing secret, it is seeded in the data volume
+                entry["secret_value"] = read_secret_file(secret_file)
+                unchanged += 1
+
+                if recorded and recorded["fingerprint"] != fingerprint:
+                    emit("secret_file", f"Entry changed: {secret_file}, secret kept (delete the file to regenerate it)",
+                         level="warning", path=secret_file, status="kept")
+                elif not recorded:
+                    emit("secret_file", f"Existing secret file: {secret_file}, kept", path=secret_file, status="kept")
+
+                # recompute the derived hash from the kept secret if its inputs changed
+                if generate_hash and os.path.exists(secret_file_hash):
+                    if recorded and recorded.get("hash") == hash_fingerprint:
+                        continue
+                    if not recorded and not salt_base and not hash_cost_changed(secret_file_hash, cost):
+                        continue # predates the manifest, a random salt is as good as any
+                    emit("hash_file", f"Hash inputs changed: {secret_file_hash}, re-hashing", path=secret_file_hash,
+                         status="rehashed")
+                    os.remove(secret_file_hash)
+
+                if generate_hash:
+                    hash_jobs.append((secret_file_hash, entry["secret_value"]))
+                continue
+
+            # new secret, a stale hash file belongs to a removed one
+            if secret_file_hash and os.path.exists(secret_file_hash):
+                os.remove(secret_file_hash)
+
             # read/generate secret value
-            secret_value = password.strip() if password and password.strip() else prompt_for_secret(name, auto)
+            if password and password.strip():
+                secret_value = password.strip()
+            elif secrets and base_filename in secrets:
+                secret_value = secrets[base_filename]
+            else:
+                secret_value = prompt_for_secret(name, auto)
             entry["secret_value"] = secret_value
 
             # write to file
             create_secret_file(secret_file, secret_value)
             if generate_hash:
-                create_hash_file(secret_file_hash, secret_value, salt_base)
+                hash_jobs.append((secret_file_hash, secret_value))
+
+        # hash secrets in parallel, PBKDF2 dominates secret creation time
+        create_hash_files(hash_jobs, salt_base)
         
         # generate .pgpass file
         triplets = []
@@ -305,41 +756,226 @@ def create_secrets(keep_secrets=None, auto=False, password=None, salt_base=None)
                 database = entry.get("database", "*") if entry.get("database", "").strip() else "*"
                 triplets.append((database, entry["username"], entry["secret_value"]))
 
-        if triplets:          
-            pgpass_file_path = write_pgpass_file(secrets_path, "postgres", 5432, triplets)
-            print(f".pgpass created: {pgpass_file_path}, credentials: {len(triplets)}")
+        pgpass_file_path = os.path.join(secrets_path, '.pgpass')
 
-        else:
+        if not triplets:
             print("No applicable secrets, skipping .pgpass creation.")
+
+        elif os.path.exists(pgpass_file_path) and read_secret_file(pgpass_file_path) == (
+                format_pgpass("postgres", 5432, triplets) + format_pgpass(POOLER_HOST, POOLER_PORT, triplets)).strip():
+            emit("file_written", f"Unchanged .pgpass: {pgpass_file_path}, skipped", path=pgpass_file_path, status="unchanged")
+
+        else:
+            pgpass_file_path = write_pgpass_file(secrets_path, "postgres", 5432, triplets, [(POOLER_HOST, POOLER_PORT)])
+            emit("file_written", f".pgpass created: {pgpass_file_path}, credentials: {len(triplets)}",
+                 path=pgpass_file_path, status="created", credentials=len(triplets))
+
+        # generate the PgBouncer user list, for clients routed through the pooler
+        users = pooler_users(credentials)
+        write_generated_file(os.path.join(secrets_path, POOLER_USERLIST_FILENAME), format_pooler_userlist(users),
+                             f"PgBouncer user list ({len(users)} users)")
+
+        # render the Keycloak realm with user credentials and client secrets
+        realm_fingerprint = write_realm_config(project_root, secrets_path, manifest.get("realm"))
+
+        # record generated files, dropping entries removed from the config
+        updated_manifest = {**manifest, "entries": manifest_entries, "realm": realm_fingerprint}
+        if updated_manifest != manifest:
+            write_manifest(secrets_path, updated_manifest)
+
+        emit("secrets_done", f"Secrets: {len(credentials) - unchanged} created/updated, {unchanged} unchanged.",
+             updated=len(credentials) - unchanged, unchanged=unchanged)
             
     else:
         print("Skipping secret creation for cleanup.")
 
-def update_docker_images(image_pull=False):
+@traced
+def write_postgres_config(profile=pgtuning.DEFAULT_PROFILE, resource_profile=resources.DEFAULT_PROFILE):
+
+    """
+    Generates the Postgres tuning config in '.secrets' from the CPUs and
+    memory available to Docker, within the container limits of the
+    resource profile, and reports the chosen values. Skips writing if the
+    content is unchanged.
+    """
+
+    secrets_path = instance.secrets_path()
+    os.makedirs(secrets_path, exist_ok=True)
+    config_path = os.path.join(secrets_path, POSTGRES_CONFIG_FILENAME)
+
+    cpus, memory, source = pgtuning.host_resources()
+    limit = resources.service_limits(resource_profile).get("postgres")
+    if limit:
+        cpus, memory = resources.cap_resources(cpus, memory, limit)
+        source = f"{source}, {resource_profile} limits"
+    settings = pgtuning.tune(cpus, memory, profile)
+    config = pgtuning.format_config(settings, profile, cpus, memory, POSTGRES_BASE_CONFIG)
+
+    emit("postgres_tuning", f"Postgres profile: {profile}, CPUs: {cpus}, memory: {memory / pgtuning.GB:.1f} GB ({source})",
+         profile=profile, cpus=cpus, memory=memory, source=source, settings=settings)
+
+    if not output.is_json(): # the event carries the settings
+        for line in pgtuning.format_settings(settings):
+            print(f"  {line}")
+
+    write_generated_file(config_path, config, "Postgres config")
+
+@traced
+def write_pooler_config(pooler=False):
+
+    """
+    Generates the PgBouncer config in '.secrets' from './config/pgbouncer.json'
+    and routes Keycloak and pgAdmin through the pooler if 'pooler' is True,
+    via the compose variables in 'environments/local/.env' (or the
+    instance's env file).
+    """
+
+    secrets_path = instance.secrets_path()
+    os.makedirs(secrets_path, exist_ok=True)
+
+    with open(POOLER_CONFIG_PATH, 'r') as file:
+        settings = json.load(file)
+
+    write_generated_file(os.path.join(secrets_path, POOLER_CONFIG_FILENAME), format_pooler_config(settings), "PgBouncer config")
+
+    update_compose_env(instance.compose_env_path(), {
+        "COMPOSE_PROFILES": "pooler" if pooler else None,
+        "AV_DB_HOST": POOLER_HOST if pooler else None,
+        "AV_DB_PORT": str(POOLER_PORT) if pooler else None
+    })
+
+    if pooler:
+        message = (f"Pooler enabled: clients connect via {POOLER_HOST}:{POOLER_PORT}, pool mode: {settings.get('pool_mode')}, "
+                   f"pool size: {settings.get('default_pool_size')}, max clients: {settings.get('max_client_conn')}")
+    else:
+        message = "Pooler disabled: clients connect to postgres directly."
+
+    emit("pooler", message, enabled=pooler, settings=settings)
+
+@traced
+def write_resource_limits(profile=resources.DEFAULT_PROFILE):
+
+    """
+    Sets the per-service CPU and memory limits of a profile in
+    './config/resource_limits.json' as compose variables. Services without
+    limits, or all with the 'none' profile, may use all of Docker's resources.
+    """
+
+    limits = resources.service_limits(profile)
+    cpus, _, _ = pgtuning.host_resources()
+    values = resources.compose_env(limits, max_cpus=cpus)
+
+    update_compose_env(instance.compose_env_path(), values)
+
+    if limits:
+        summary = ", ".join(f"{service} {values[f'AV_{service.upper()}_CPUS'] or '-'} CPUs/"
+                            f"{values[f'AV_{service.upper()}_MEMORY'] or '-'}" for service in limits)
+        message = f"Resource profile: {profile}, limits: {summary}"
+    else:
+        message = f"Resource profile: {profile}, no limits."
+
+    emit("resource_limits", message, profile=profile, limits={key: value for key, value in values.items() if value})
+
+def update_compose_env(path, values):
+
+    """
+    Sets variables in a compose '.env' file, keeping other lines. Variables
+    with value None are removed. The file is removed if it ends up empty.
+    """
+
+    try:
+        with open(path, 'r') as file:
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+
+    lines = [line for line in lines if line.split('=', 1)[0].strip() not in values]
+    lines += [f"{key}={value}" for key, value in values.items() if value is not None]
+
+    if not lines:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    write_generated_file(path, "\n".join(lines) + "\n", "compose env file")
+
+@traced
+def write_instance_env():
+
+    """
+    Writes the compose env file of an isolated instance: project, container
+    suffix, secrets directory and host ports, allocated on first setup.
+    No-op for the default instance.
+    """
+
+    if not instance.current():
+        return
+
+    os.makedirs(instance.secrets_path(), exist_ok=True)
+    values = instance.instance_env()
+    update_compose_env(instance.compose_env_path(), values)
+
+    ports = ", ".join(f"{key[3:-5].lower()} {values[key]}" for key in instance.DEFAULT_PORTS)
+    emit("instance", f"Instance {instance.current()}: project {values['COMPOSE_PROJECT_NAME']}, ports: {ports}",
+         instance=instance.current(), project=values["COMPOSE_PROJECT_NAME"], ports=instance.ports())
+
+@traced
+def update_docker_images(image_pull=False, pooler=False):
     
     """
-    Pulls latest Docker images if opted in.
+    Pulls latest Docker images if opted in, the PgBouncer image only with
+    the pooler.
     """
     
     if image_pull:
         
+        from pull import main as pull_main # only needed with '-ip'
         print("Updating Docker images.")
         try:
             
-            pull_main()  # pull images
+            pull_main(profiles=["pooler"] if pooler else [])  # pull images
             
         except Exception as e:
-            print(f"Error during Docker image update: {e}")
+            print(f"Error during Docker image update: {e}", level="error")
             sys.exit(1)
     else:
         print("Skipping Docker image update.")
 
-def main(auto=False, password=None, clean=False, keep_volumes=None, keep_secrets=None, salt_base=None, image_pull=False):
+def add_setup_tasks(graph, auto=False, password=None, clean=False, keep_volumes=None, keep_secrets=None, salt_base=None,
+                    image_pull=False, pg_profile=pgtuning.DEFAULT_PROFILE, pooler=False,
+                    resource_profile=resources.DEFAULT_PROFILE, secrets=None):
+
+    """
+    Adds the setup steps to a task graph: secrets and Postgres config depend
+    on the cleanup, the image pull depends on nothing. Tasks must not prompt,
+    pass secrets collected beforehand unless 'auto', see collect_secrets.
+    """
+
+    if clean:
+        graph.add("cleanup", lambda: clean_environment(clean=clean, keep_volumes=keep_volumes, keep_secrets=keep_secrets))
+
+    # the realm needs the instance's ports, the pooler config shares its env file
+    graph.add("instance", write_instance_env, deps=["cleanup"])
+    graph.add("secrets", lambda: create_secrets(keep_secrets=keep_secrets, auto=auto, password=password, salt_base=salt_base,
+                                                secrets=secrets), deps=["cleanup", "instance"])
+    graph.add("postgres-config", lambda: write_postgres_config(profile=pg_profile, resource_profile=resource_profile),
+              deps=["cleanup"])
+    graph.add("pooler-config", lambda: write_pooler_config(pooler=pooler), deps=["instance"])
+    # same env file as the pooler config
+    graph.add("resource-limits", lambda: write_resource_limits(profile=resource_profile), deps=["pooler-config"])
+
+    if image_pull:
+        graph.add("pull", lambda: update_docker_images(image_pull=image_pull, pooler=pooler))
+
+def main(auto=False, password=None, clean=False, keep_volumes=None, keep_secrets=None, salt_base=None, image_pull=False,
+         pg_profile=pgtuning.DEFAULT_PROFILE, parallel=False, pooler=False, resource_profile=resources.DEFAULT_PROFILE):
     
     """
     Main setup function for Avalanche CMS. Configures environment based on
     provided arguments for automation, cleaning, volume and secret retention,
-    salt base customization, and Docker image updates.
+    salt base customization, Postgres tuning profile, connection pooler,
+    resource limits and Docker image updates. Runs independent steps concurrently if 'parallel'
+    is True.
     """
     
     print("Setting up Avalanche CMS Local Development Environment.")
@@ -347,17 +983,36 @@ def main(auto=False, password=None, clean=False, keep_volumes=None, keep_secrets
     if not password:
         print(f"{'Auto' if auto else 'Manual'} mode.")
 
-    clean_environment(clean=clean, keep_volumes=keep_volumes, keep_secrets=keep_secrets)
-    create_secrets(keep_secrets=keep_secrets, auto=auto, password=password, salt_base=salt_base)
-    update_docker_images(image_pull=image_pull)
+    if parallel:
+
+        # prompts first, concurrent tasks would print over them
+        secrets = collect_secrets(clean=clean, keep_secrets=keep_secrets) if not auto and not password else None
+
+        graph = TaskGraph()
+        add_setup_tasks(graph, auto=auto, password=password, clean=clean, keep_volumes=keep_volumes,
+                        keep_secrets=keep_secrets, salt_base=salt_base, image_pull=image_pull, pg_profile=pg_profile,
+                        pooler=pooler, resource_profile=resource_profile, secrets=secrets)
+        try:
+            graph.run()
+        except TaskGraphError as e:
+            print(f"Setup failed: {e}", level="error")
+            sys.exit(1)
+    else:
+        clean_environment(clean=clean, keep_volumes=keep_volumes, keep_secrets=keep_secrets)
+        write_instance_env()
+        create_secrets(keep_secrets=keep_secrets, auto=auto, password=password, salt_base=salt_base)
+        write_postgres_config(profile=pg_profile, resource_profile=resource_profile)
+        write_pooler_config(pooler=pooler)
+        write_resource_limits(profile=resource_profile)
+        update_docker_images(image_pull=image_pull, pooler=pooler)
         
-    print("Avalanche CMS Local Development Environment setted up.")
+    emit("setup_done", "Avalanche CMS Local Development Environment setted up.", auto=auto, clean=clean, parallel=parallel)
 
     # Suggest auto mode if not used and no password provided
     if not auto and not password:
         print("Tip: Use '--auto' for automatic setup.")             
 
-def parse_args():
+def parse_args(argv=None):
 
     parser = argparse.ArgumentParser(description="Setup script for Avalanche CMS.")
     parser.add_argument('-a', '--auto', action='store_true', help='Enables automatic setup.')
@@ -365,8 +1020,18 @@ def parse_args():
     parser.add_argument('-c', '--clean', action='store_true', help="Fully resets the environment.")
     parser.add_argument('-s', '--salt-base', type=str, help="Custom salt base for hashing.")
     parser.add_argument('-ip', '--image-pull', action='store_true', help="Updates Docker images.")
+    parser.add_argument('--pg-profile', choices=sorted(pgtuning.PROFILES), default=pgtuning.DEFAULT_PROFILE,
+                        help=f"Postgres tuning profile (default: {pgtuning.DEFAULT_PROFILE}).")
+    parser.add_argument('--parallel', action='store_true', help="Runs independent steps concurrently.")
+    parser.add_argument('--pooler', action='store_true', help="Routes Keycloak and pgAdmin through PgBouncer.")
+    parser.add_argument('--resource-profile', choices=list(resources.load_profiles()), default=resources.DEFAULT_PROFILE,
+                        help=f"Per-service CPU and memory limits (default: {resources.DEFAULT_PROFILE}).")
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    instance.add_instance_argument(parser)
 
-    args, remaining_argv = parser.parse_known_args()
+    args, remaining_argv = parser.parse_known_args(argv)
+    instance.select_from_args(parser, args)
     
     purge_args = None
     if args.clean:
@@ -378,13 +1043,21 @@ def parse_args():
         
     return args, remaining_argv, purge_args
 
-if __name__ == "__main__":
-    
-    args, remaining_argv, purge_args = parse_args()
+def cli(argv=None):
+
+    """Runs the setup with command line arguments, sys.argv by default."""
+
+    args, remaining_argv, purge_args = parse_args(argv)
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
     
     keep_volumes = purge_args.keep_volumes if args.clean else None
     keep_secrets = purge_args.keep_secrets if args.clean else None
     
     main(auto=args.auto, password=args.password, clean=args.clean, 
          keep_volumes=keep_volumes, keep_secrets=keep_secrets, 
-         salt_base=args.salt_base, image_pull=args.image_pull)
\ No newline at end of file
+         salt_base=args.salt_base, image_pull=args.image_pull, pg_profile=args.pg_profile,
+         parallel=args.parallel, pooler=args.pooler, resource_profile=args.resource_profile)
+
+if __name__ == "__main__":
+    cli()
\ No newline at end of file
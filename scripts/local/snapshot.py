@@ -0,0 +1,272 @@
+"""
+Snapshots and restores the seeded Postgres data volume.
+
+A freshly seeded volume (initdb, init-db.sh, Keycloak realm import, pgAdmin
+schema) is streamed through 'tar' in a throwaway Postgres container into a
+gzip archive in '.snapshots'. Snapshots are keyed by a hash of the stack
+config and '.secrets', a restore only happens if the key matches, so the
+restored roles and users always fit the current secrets.
+
+Used by 'start.py -s'. Stop the stack before creating a snapshot.
+
+Options:
+- -r, --restore: Restores the matching snapshot into a new volume.
+- -k, --key: Prints the current snapshot key.
+- -i, --instance: Snapshots an isolated stack instance's volume.
+- -q, --quiet / --json / --flush: Output options, see utils/output.py.
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+from cleanup import STACK_VOLUME_LABEL, get_stack_volumes
+from pull import read_images
+from utils.decorators import require_docker_running
+from utils.engine import get_engine
+from utils import instance
+from utils import output
+from utils.output import emit, print
+from utils import tracing
+from utils.tracing import traced
+
+# Data volume, as created by docker-compose.yml in the instance's project
+DATA_VOLUME = "postgres-data"
+
+# Snapshot archives, in the project root
+SNAPSHOT_DIR = os.path.join(instance.project_root(), '.snapshots')
+
+# Files in '.secrets' that don't affect the seeded data
+SNAPSHOT_KEY_IGNORED = ("manifest.json", "postgresql.conf", "pgbouncer.ini", "pgbouncer-userlist.txt", instance.COMPOSE_ENV_FILENAME)
+
+# Stack files that affect the seeded data, relative to the project root
+SNAPSHOT_KEY_FILES = [
+    'environments/local/docker-compose.yml',
+    'environments/local/scripts/*.sh',
+    'environments/local/docker/keycloak/*',
+    'scripts/local/config/docker_images*.json'
+]
+
+# Chunk size for streaming archives, gzip level trades size for speed
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+ARCHIVE_COMPRESSLEVEL = 1
+
+def volume_name():
+
+    """Returns the full name of the data volume."""
+
+    return f"{instance.project_name()}_{DATA_VOLUME}"
+
+def snapshot_key():
+
+    """
+    Hashes the stack files and '.secrets' that determine the seeded data.
+
+    Returns the hex key, or None if there are no secrets yet.
+    """
+
+    root = instance.project_root()
+    secrets_path = instance.secrets_path()
+
+    if not os.path.isdir(secrets_path):
+        return None
+
+    paths = [path for pattern in SNAPSHOT_KEY_FILES for path in glob.glob(os.path.join(root, pattern))]
+    paths += [path for path in glob.glob(os.path.join(secrets_path, '**', '*'), recursive=True)
+              if os.path.basename(path) not in SNAPSHOT_KEY_IGNORED]
+
+    digest = hashlib.sha256()
+    for path in sorted(path for path in paths if os.path.isfile(path)):
+        digest.update(os.path.relpath(path, root).replace(os.sep, '/').encode() + b'\0')
+        with open(path, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+
+    return digest.hexdigest()
+
+def snapshot_prefix():
+
+    """Returns the archive name prefix, instances have their own snapshots."""
+
+    return f"{instance.project_name()}-{DATA_VOLUME}" if instance.current() else DATA_VOLUME
+
+def snapshot_path(key):
+
+    """Returns the archive path for a snapshot key."""
+
+    return os.path.join(SNAPSHOT_DIR, f"{snapshot_prefix()}-{key[:16]}.tar.gz")
+
+def find_snapshot():
+
+    """
+    Returns the path of the snapshot matching the current key, None if
+    there is none.
+    """
+
+    key = snapshot_key()
+    if key and os.path.exists(snapshot_path(key)):
+        return snapshot_path(key)
+    return None
+
+def postgres_image():
+
+    """Returns the configured Postgres image, its 'tar' handles the volume."""
+
+    return next(image for image in read_images() if image.startswith("postgres:"))
+
+def tar_command(mode):
+
+    """
+    Returns a 'docker run' command streaming the data volume as tar through
+    stdin ('x') or stdout ('c').
+    """
+
+    return ["docker", "run", "--rm", "-i", "-v", f"{volume_name()}:/data", postgres_image(),
+            "tar", "-C", "/data", f"-{mode}f", "-", *(["."] if mode == "c" else [])]
+
+@traced
+@require_docker_running
+def create_snapshot():
+
+    """
+    Streams the data volume into a gzip archive keyed by the current config
+    and secrets. Replaces older snapshots. The stack must be stopped.
+
+    Returns the archive path.
+    """
+
+    key = snapshot_key()
+    if key is None:
+        raise RuntimeError("No secrets found, run setup.py first")
+
+    if volume_name() not in get_stack_volumes():
+        raise RuntimeError(f"Volume not found: {volume_name()}")
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(key)
+    partial_path = f"{path}.partial"
+
+    print(f"Creating snapshot of {volume_name()}.")
+
+    start = time.perf_counter()
+
+    with tracing.phase("docker run tar", category="command"):
+        process = subprocess.Popen(tar_command("c"), stdout=subprocess.PIPE)
+        with gzip.open(partial_path, 'wb', compresslevel=ARCHIVE_COMPRESSLEVEL) as archive:
+            shutil.copyfileobj(process.stdout, archive, ARCHIVE_CHUNK_SIZE)
+        returncode = process.wait()
+
+    if returncode != 0:
+        os.remove(partial_path)
+        raise RuntimeError(f"Failed to snapshot {volume_name()}")
+
+    os.replace(partial_path, path)
+
+    # a snapshot for another key can never be restored again
+    for stale in glob.glob(os.path.join(SNAPSHOT_DIR, f"{snapshot_prefix()}-*.tar.gz")):
+        if os.path.abspath(stale) != os.path.abspath(path):
+            os.remove(stale)
+
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    elapsed = time.perf_counter() - start
+    emit("snapshot_created", f"Snapshot created: {path} in {elapsed:.1f}s ({size_mb:.0f} MB).",
+         path=path, seconds=round(elapsed, 3), size_mb=round(size_mb, 1))
+
+    return path
+
+def create_volume():
+
+    """
+    Creates the data volume with the labels Docker Compose and cleanup.py
+    expect, so Compose adopts it as its own.
+    """
+
+    key, value = STACK_VOLUME_LABEL.split('=', 1)
+    labels = {"com.docker.compose.project": instance.project_name(), "com.docker.compose.volume": DATA_VOLUME, key: value}
+
+    engine = get_engine()
+
+    if engine is not None:
+        engine.create_volume(volume_name(), labels)
+    else:
+        command = ["docker", "volume", "create"]
+        for label in labels.items():
+            command += ["--label", "=".join(label)]
+        tracing.run(command + [volume_name()], check=True, stdout=subprocess.DEVNULL)
+
+@traced
+@require_docker_running
+def restore_snapshot(path):
+
+    """
+    Streams a snapshot archive into a new data volume. The volume must not
+    exist, see cleanup.py.
+    """
+
+    if volume_name() in get_stack_volumes():
+        raise RuntimeError(f"Volume exists, clean up first: {volume_name()}")
+
+    print(f"Restoring {volume_name()} from snapshot {path}.")
+
+    start = time.perf_counter()
+
+    create_volume()
+
+    with tracing.phase("docker run tar", category="command"):
+        process = subprocess.Popen(tar_command("x"), stdin=subprocess.PIPE)
+        try:
+            with gzip.open(path, 'rb') as archive:
+                shutil.copyfileobj(archive, process.stdin, ARCHIVE_CHUNK_SIZE)
+        finally:
+            process.stdin.close()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise RuntimeError(f"Failed to restore {volume_name()} from {path}")
+
+    elapsed = time.perf_counter() - start
+    emit("snapshot_restored", f"Snapshot restored in {elapsed:.1f}s.", path=path, seconds=round(elapsed, 3))
+
+def main(restore=False, key=False):
+
+    """
+    Creates or restores a snapshot, raises RuntimeError on failures.
+    """
+
+    if key:
+        print(snapshot_key() or "No secrets found.")
+        return
+
+    if restore:
+        path = find_snapshot()
+        if path is None:
+            raise RuntimeError("No snapshot matches the current config and secrets")
+        restore_snapshot(path)
+        return
+
+    create_snapshot()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Avalanche CMS Local Data Volume Snapshot.")
+    parser.add_argument('-r', '--restore', action='store_true', help="Restores the matching snapshot into a new volume.")
+    parser.add_argument('-k', '--key', action='store_true', help="Prints the current snapshot key.")
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    instance.add_instance_argument(parser)
+    args = parser.parse_args()
+    instance.select_from_args(parser, args)
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
+    try:
+        main(restore=args.restore, key=args.key)
+    except RuntimeError as e:
+        print(e, level="error")
+        sys.exit(1)
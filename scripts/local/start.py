@@ -2,24 +2,46 @@
 Starts Avalanche CMS local Docker stack.
 
 Optionally cleans data and updates Docker images. Runs containers and supports detached mode.
+Waits until all services report healthy and prints time-to-ready per service.
 
 Usage:
 - Default: starts containers as is.
 - '-c': Clean start.
 - '-d': Detached mode.
 - '-ip': Pull latest images.
+- '-t': Readiness timeout in seconds.
+- '-ls': Services to show logs of in foreground mode.
+- '-ll': Minimum log level to show in foreground mode.
+- '-r': Resumes a stack suspended by 'stop.py -s'.
+- '--parallel': Runs cleanup, secrets, image pull and build concurrently.
+- '-s': Clean start from a seeded data volume snapshot, keeps secrets.
+- '--pg-profile': Postgres tuning profile for clean starts.
+- '--pooler': Routes Keycloak and pgAdmin through PgBouncer on clean starts.
+- '--resource-profile': Per-service CPU and memory limits for clean starts.
+- '-i': Isolated stack instance, set up on the first (clean) start.
+- '-q', '--json', '--flush': Output options, see utils/output.py.
 """
 
 import argparse
-import os
 import subprocess
 import sys
 import time
-from pull import main as pull_main
-from setup import main as setup_main
 from utils.decorators import require_docker_running
-from utils.output import print
+from utils.pgtuning import DEFAULT_PROFILE, PROFILES
+from utils import resources
+from utils.logmux import LEVELS, LogMultiplexer
+from utils.readiness import (ALL_SERVICES, DEFAULT_READY_TIMEOUT, PROFILE_SERVICES, STACK_SERVICES, active_services,
+                             all_ready, container_status, wait_for_services)
+from utils import instance
+from utils import output
+from utils.output import emit, print
+from utils import tracing
+from utils.tracing import traced
 
+# cleanup, pull, setup, snapshot and the task graph are imported where used,
+# a plain start or resume doesn't load them
+
+@traced
 @require_docker_running
 def update_docker_images(image_pull=False):
     
@@ -28,89 +50,336 @@ def update_docker_images(image_pull=False):
     """
     
     if image_pull:
+        from pull import main as pull_main
         print("Updating images.")
         try:
             pull_main()
         except subprocess.CalledProcessError as e:
-            print(f"Update error: {e}")
+            print(f"Update error: {e}", level="error")
             sys.exit(1)            
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            print(f"Unexpected error: {e}", level="error")
             sys.exit(1)
     else:
         print("Update skipped.")
 
+def report_readiness(results):
+
+    """
+    Prints the readiness summary. Returns True if all services are ready.
+    """
+
+    if all_ready(results):
+        slowest = max(seconds for _, seconds in results.values())
+        emit("stack_ready", f"Started successfully, all services ready in {slowest:.1f}s.", seconds=round(slowest, 3),
+             services={name: round(seconds, 3) for name, (_, seconds) in results.items()})
+        return True
+
+    not_ready = {name: status for name, (status, _) in results.items() if status not in ("healthy", "running")}
+    emit("stack_not_ready", f"Start failed, services not ready: {', '.join(f'{name} ({status})' for name, status in not_ready.items())}",
+         level="error", services=not_ready)
+    return False
+
+@traced
 @require_docker_running
-def start_docker_compose(detach=False):
+def start_docker_compose(detach=False, timeout=DEFAULT_READY_TIMEOUT, log_services=None, log_level=None):
     
     """
-    Starts Docker containers for Avalanche CMS. Supports detached mode.
+    Starts Docker containers for Avalanche CMS and waits until all services
+    report healthy. Supports detached mode.
+
+    Logs are followed per service by a multiplexer, which keeps the recent
+    lines of each service and dumps them if the service fails to become
+    ready. In foreground mode the logs are streamed, filtered by service and
+    level, until CTRL+C stops the stack.
+
+    Returns True if all services became ready.
     """
 
     try:
 
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        env_dir = os.path.join(script_dir, '../../environments/local')
-        original_dir = os.getcwd()
+        # run in the directory of the docker-compose file
+        env_dir = instance.env_dir()
         
-        # Change directory to where the docker-compose file is located
-        os.chdir(env_dir)
-        
-        command = ['docker-compose', 'up', '--remove-orphans']
-        
-        if detach:
-            command.append('-d')
+        started = time.perf_counter()
+        tracing.run(instance.compose_command('up', '--remove-orphans', '-d'), check=True, cwd=env_dir)
+
+        logs = LogMultiplexer(active_services(), env_dir, echo=not detach, show_services=log_services, level=log_level)
+        logs.start()
 
-        process = subprocess.Popen(command)
+        try:
+            ready = report_readiness(wait_for_services(timeout=timeout, started=started, on_failure=logs.dump))
+
+            if detach:
+                return ready
+
+            # foreground: stream logs until the containers stop or CTRL+C
+            print("Streaming logs, press CTRL+C to stop the stack.")
+            logs.wait()
+            return ready
 
-        time.sleep(1)
+        except KeyboardInterrupt:
+            print("Interrupted. Shutting down.")
+            logs.stop()
+            tracing.run(instance.compose_command('stop'), cwd=env_dir)
+            return True
 
-        if process.poll() is None:
-            print("Started successfully.")
-            process.wait()
-        else:
-            print("Start failed.")
-            return
+        finally:
+            logs.stop()
 
     except subprocess.CalledProcessError as e:
-        print(f"Start failed: {e}")
+        print(f"Start failed: {e}", level="error")
+        return False
 
     except FileNotFoundError:
-        print("Compose file missing.")
+        print("Compose file missing.", level="error")
+        return False
 
-    except KeyboardInterrupt:
-        print("Interrupted. Shutting down.")
-        
-    finally:
+@traced
+@require_docker_running
+def resume_docker_compose(timeout=DEFAULT_READY_TIMEOUT):
+
+    """
+    Resumes containers suspended by 'stop.py -s': unpauses paused and starts
+    stopped ones, then waits until all services are ready.
+
+    Returns True if all services became ready, False on failure, None if
+    there is no complete suspended stack to resume.
+    """
+
+    env_dir = instance.env_dir()
+
+    started = time.perf_counter()
+    statuses = {name: container_status(name) for name in active_services()}
 
-        # Change back to the original directory
-        os.chdir(original_dir)
+    if "missing" in statuses.values():
+        print("No suspended stack found.")
+        return None
 
-def main():
+    try:
+        if "paused" in statuses.values():
+            tracing.run(instance.compose_command('unpause'), check=True, cwd=env_dir)
+        if any(status in ("exited", "created") for status in statuses.values()):
+            tracing.run(instance.compose_command('start'), check=True, cwd=env_dir)
+    except subprocess.CalledProcessError as e:
+        print(f"Resume failed: {e}", level="error")
+        return False
+
+    ready = report_readiness(wait_for_services(timeout=timeout, started=started))
+
+    if ready:
+        elapsed = time.perf_counter() - started
+        emit("stack_resumed", f"Resumed in {elapsed:.1f}s.", seconds=round(elapsed, 3))
+
+    return ready
+
+@traced
+@require_docker_running
+def build_images():
+
+    """
+    Builds the stack's custom images (Keycloak), so 'compose up' doesn't
+    build them after all other steps are done.
+    """
+
+    env_dir = instance.env_dir()
+
+    tracing.run(instance.compose_command('build'), check=True, cwd=env_dir)
+
+def prepare_parallel(clean=False, image_pull=False, pg_profile=DEFAULT_PROFILE, pooler=False,
+                     resource_profile=resources.DEFAULT_PROFILE):
+
+    """
+    Runs the steps before 'compose up' as a task graph: cleanup, then
+    secrets and Postgres config, alongside the image pull and build.
+    Exits on failure.
+    """
+
+    from setup import add_setup_tasks
+    from utils.taskgraph import TaskGraph, TaskGraphError
+
+    graph = TaskGraph()
+
+    if clean:
+        print("Cleaning environment.")
+        add_setup_tasks(graph, auto=True, clean=True, image_pull=image_pull, pg_profile=pg_profile, pooler=pooler,
+                        resource_profile=resource_profile)
+    elif image_pull:
+        graph.add("pull", lambda: update_docker_images(image_pull=True))
+
+    # building while the cleanup runs 'compose down', or while setup writes
+    # the compose env files, is not safe
+    graph.add("build", build_images, deps=["cleanup", "instance", "pooler-config", "resource-limits"])
+
+    try:
+        graph.run()
+    except TaskGraphError as e:
+        print(f"Start failed: {e}", level="error")
+        sys.exit(1)
+
+@traced
+@require_docker_running
+def stop_for_snapshot():
+
+    """
+    Stops the stack containers without removing them, so the data volume is
+    consistent for a snapshot.
+    """
+
+    env_dir = instance.env_dir()
+
+    tracing.run(instance.compose_command('stop'), check=True, cwd=env_dir)
+
+@traced
+def clean_start_from_snapshot(pg_profile, pooler=False, resource_profile=resources.DEFAULT_PROFILE):
+
+    """
+    Cleans containers and volumes but keeps secrets, then restores the data
+    volume from the snapshot matching the config and secrets.
+
+    Returns True if a snapshot was restored, False if the volume has to be
+    seeded by a regular start.
+    """
+
+    from cleanup import main as cleanup_main
+    from setup import main as setup_main
+    from snapshot import find_snapshot, restore_snapshot
+
+    print("Cleaning environment, keeping secrets.")
+    cleanup_main(keep_volumes=False, keep_secrets=True)
+
+    # creates missing secrets only, existing ones keep the snapshot key stable
+    setup_main(auto=True, image_pull=False, pg_profile=pg_profile, pooler=pooler, resource_profile=resource_profile)
+
+    path = find_snapshot()
+    if path is None:
+        print("No matching snapshot, seeding the data volume.")
+        return False
+
+    restore_snapshot(path)
+    return True
+
+@traced
+def seed_snapshot(timeout=DEFAULT_READY_TIMEOUT):
+
+    """
+    Starts the stack detached until all services are ready, i.e. the data
+    volume is seeded, stops it and snapshots the volume.
+
+    Returns True on success.
+    """
+
+    if not start_docker_compose(detach=True, timeout=timeout):
+        return False
+
+    from snapshot import create_snapshot
+
+    print("Stopping stack for snapshot.")
+    stop_for_snapshot()
+    create_snapshot()
+
+    return True
+
+def cli(argv=None):
+
+    """Starts the stack per command line arguments, sys.argv by default."""
 
     parser = argparse.ArgumentParser(description="Starts Avalanche CMS Docker stack.")
     parser.add_argument('-c', '--clean', action='store_true', help="Clean start, deletes data.")
     parser.add_argument('-d', '--detach', action='store_true', help="Detached mode.")
     parser.add_argument('-ip', '--image-pull', action='store_true', help="Updates Docker images.")
+    parser.add_argument('-t', '--timeout', type=int, default=DEFAULT_READY_TIMEOUT,
+                        help=f"Seconds to wait for services to become healthy (default: {DEFAULT_READY_TIMEOUT}).")
+    parser.add_argument('-ls', '--log-services', nargs='+', choices=ALL_SERVICES, metavar='SERVICE',
+                        help=f"Shows logs of these services only, foreground mode ({', '.join(ALL_SERVICES)}).")
+    parser.add_argument('-ll', '--log-level', choices=LEVELS, help="Shows log lines of this level or higher, foreground mode.")
+    parser.add_argument('-r', '--resume', action='store_true', help="Resumes a stack suspended by 'stop.py -s'.")
+    parser.add_argument('--parallel', action='store_true',
+                        help="Runs cleanup, secrets, image pull and build concurrently.")
+    parser.add_argument('-s', '--snapshot', action='store_true',
+                        help="Clean start from a seeded data volume snapshot, keeps secrets.")
+    parser.add_argument('--pg-profile', choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help=f"Postgres tuning profile on clean start (default: {DEFAULT_PROFILE}).")
+    parser.add_argument('--pooler', action='store_true', help="Routes Keycloak and pgAdmin through PgBouncer on clean start.")
+    parser.add_argument('--resource-profile', choices=list(resources.load_profiles()), default=resources.DEFAULT_PROFILE,
+                        help=f"Per-service CPU and memory limits on clean start (default: {resources.DEFAULT_PROFILE}).")
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    instance.add_instance_argument(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    instance.select_from_args(parser, args)
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
     
-    if args.clean:
+    if args.parallel and args.snapshot:
+        parser.error("--parallel can't be combined with --snapshot")
+
+    # pgbouncer only runs with the pooler, set up now on clean starts or earlier
+    if args.clean or args.snapshot:
+        services = STACK_SERVICES + (PROFILE_SERVICES["pooler"] if args.pooler else ())
+    else:
+        services = active_services()
+    unavailable = [service for service in args.log_services or () if service not in services]
+    if unavailable:
+        parser.error(f"services not in the stack without --pooler: {', '.join(unavailable)}")
+
+    if args.resume:
+
+        if args.clean or args.snapshot:
+            parser.error("--resume can't be combined with a clean start")
+
+        print("Resuming.")
+        resumed = resume_docker_compose(timeout=args.timeout)
+
+        if resumed is not None:
+            sys.exit(0 if resumed else 1)
+
+        print("Falling back to a regular start.")
+
+    seed = False
+
+    if args.parallel:
+        prepare_parallel(clean=args.clean, image_pull=args.image_pull, pg_profile=args.pg_profile, pooler=args.pooler,
+                         resource_profile=args.resource_profile)
+
+    elif args.snapshot:
+        try:
+            seed = not clean_start_from_snapshot(args.pg_profile, pooler=args.pooler, resource_profile=args.resource_profile)
+        except Exception as e:
+            print(f"Snapshot restore error: {e}", level="error")
+            sys.exit(1)
+
+    elif args.clean:
+        from setup import main as setup_main
         print("Cleaning environment.")
         try:
-            setup_main(auto=True, clean=True, image_pull=False)
+            setup_main(auto=True, clean=True, image_pull=False, pg_profile=args.pg_profile, pooler=args.pooler,
+                       resource_profile=args.resource_profile)
         except Exception as e:
-            print(f"Cleanup error: {e}")
+            print(f"Cleanup error: {e}", level="error")
             sys.exit(1)
 
-    update_docker_images(image_pull=args.image_pull)
+    if not args.parallel:
+        update_docker_images(image_pull=args.image_pull)
+
+    if seed:
+        print("Seeding.")
+        try:
+            if not seed_snapshot(timeout=args.timeout):
+                sys.exit(1)
+        except (subprocess.CalledProcessError, RuntimeError) as e:
+            print(f"Snapshot error: {e}", level="error")
+            sys.exit(1)
     
     print("Starting.")
     try:
-        start_docker_compose(detach=args.detach)
+        if not start_docker_compose(detach=args.detach, timeout=args.timeout,
+                                    log_services=args.log_services, log_level=args.log_level):
+            sys.exit(1)
     except KeyboardInterrupt:
         print("Interrupted by user.")
         sys.exit(0)
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,318 @@
+"""
+Benchmarks service startup of the Avalanche CMS local Docker stack.
+
+Runs N cold starts (containers recreated, 'compose down' + 'up') and warm
+starts (containers kept, 'compose stop' + 'start') against the real Docker
+engine and measures time-to-ready per service from the healthchecks. Data
+volumes are kept, run setup.py and a first start before benchmarking.
+
+Each run is appended to a local history file together with the images and
+realm size it ran with. Samples are compared to the most recent run of the
+same mode with a one-sided Welch's t-test per service; significant slowdowns
+are reported as regressions and exit with a non-zero status.
+
+Options:
+- -n, --runs: Starts per mode (default: 5).
+- -m, --modes: Start modes to run, 'cold' and/or 'warm' (default: both).
+- -a, --alpha: Significance level for regressions (default: 0.05).
+- -t, --timeout: Seconds to wait for services per start (default: 300).
+- --history: History file (default: ./bench/startup_history.jsonl).
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from pull import read_images
+from utils.decorators import require_docker_running
+from utils.output import print
+from utils.readiness import DEFAULT_READY_TIMEOUT, active_services, all_ready, wait_for_services
+from utils import tracing
+
+# Results of all runs, one JSON object per line, host-specific
+HISTORY_PATH = './bench/startup_history.jsonl'
+
+# Start modes: commands stopping and starting the stack
+MODES = {
+    "cold": (["docker", "compose", "down"], ["docker", "compose", "up", "-d"]),
+    "warm": (["docker", "compose", "stop"], ["docker", "compose", "start"])
+}
+
+# Slowdowns below this relative change are never flagged, however significant
+MIN_REGRESSION = 0.05
+
+# Rendered Keycloak realm, its size is recorded with each run
+REALM_PATH = '../../.secrets/keycloak-realm-config.json'
+
+def env_dir():
+
+    """Returns the directory of the docker-compose file."""
+
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../environments/local')
+
+def measure_start(mode, timeout):
+
+    """
+    Stops and starts the stack in the given mode.
+
+    Returns dict of service to seconds until ready, raises RuntimeError if
+    a service doesn't become ready.
+    """
+
+    stop_command, start_command = MODES[mode]
+
+    tracing.run(stop_command, check=True, cwd=env_dir(), capture_output=True)
+
+    started = time.perf_counter()
+    tracing.run(start_command, check=True, cwd=env_dir(), capture_output=True)
+    results = wait_for_services(timeout=timeout, started=started)
+
+    if not all_ready(results):
+        raise RuntimeError(f"Services not ready in {mode} start: {results}")
+
+    return {name: round(seconds, 3) for name, (_, seconds) in results.items()}
+
+@require_docker_running
+def run_benchmark(runs, modes, timeout):
+
+    """
+    Runs 'runs' starts per mode, alternating modes to spread drift.
+
+    Returns dict of mode to service to list of seconds.
+    """
+
+    samples = {mode: {name: [] for name in active_services()} for mode in modes}
+
+    for run in range(1, runs + 1):
+        for mode in modes:
+            print(f"Run {run}/{runs}: {mode} start.")
+            with tracing.phase(f"{mode} start", category="benchmark"):
+                for name, seconds in measure_start(mode, timeout).items():
+                    samples[mode][name].append(seconds)
+
+    return samples
+
+def beta_continued_fraction(a, b, x):
+
+    """
+    Continued fraction for the regularized incomplete beta function
+    (modified Lentz's method).
+    """
+
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+
+    for m in range(1, 200):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+
+    return result
+
+def incomplete_beta(a, b, x):
+
+    """
+    Regularized incomplete beta function I_x(a, b).
+    """
+
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+
+    # the continued fraction converges fast for x below the mean
+    if x < (a + 1) / (a + b + 2):
+        return front * beta_continued_fraction(a, b, x) / a
+    return 1.0 - front * beta_continued_fraction(b, a, 1 - x) / b
+
+def welch_t_test(previous, current):
+
+    """
+    One-sided Welch's t-test, alternative: current mean > previous mean.
+
+    Returns tuple (t statistic, degrees of freedom, p-value), None if a
+    sample has fewer than 2 values.
+    """
+
+    if len(previous) < 2 or len(current) < 2:
+        return None
+
+    mean_previous, mean_current = statistics.fmean(previous), statistics.fmean(current)
+    var_previous = statistics.variance(previous) / len(previous)
+    var_current = statistics.variance(current) / len(current)
+    se = math.sqrt(var_previous + var_current)
+
+    if se == 0:
+        return (math.inf, math.inf, 0.0) if mean_current > mean_previous else (0.0, math.inf, 1.0)
+
+    t = (mean_current - mean_previous) / se
+    df = (var_previous + var_current) ** 2 / (var_previous ** 2 / (len(previous) - 1) + var_current ** 2 / (len(current) - 1))
+
+    # Student's t tail: P(T > t) = I_x(df/2, 1/2) / 2 for t > 0, x = df / (df + t^2)
+    tail = incomplete_beta(df / 2, 0.5, df / (df + t * t)) / 2
+    return t, df, tail if t > 0 else 1 - tail
+
+def find_regressions(previous, samples, alpha):
+
+    """
+    Compares samples to the previous runs per mode, see previous_samples.
+
+    Returns list of regression messages.
+    """
+
+    regressions = []
+
+    for mode, services in samples.items():
+        for name, current in services.items():
+
+            before = previous.get(mode, {}).get(name)
+            result = welch_t_test(before or [], current)
+            if result is None:
+                continue
+
+            _, _, p = result
+            change = statistics.fmean(current) / statistics.fmean(before) - 1
+
+            if p < alpha and change > MIN_REGRESSION:
+                regressions.append(f"{mode} {name}: {statistics.fmean(before):.1f}s -> {statistics.fmean(current):.1f}s "
+                                   f"(+{change:.0%}, p={p:.3f})")
+
+    return regressions
+
+def run_context():
+
+    """
+    Returns the inputs that typically cause startup regressions: image
+    references and the rendered realm size.
+    """
+
+    try:
+        realm_bytes = os.path.getsize(REALM_PATH)
+    except FileNotFoundError:
+        realm_bytes = None
+
+    return {"images": read_images(), "realm_bytes": realm_bytes}
+
+def read_history(path):
+
+    """
+    Reads all runs from the history, oldest first.
+    """
+
+    try:
+        with open(path, 'r') as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def previous_samples(history):
+
+    """
+    Picks the baseline per mode: the samples of the most recent run that
+    included the mode.
+
+    Returns dict of mode to service to list of seconds.
+    """
+
+    previous = {}
+    for run in history:
+        previous.update(run.get("samples", {}))
+    return previous
+
+def append_run(path, run):
+
+    """
+    Appends a run to the history file.
+    """
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', newline='\n') as file:
+        file.write(json.dumps(run, sort_keys=True) + '\n')
+
+def print_report(samples, previous):
+
+    """
+    Prints mean and standard deviation per mode and service, with the
+    previous run's mean in parentheses.
+    """
+
+    print(f"{'mode':<8}{'service':<12}{'mean [s]':>18}{'stdev [s]':>12}{'min [s]':>10}{'max [s]':>10}")
+
+    for mode, services in samples.items():
+        for name, values in services.items():
+
+            before = previous.get(mode, {}).get(name)
+            mean = f"{statistics.fmean(values):.2f}"
+            if before:
+                mean += f" ({statistics.fmean(before):.2f})"
+            stdev = statistics.stdev(values) if len(values) > 1 else 0.0
+
+            print(f"{mode:<8}{name:<12}{mean:>18}{stdev:>12.2f}{min(values):>10.2f}{max(values):>10.2f}")
+
+def main(runs=5, modes=tuple(MODES), alpha=0.05, timeout=DEFAULT_READY_TIMEOUT, history=HISTORY_PATH):
+
+    """
+    Runs the startup benchmark, records it, exits with 1 on regressions.
+    """
+
+    print(f"Benchmarking stack startup ({runs} run(s), modes: {', '.join(modes)}).")
+
+    runs_before = read_history(history)
+    previous = previous_samples(runs_before)
+
+    try:
+        samples = run_benchmark(runs, modes, timeout)
+    except Exception as e:
+        print(f"Benchmark failed: {e}")
+        sys.exit(1)
+
+    print_report(samples, previous)
+
+    append_run(history, {"ts": time.time(), "runs": runs, **run_context(), "samples": samples})
+    print(f"Run recorded: {history}")
+
+    if not previous:
+        print("No previous run, nothing to compare.")
+        return
+
+    if runs_before[-1].get("images") != read_images():
+        print("Note: images changed since the previous run.")
+
+    regressions = find_regressions(previous, samples, alpha)
+
+    if regressions:
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1)
+
+    print(f"No significant regressions (alpha: {alpha}).")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Avalanche CMS local stack startup benchmark.")
+    parser.add_argument('-n', '--runs', type=int, default=5, help="Starts per mode (default: 5).")
+    parser.add_argument('-m', '--modes', nargs='+', choices=list(MODES), default=list(MODES), help="Start modes to run.")
+    parser.add_argument('-a', '--alpha', type=float, default=0.05, help="Significance level (default: 0.05).")
+    parser.add_argument('-t', '--timeout', type=int, default=DEFAULT_READY_TIMEOUT,
+                        help=f"Seconds to wait for services per start (default: {DEFAULT_READY_TIMEOUT}).")
+    parser.add_argument('--history', type=str, default=HISTORY_PATH, help=f"History file (default: {HISTORY_PATH}).")
+    tracing.add_profile_argument(parser)
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    tracing.start_profile(args.profile)
+    main(runs=args.runs, modes=args.modes, alpha=args.alpha, timeout=args.timeout, history=args.history)
@@ -0,0 +1,95 @@
+"""
+Shows the status of the Avalanche CMS local Docker stack.
+
+Prints the Compose project, each service's container status (health status
+for running services with a healthcheck) and host ports. Exits with a
+non-zero status unless all services are ready, e.g. for
+'avalanche.py status && run-tests'.
+
+Options:
+- -i, --instance: Shows an isolated stack instance.
+- -q, --quiet / --json / --flush: Output options, see utils/output.py.
+"""
+
+import argparse
+import sys
+from utils.decorators import require_docker_running
+from utils import instance
+from utils import output
+from utils.output import emit, print
+from utils.readiness import STACK_SERVICES, container_status
+from utils import tracing
+
+# Optional services, only shown if their container exists
+OPTIONAL_SERVICES = ("pgbouncer",)
+
+# Container statuses counting as ready
+READY_STATUSES = ("healthy", "running")
+
+# Host port per service, by compose variable of utils/instance.py
+SERVICE_PORTS = {
+    "postgres": "AV_POSTGRES_PORT",
+    "pgbouncer": "AV_PGBOUNCER_PORT",
+    "pgadmin": "AV_PGADMIN_PORT",
+    "keycloak": "AV_KEYCLOAK_PORT"
+}
+
+@require_docker_running
+def stack_status():
+
+    """
+    Fetches the status of all stack services.
+
+    Returns dict of service to status, e.g. 'healthy', 'starting', 'paused'
+    or 'missing'. Optional services are left out if missing.
+    """
+
+    statuses = {service: container_status(service) for service in STACK_SERVICES + OPTIONAL_SERVICES}
+
+    return {service: status for service, status in statuses.items()
+            if not (service in OPTIONAL_SERVICES and status == "missing")}
+
+def main():
+
+    """
+    Prints the stack status. Returns True if all services are ready.
+    """
+
+    with tracing.phase("status", category="status"):
+        statuses = stack_status()
+
+    ports = instance.ports()
+    ready = all(status in READY_STATUSES for status in statuses.values())
+
+    print(f"Project: {instance.project_name()}")
+
+    if not output.is_json(): # the event carries the statuses
+        for service, status in statuses.items():
+            print(f"  {service:<12}{status:<12}port {ports[SERVICE_PORTS[service]]}")
+
+    emit("stack_status", "Ready." if ready else "Not ready.", level="info" if ready else "warning",
+         project=instance.project_name(), ready=ready, services=statuses,
+         ports={service: ports[SERVICE_PORTS[service]] for service in statuses})
+
+    return ready
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Avalanche CMS local stack status.")
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    instance.add_instance_argument(parser)
+    args = parser.parse_args(argv)
+    instance.select_from_args(parser, args)
+    return args
+
+def cli(argv=None):
+
+    """Shows the status with command line arguments, sys.argv by default."""
+
+    args = parse_args(argv)
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
+    sys.exit(0 if main() else 1)
+
+if __name__ == "__main__":
+    cli()
@@ -3,55 +3,109 @@ Stops Avalanche CMS local Docker stack.
 
 Safely shuts down Docker containers for Avalanche CMS. Checks for Docker,
 handles errors, and supports graceful interruption.
+
+Options:
+- -s, --suspend [pause|stop]: Keeps the containers for a fast 'start.py -r'
+  instead of removing them. 'pause' (default) freezes the processes and keeps
+  their memory, 'stop' shuts them down but keeps their filesystem.
+- -i, --instance: Stops an isolated stack instance.
+- -q, --quiet / --json / --flush: Output options, see utils/output.py.
 """
 
 import argparse
-import os
 import subprocess
+import time
 from utils.decorators import require_docker_running
-from utils.output import print
+from utils import instance
+from utils import output
+from utils.output import emit, print
+from utils import tracing
+from utils.tracing import traced
 
 # Stops Avalanche CMS Docker containers
+@traced
 @require_docker_running
 def stop_docker_compose():
     
     """
     Stops local Avalanche CMS Docker containers.
+
+    Returns True on success.
     """
     
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        env_dir = os.path.join(script_dir, '../../environments/local')
-        original_dir = os.getcwd()
-        
-        # Change directory to where the docker-compose file is located
-        os.chdir(env_dir)
+        env_dir = instance.env_dir()
 
         # Use subprocess.run to wait for the command to complete
-        subprocess.run(["docker", "compose", "down"], check=True)
+        tracing.run(instance.compose_command("down"), check=True, cwd=env_dir)
+        return True
 
     except subprocess.CalledProcessError as e:
-        print(f"Stop failed: {e}")
+        print(f"Stop failed: {e}", level="error")
     except FileNotFoundError:
-        print("Compose file missing.")
+        print("Compose file missing.", level="error")
     except KeyboardInterrupt:
         print("Interrupted.")
-    finally:
-        # Change back to the original directory
-        os.chdir(original_dir)
+
+    return False
         
+@traced
+@require_docker_running
+def suspend_docker_compose(mode="pause"):
+
+    """
+    Suspends the stack without removing containers, for 'start.py -r'.
+
+    Args:
+        mode (str): 'pause' keeps processes and memory, 'stop' stops them.
+
+    Returns True on success.
+    """
+
+    start = time.perf_counter()
+
+    try:
+        tracing.run(instance.compose_command(mode), check=True, cwd=instance.env_dir())
+    except subprocess.CalledProcessError as e:
+        print(f"Suspend failed: {e}", level="error")
+        return False
+
+    elapsed = time.perf_counter() - start
+    emit("stack_suspended", f"Suspended ({'paused' if mode == 'pause' else 'stopped'}) in {elapsed:.1f}s. Resume with 'start.py -r'.",
+         mode=mode, seconds=round(elapsed, 3))
+    return True
+
 # Main
-def main():
+def cli(argv=None):
+
+    """Stops or suspends the stack per command line arguments, sys.argv by default."""
 
     parser = argparse.ArgumentParser(description="Avalanche CMS local development stack stop.")
-    args = parser.parse_args()
+    parser.add_argument('-s', '--suspend', nargs='?', const='pause', choices=['pause', 'stop'],
+                        help="Keeps containers for a fast resume: 'pause' (default) or 'stop'.")
+    tracing.add_profile_argument(parser)
+    output.add_output_arguments(parser)
+    instance.add_instance_argument(parser)
+    args = parser.parse_args(argv)
+    instance.select_from_args(parser, args)
+    output.configure_output(args)
+    tracing.start_profile(args.profile)
+
+    if args.suspend:
+        print("Suspending.")
+        try:
+            suspend_docker_compose(mode=args.suspend)
+        except KeyboardInterrupt:
+            print("Interrupted.")
+        return
     
     print("Stopping.") 
+    start = time.perf_counter()
     try:
-        stop_docker_compose()
-        print("Stopped.") 
+        if stop_docker_compose():
+            emit("stack_stopped", "Stopped.", seconds=round(time.perf_counter() - start, 3))
     except KeyboardInterrupt:
         print("Interrupted.")
 
 if __name__ == "__main__":
-    main()
+    cli()
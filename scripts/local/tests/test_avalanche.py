@@ -0,0 +1,35 @@
+"""
+Tests of avalanche.py, run as a subprocess from outside scripts/local.
+
+Run from scripts/local: 'pytest tests'.
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+from avalanche import COMMANDS
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "avalanche.py")
+
+def run_avalanche(cwd, *args):
+    return subprocess.run([sys.executable, SCRIPT_PATH, *args], cwd=cwd, capture_output=True, text=True, timeout=60)
+
+@pytest.mark.parametrize("command", list(COMMANDS))
+def test_command_help_from_other_directory(tmp_path, command):
+    result = run_avalanche(tmp_path, command, "--help")
+
+    assert result.returncode == 0, result.stderr
+    assert f"avalanche.py {command}" in result.stdout
+
+def test_command_list_from_other_directory(tmp_path):
+    result = run_avalanche(tmp_path, "--help")
+
+    assert result.returncode == 0, result.stderr
+    assert all(command in result.stdout for command in COMMANDS)
+
+def test_invalid_command(tmp_path):
+    result = run_avalanche(tmp_path, "nope")
+
+    assert result.returncode == 2
+    assert "invalid" in result.stderr
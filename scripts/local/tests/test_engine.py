@@ -0,0 +1,186 @@
+"""
+Tests of utils/engine.py against a fake engine on a local unix socket.
+
+Run from scripts/local: 'python -m unittest discover tests' or 'pytest tests'.
+"""
+
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler
+from unittest import mock
+from utils import decorators
+from utils import engine
+from utils.engine import DockerEngine, DockerEngineError
+
+class FakeEngineHandler(BaseHTTPRequestHandler):
+
+    """
+    Answers '/_ping' with 'OK' and '/info' with JSON, keep-alive. The
+    server's 'mode' injects faults: 'drop' closes the connection after each
+    response without telling the client, 'garbage' sends no HTTP at all.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        if self.server.mode == "garbage":
+            self.wfile.write(b"garbage\r\n\r\n")
+            self.close_connection = True
+            return
+
+        if self.path.endswith("/_ping"):
+            self.respond(200, b"OK", "text/plain")
+        elif self.path.endswith("/info"):
+            self.respond(200, json.dumps({"NCPU": 4}).encode(), "application/json")
+        else:
+            self.respond(404, json.dumps({"message": "page not found"}).encode(), "application/json")
+
+        if self.server.mode == "drop":
+            self.close_connection = True
+
+    def respond(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeEngineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, mode=None):
+        super().__init__(socket_path, FakeEngineHandler)
+        self.mode = mode
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0) # unix sockets have no address, the handler logs one
+
+class EngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.directory.name, "docker.sock")
+
+    def tearDown(self):
+        server = getattr(self, "server", None)
+        if server:
+            server.shutdown()
+            server.server_close()
+        self.directory.cleanup()
+
+    def start_server(self, mode=None):
+        self.server = FakeEngineServer(self.socket_path, mode)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+class DockerEngineTest(EngineTestCase):
+
+    def test_requests_reuse_connection(self):
+        server = self.start_server()
+        client = DockerEngine(self.socket_path, timeout=5)
+
+        self.assertTrue(client.ping())
+        self.assertEqual(client.info(), {"NCPU": 4})
+        self.assertTrue(client.ping())
+
+        self.assertEqual(server.connections, 1)
+
+    def test_threads_use_own_connections(self):
+        server = self.start_server()
+        client = DockerEngine(self.socket_path, timeout=5)
+
+        threads = [threading.Thread(target=client.ping) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(server.connections, 3)
+
+    def test_closed_connection_is_retried(self):
+        server = self.start_server(mode="drop")
+        client = DockerEngine(self.socket_path, timeout=5)
+
+        # each request after the first hits a connection closed by the engine
+        for _ in range(3):
+            self.assertEqual(client.info(), {"NCPU": 4})
+
+        self.assertEqual(server.connections, 3)
+
+    def test_invalid_response_raises_engine_error(self):
+        self.start_server(mode="garbage")
+        client = DockerEngine(self.socket_path, timeout=5)
+
+        with self.assertRaises(DockerEngineError) as context:
+            client.info()
+        self.assertIsNone(context.exception.status)
+        self.assertFalse(client.ping())
+
+    def test_error_status_raises_engine_error(self):
+        self.start_server()
+        client = DockerEngine(self.socket_path, timeout=5)
+
+        with self.assertRaises(DockerEngineError) as context:
+            client.inspect_container("missing")
+        self.assertEqual(context.exception.status, 404)
+        self.assertIn("page not found", str(context.exception))
+
+    def test_unreachable_engine_raises_engine_error(self):
+        client = DockerEngine(self.socket_path, timeout=5)
+
+        with self.assertRaises(DockerEngineError) as context:
+            client.info()
+        self.assertIsNone(context.exception.status)
+        self.assertFalse(client.ping())
+
+class GetEngineTest(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reset_engine()
+        self.addCleanup(self.reset_engine)
+
+    def reset_engine(self):
+        engine._engine, engine._engine_resolved = None, False
+        decorators._docker_running = False
+
+    def test_engine_for_existing_socket(self):
+        self.start_server()
+
+        with mock.patch.dict(os.environ, {"DOCKER_HOST": f"unix://{self.socket_path}"}), \
+             mock.patch.object(decorators, "run") as run:
+            self.assertIsNotNone(engine.get_engine())
+            self.assertTrue(decorators.is_docker_running())
+
+        run.assert_not_called()
+
+    def test_cli_fallback_without_socket(self):
+        with mock.patch.dict(os.environ, {"DOCKER_HOST": f"unix://{self.socket_path}"}), \
+             mock.patch.object(decorators, "run") as run:
+            self.assertIsNone(engine.get_engine())
+            self.assertTrue(decorators.is_docker_running())
+
+        self.assertEqual(run.call_args.args[0], ["docker", "info"])
+
+    def test_cli_fallback_for_tcp_host(self):
+        with mock.patch.dict(os.environ, {"DOCKER_HOST": "tcp://localhost:2375"}):
+            self.assertIsNone(engine.get_engine())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Tests of port allocation in utils/instance.py, without binding ports.
+
+Run from scripts/local: 'pytest tests'.
+"""
+
+import zlib
+import pytest
+from utils import instance
+
+def use_instance(monkeypatch, instance_id, reserved=(), busy=()):
+
+    """Selects an instance with stubbed reserved and busy ports."""
+
+    monkeypatch.setattr(instance, "_current", None)
+    instance.select(instance_id)
+    monkeypatch.setattr(instance, "reserved_ports", lambda: set(reserved))
+    monkeypatch.setattr(instance, "is_port_free", lambda port: port not in busy)
+
+def block_start(instance_id):
+
+    """Returns the first port of an instance's block, like allocate_ports."""
+
+    size = instance.PORT_RANGE_END - instance.PORT_RANGE_START
+    keys = len(instance.DEFAULT_PORTS)
+    return instance.PORT_RANGE_START + zlib.crc32(instance_id.encode()) % (size // keys) * keys
+
+def test_ports_are_consecutive_in_instance_block(monkeypatch):
+    use_instance(monkeypatch, "shard-1")
+    start = block_start("shard-1")
+
+    ports = instance.allocate_ports()
+
+    assert list(ports) == list(instance.DEFAULT_PORTS)
+    assert list(ports.values()) == list(range(start, start + len(instance.DEFAULT_PORTS)))
+
+def test_same_instance_gets_same_ports(monkeypatch):
+    use_instance(monkeypatch, "shard-1")
+    first = instance.allocate_ports()
+
+    assert instance.allocate_ports() == first
+
+def test_reserved_and_busy_ports_are_skipped(monkeypatch):
+    start = block_start("shard-1")
+    use_instance(monkeypatch, "shard-1", reserved=[start, start + 2], busy=[start + 3])
+
+    ports = instance.allocate_ports()
+
+    assert list(ports.values()) == [start + 1, start + 4, start + 5, start + 6]
+
+def test_search_wraps_around_range_end(monkeypatch):
+    monkeypatch.setattr(instance, "PORT_RANGE_START", 20000)
+    monkeypatch.setattr(instance, "PORT_RANGE_END", 20008)
+
+    # an instance whose block is the second half of the range
+    instance_id = next(f"shard-{n}" for n in range(100) if block_start(f"shard-{n}") == 20004)
+    use_instance(monkeypatch, instance_id, busy=[20005, 20006, 20007])
+
+    ports = instance.allocate_ports()
+
+    assert list(ports.values()) == [20004, 20000, 20001, 20002]
+
+def test_exhausted_range_raises(monkeypatch):
+    monkeypatch.setattr(instance, "PORT_RANGE_START", 20000)
+    monkeypatch.setattr(instance, "PORT_RANGE_END", 20008)
+    use_instance(monkeypatch, "shard-1", reserved=range(20000, 20004), busy=range(20004, 20006))
+
+    with pytest.raises(RuntimeError):
+        instance.allocate_ports()
@@ -0,0 +1,76 @@
+"""
+Tests of utils/pgtuning.py.
+
+Run from scripts/local: 'pytest tests'.
+"""
+
+import pytest
+from utils.pgtuning import GB, MB, format_config, format_size, tune
+
+def test_small_laptop():
+    settings = tune(2, 2 * GB)
+
+    # a quarter of memory, a quarter of that for shared buffers
+    assert settings["shared_buffers"] == 128 * MB
+    assert settings["effective_cache_size"] == 384 * MB
+    assert settings["maintenance_work_mem"] == 64 * MB
+    assert settings["wal_buffers"] == 4 * MB
+    assert settings["max_connections"] == 50
+    assert settings["max_parallel_workers_per_gather"] == 1
+    assert settings["max_worker_processes"] == 8
+
+    # 384MB over 50 connections * 3 is below the floor
+    assert settings["work_mem"] == 4 * MB
+
+def test_large_load_test_host_is_capped():
+    settings = tune(64, 256 * GB, "load-test")
+
+    # half of memory is capped at 16GB
+    assert settings["shared_buffers"] == 4 * GB
+    assert settings["effective_cache_size"] == 12 * GB
+    assert settings["maintenance_work_mem"] == 1 * GB
+    assert settings["wal_buffers"] == 16 * MB
+    assert settings["max_connections"] == 200
+    assert settings["max_parallel_workers_per_gather"] == 4
+    assert settings["max_parallel_workers"] == 64
+    assert settings["max_worker_processes"] == 64
+
+    # 12GB over 200 connections * 3 * 4 workers, whole MB
+    assert settings["work_mem"] == 5 * MB
+
+def test_minimums_on_tiny_memory():
+    settings = tune(1, 64 * MB)
+
+    assert settings["shared_buffers"] == 32 * MB
+    assert settings["work_mem"] == 4 * MB
+    assert settings["maintenance_work_mem"] == 64 * MB
+    assert settings["wal_buffers"] == 1 * MB
+    assert settings["max_parallel_workers_per_gather"] == 1
+
+def test_memory_budget_grows_with_memory_until_cap():
+    budgets = [tune(8, memory)["effective_cache_size"] for memory in (4 * GB, 8 * GB, 16 * GB, 64 * GB)]
+
+    assert budgets == sorted(budgets)
+    assert budgets[-1] == budgets[-2] == 1536 * MB # laptop cap of 2GB, three quarters
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        tune(2, 2 * GB, "server")
+
+@pytest.mark.parametrize("size, expected", [
+    (2 * GB, "2GB"),
+    (1536 * MB, "1536MB"),
+    (64 * 1024, "64kB"),
+    (1024, "64kB"),
+    (MB + 512 * 1024, "1536kB")
+])
+def test_format_size(size, expected):
+    assert format_size(size) == expected
+
+def test_format_config_includes_base_config():
+    config = format_config(tune(2, 2 * GB), "laptop", 2, 2 * GB, base_config="/var/lib/postgresql/data/postgresql.conf")
+
+    lines = config.splitlines()
+    assert "include_if_exists '/var/lib/postgresql/data/postgresql.conf'" in lines
+    assert "shared_buffers = 128MB" in lines
+    assert lines.index("shared_buffers = 128MB") > lines.index("listen_addresses = '*'")
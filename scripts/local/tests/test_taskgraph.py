@@ -0,0 +1,134 @@
+"""
+Tests of utils/taskgraph.py with stub tasks.
+
+Run from scripts/local: 'pytest tests'.
+"""
+
+import sys
+import threading
+import time
+import pytest
+from utils.taskgraph import TaskGraph, TaskGraphError
+
+def recorder(calls, name, seconds=0.0):
+
+    """Returns a stub task that sleeps, then records its name."""
+
+    def task():
+        time.sleep(seconds)
+        calls.append(name)
+    return task
+
+def fail():
+    raise RuntimeError("boom")
+
+def test_dependencies_run_first():
+    calls = []
+    graph = TaskGraph()
+    graph.add("a", recorder(calls, "a", 0.05))
+    graph.add("b", recorder(calls, "b"), deps=["a"])
+    graph.add("c", recorder(calls, "c"), deps=["b"])
+
+    results = graph.run()
+
+    assert calls == ["a", "b", "c"]
+    assert all(result["status"] == "done" for result in results.values())
+
+def test_independent_tasks_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5) # breaks unless both tasks run at once
+    graph = TaskGraph()
+    graph.add("a", barrier.wait)
+    graph.add("b", barrier.wait)
+
+    results = graph.run()
+
+    assert [result["status"] for result in results.values()] == ["done", "done"]
+
+def test_single_worker_runs_sequentially():
+    calls = []
+    graph = TaskGraph()
+    for name in ("a", "b", "c"):
+        graph.add(name, recorder(calls, name))
+
+    graph.run(workers=1)
+
+    assert calls == ["a", "b", "c"]
+
+def test_failure_cancels_dependents_only():
+    calls = []
+    graph = TaskGraph()
+    graph.add("a", fail)
+    graph.add("b", recorder(calls, "b"), deps=["a"])
+    graph.add("c", recorder(calls, "c"), deps=["b"]) # cancelled transitively
+    graph.add("d", recorder(calls, "d"))
+
+    with pytest.raises(TaskGraphError) as error:
+        graph.run()
+
+    assert error.value.failed == ["a"]
+    assert sorted(error.value.cancelled) == ["b", "c"]
+    assert calls == ["d"]
+    assert graph.results["a"]["error"] == "boom"
+    assert graph.results["b"]["status"] == "cancelled"
+
+def test_unknown_dependencies_are_ignored():
+    calls = []
+    graph = TaskGraph()
+    graph.add("a", recorder(calls, "a"), deps=["cleanup"])
+
+    graph.run()
+
+    assert graph.tasks["a"][1] == []
+    assert calls == ["a"]
+
+def test_dependencies_added_later_are_ignored():
+    graph = TaskGraph()
+    graph.add("a", lambda: None, deps=["b"])
+    graph.add("b", lambda: None)
+
+    assert graph.tasks["a"][1] == []
+
+def test_system_exit_fails_task():
+    graph = TaskGraph()
+    graph.add("a", lambda: sys.exit(3))
+    graph.add("b", lambda: None, deps=["a"])
+
+    with pytest.raises(TaskGraphError) as error:
+        graph.run()
+
+    assert graph.results["a"]["status"] == "failed"
+    assert graph.results["a"]["error"] == "exit code 3"
+    assert error.value.cancelled == ["b"]
+
+def test_duplicate_task_is_rejected():
+    graph = TaskGraph()
+    graph.add("a", lambda: None)
+
+    with pytest.raises(ValueError):
+        graph.add("a", lambda: None)
+
+def test_critical_path_follows_last_finished_dependency():
+    calls = []
+    graph = TaskGraph()
+    graph.add("cleanup", recorder(calls, "cleanup", 0.02))
+    graph.add("pull", recorder(calls, "pull", 0.2))
+    graph.add("secrets", recorder(calls, "secrets", 0.02), deps=["cleanup"])
+    graph.add("build", recorder(calls, "build", 0.02), deps=["cleanup", "pull"])
+
+    graph.run()
+
+    assert graph.critical_path() == ["pull", "build"]
+
+def test_critical_path_skips_unfinished_tasks():
+    graph = TaskGraph()
+    graph.add("a", lambda: time.sleep(0.02))
+    graph.add("b", fail, deps=["a"])
+    graph.add("c", lambda: None, deps=["b"])
+
+    with pytest.raises(TaskGraphError):
+        graph.run()
+
+    assert graph.critical_path() == ["a", "b"]
+
+def test_critical_path_without_results():
+    assert TaskGraph().critical_path() == []
@@ -9,7 +9,36 @@ Contains decorators for script functionality.
 from functools import wraps
 import subprocess
 import sys
+from .engine import get_engine
 from .output import print
+from .tracing import run
+
+# Cached liveness probe result, the engine is checked once per process
+_docker_running = False
+
+def is_docker_running():
+
+    """
+    Verifies Docker engine status via the engine socket, or the 'docker info'
+    command if no socket is available. A positive result is cached.
+    """
+
+    global _docker_running
+
+    if not _docker_running:
+
+        engine = get_engine()
+
+        if engine is not None:
+            _docker_running = engine.ping()
+        else:
+            try:
+                run(["docker", "info"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                _docker_running = True
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                _docker_running = False
+
+    return _docker_running
 
 def require_docker_running(func):
 
@@ -24,18 +53,8 @@ def require_docker_running(func):
         Checks Docker status; proceeds or exits with an error if not running.
         """
 
-        def is_docker_running():
-            
-            """Verifies Docker engine status via 'docker info' command."""
-            
-            try:
-                subprocess.run(["docker", "info"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                return True
-            except subprocess.CalledProcessError:
-                return False
-
         if not is_docker_running():
-            print("Docker not running.")
+            print("Docker not running.", level="error")
             sys.exit(1)
 
         return func(*args, **kwargs)
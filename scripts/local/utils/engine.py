@@ -0,0 +1,297 @@
+"""
+engine.py
+
+Minimal Docker Engine API client over the local unix socket.
+
+- DockerEngine: Talks HTTP to the engine socket, one persistent connection
+  per thread, no 'docker' CLI process per call.
+- get_engine: Shared per-process client, None if no unix socket is available
+  (e.g. Docker Desktop on Windows). Callers fall back to the docker CLI then.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from urllib.parse import quote, urlencode
+from . import tracing
+
+# Default engine socket, overridden by DOCKER_HOST=unix://<path>
+DEFAULT_SOCKET_PATH = "/var/run/docker.sock"
+
+# Pinned API version, supported by Docker Engine 20.10 and later
+API_VERSION = "v1.41"
+
+class DockerEngineError(Exception):
+
+    """
+    Raised on failed engine requests. 'status' is the HTTP status, None if
+    the engine was unreachable.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+_connection_class = None
+
+def unix_http_connection(socket_path, timeout=60):
+
+    """
+    Returns an HTTP connection over a unix domain socket. http.client is
+    imported on first use: with ssl and email it's the largest import of
+    the scripts, and not needed for e.g. '--help'.
+    """
+
+    global _connection_class
+
+    if _connection_class is None:
+
+        import http.client
+
+        class UnixHTTPConnection(http.client.HTTPConnection):
+
+            def __init__(self, socket_path, timeout=60):
+                super().__init__("localhost", timeout=timeout)
+                self.socket_path = socket_path
+
+            def connect(self):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                self.sock = sock
+
+        _connection_class = UnixHTTPConnection
+
+    return _connection_class(socket_path, timeout)
+
+class DockerEngine:
+
+    """
+    Docker Engine API client. Connections are kept alive and reused, one per
+    thread, so concurrent callers don't serialize on a single socket.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=60):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+
+        """Returns this thread's connection, created on first use."""
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = unix_http_connection(self.socket_path, self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _reset(self):
+
+        """Drops this thread's connection, reconnects on next request."""
+
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def request(self, method, path, params=None, body=None, expected=(200,)):
+
+        """
+        Sends a request to the engine.
+
+        Args:
+            method (str): HTTP method.
+            path (str): API path without version prefix, e.g. '/info'.
+            params (dict, optional): Query parameters, dicts/lists are JSON-encoded.
+            body (dict, optional): JSON request body.
+            expected (tuple): Accepted HTTP status codes.
+
+        Returns decoded JSON, raw text for non-JSON responses, or None if empty.
+        Raises DockerEngineError on failure.
+        """
+
+        url = f"/{API_VERSION}{path}"
+        query = {key: json.dumps(value) if isinstance(value, (dict, list)) else value
+                 for key, value in (params or {}).items() if value is not None}
+        if query:
+            url = f"{url}?{urlencode(query)}"
+
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+
+        import http.client # loaded with the connection class, see unix_http_connection
+
+        start = time.perf_counter()
+
+        # retry once, the engine may have closed an idle keep-alive connection
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                connection.request(method, url, body=payload, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (BrokenPipeError, ConnectionResetError) as e: # incl. http.client.RemoteDisconnected
+                self._reset()
+                if attempt:
+                    raise DockerEngineError(f"{method} {path} failed: {e}")
+            except http.client.HTTPException as e: # e.g. BadStatusLine, not an OSError
+                self._reset()
+                raise DockerEngineError(f"{method} {path} failed: invalid response: {e!r}")
+            except OSError as e:
+                self._reset()
+                raise DockerEngineError(f"Docker engine unreachable at {self.socket_path}: {e}")
+
+        if tracing.is_enabled():
+            tracing.record(f"{method} {path}", "engine", start, time.perf_counter(), {"status": response.status})
+
+        text = data.decode(errors="replace")
+
+        if response.status not in expected:
+            try:
+                message = json.loads(text).get("message", text)
+            except ValueError:
+                message = text
+            raise DockerEngineError(f"{method} {path} failed ({response.status}): {message.strip()}", response.status)
+
+        if not text:
+            return None
+
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return json.loads(text)
+
+        return text
+
+    def ping(self):
+
+        """
+        Checks engine liveness. Returns True if the engine responds.
+        """
+
+        try:
+            return self.request("GET", "/_ping") == "OK"
+        except DockerEngineError:
+            return False
+
+    def info(self):
+
+        """Returns system-wide engine information."""
+
+        return self.request("GET", "/info")
+
+    def list_volumes(self, filters=None):
+
+        """
+        Lists volumes, optionally filtered engine-side.
+
+        Args:
+            filters (dict, optional): E.g. {"label": ["key=value"]}.
+
+        Returns list of volume dicts.
+        """
+
+        return self.request("GET", "/volumes", params={"filters": filters})["Volumes"] or []
+
+    def create_volume(self, name, labels=None):
+
+        """Creates a named local volume with optional labels."""
+
+        return self.request("POST", "/volumes/create", body={"Name": name, "Labels": labels or {}}, expected=(201,))
+
+    def remove_volume(self, name, force=False):
+
+        """Removes a volume by name."""
+
+        self.request("DELETE", f"/volumes/{quote(name)}", params={"force": str(force).lower()}, expected=(204,))
+
+    def list_containers(self, all=True, filters=None):
+
+        """
+        Lists containers, including stopped ones unless all is False.
+
+        Args:
+            all (bool): Include non-running containers.
+            filters (dict, optional): E.g. {"name": ["postgres"]}.
+
+        Returns list of container dicts.
+        """
+
+        return self.request("GET", "/containers/json", params={"all": str(all).lower(), "filters": filters})
+
+    def inspect_container(self, name):
+
+        """Returns low-level information of a container."""
+
+        return self.request("GET", f"/containers/{quote(name)}/json")
+
+    def container_stats(self, name):
+
+        """
+        Returns a single resource usage snapshot of a container, without
+        waiting for a second one to precompute CPU usage.
+        """
+
+        return self.request("GET", f"/containers/{quote(name)}/stats", params={"stream": "false", "one-shot": "true"})
+
+    def inspect_image(self, name):
+
+        """
+        Returns low-level information of an image, None if not present.
+        """
+
+        try:
+            return self.request("GET", f"/images/{quote(name, safe='/:@')}/json")
+        except DockerEngineError as e:
+            if e.status == 404:
+                return None
+            raise
+
+def resolve_socket_path():
+
+    """
+    Resolves the engine socket path from DOCKER_HOST.
+
+    Returns the path, or None if DOCKER_HOST points to a non-unix endpoint
+    or unix sockets are not supported on this platform.
+    """
+
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    docker_host = os.environ.get("DOCKER_HOST", "")
+
+    if not docker_host:
+        return DEFAULT_SOCKET_PATH
+
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://"):]
+
+    return None # tcp://, npipe:// and ssh:// are left to the docker CLI
+
+_engine = None
+_engine_resolved = False
+_engine_lock = threading.Lock()
+
+def get_engine():
+
+    """
+    Returns the shared per-process DockerEngine, or None if no engine socket
+    exists. Callers fall back to the docker CLI if None.
+    """
+
+    global _engine, _engine_resolved
+
+    with _engine_lock:
+        if not _engine_resolved:
+            socket_path = resolve_socket_path()
+            if socket_path and os.path.exists(socket_path):
+                _engine = DockerEngine(socket_path)
+            _engine_resolved = True
+
+    return _engine
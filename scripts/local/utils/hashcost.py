@@ -0,0 +1,157 @@
+"""
+hashcost.py
+
+Calibrates the password hashing cost to the host.
+
+- measure: Seconds per PBKDF2 iteration of an algorithm.
+- calibrate: Iterations per algorithm meeting a time budget per hash.
+- load_cost/write_cost: The chosen algorithm and iterations, stored in
+  './config/hash_cost.json' by calibrate_hashing.py. Without calibration
+  the Keycloak defaults apply.
+- password_policy: Keycloak realm password policy for a cost.
+
+The cost is a trade-off: every login verifies one hash in Keycloak, so a
+core handles about 1000 / <ms per hash> logins per second, while an
+offline attacker's guesses get slower by the same factor. Measured with
+OpenSSL via hashlib, Keycloak's Java implementation is usually slower.
+"""
+
+import hashlib
+import json
+import math
+import os
+import statistics
+import time
+
+# Keycloak hash algorithm ids to hashlib digests
+ALGORITHMS = {
+    "pbkdf2": "sha1",
+    "pbkdf2-sha256": "sha256",
+    "pbkdf2-sha512": "sha512"
+}
+
+# Keycloak defaults, used until the host is calibrated
+DEFAULT_ALGORITHM = "pbkdf2-sha256"
+DEFAULT_ITERATIONS = 27500
+
+# Default time budget per hash in milliseconds
+DEFAULT_TARGET_MS = 25.0
+
+# Lower bound for calibrated iterations (NIST SP 800-132), and rounding step
+MIN_ITERATIONS = 1000
+ITERATION_STEP = 500
+
+# Minimum duration of a single measurement, shorter ones are timer noise
+MIN_SAMPLE_SECONDS = 0.05
+
+# Calibration result, host-specific, next to the image list
+COST_FILE_PATH = './config/hash_cost.json'
+
+def time_hash(algorithm, iterations):
+
+    """Returns the seconds of one hash with the given cost."""
+
+    start = time.perf_counter()
+    hashlib.pbkdf2_hmac(ALGORITHMS[algorithm], b"calibration-secret", b"calibration-salt", iterations)
+    return time.perf_counter() - start
+
+def measure(algorithm, rounds=5):
+
+    """
+    Measures the seconds per iteration of an algorithm: grows the iteration
+    count until a hash takes MIN_SAMPLE_SECONDS, then takes the median of
+    'rounds' hashes.
+    """
+
+    iterations = 1000
+    while time_hash(algorithm, iterations) < MIN_SAMPLE_SECONDS:
+        iterations *= 2
+
+    return statistics.median(time_hash(algorithm, iterations) for _ in range(rounds)) / iterations
+
+def iterations_for(seconds_per_iteration, target_ms):
+
+    """
+    Returns the iterations closest to the time budget, rounded down to
+    ITERATION_STEP, at least MIN_ITERATIONS.
+    """
+
+    iterations = math.floor(target_ms / 1000 / seconds_per_iteration / ITERATION_STEP) * ITERATION_STEP
+    return max(MIN_ITERATIONS, iterations)
+
+def calibrate(target_ms=DEFAULT_TARGET_MS, algorithms=tuple(ALGORITHMS), rounds=5):
+
+    """
+    Calibrates each algorithm to the time budget and verifies the result.
+
+    Returns dict of algorithm to dict with 'iterations', 'ms_per_hash'
+    (measured at that cost) and 'us_per_iteration'.
+    """
+
+    results = {}
+    for algorithm in algorithms:
+
+        seconds_per_iteration = measure(algorithm, rounds)
+        iterations = iterations_for(seconds_per_iteration, target_ms)
+        ms_per_hash = statistics.median(time_hash(algorithm, iterations) for _ in range(rounds)) * 1000
+
+        results[algorithm] = {
+            "iterations": iterations,
+            "ms_per_hash": round(ms_per_hash, 2),
+            "us_per_iteration": round(seconds_per_iteration * 1e6, 4)
+        }
+
+    return results
+
+def load_cost(path=COST_FILE_PATH):
+
+    """
+    Reads the calibrated cost.
+
+    Returns dict with 'algorithm' and 'iterations', the Keycloak defaults if
+    the host is not calibrated.
+    """
+
+    try:
+        with open(path, 'r') as file:
+            cost = json.load(file)
+    except FileNotFoundError:
+        return {"algorithm": DEFAULT_ALGORITHM, "iterations": DEFAULT_ITERATIONS}
+
+    if cost.get("algorithm") not in ALGORITHMS or int(cost.get("iterations", 0)) < MIN_ITERATIONS:
+        raise ValueError(f"Invalid hash cost in {path}, run calibrate_hashing.py again")
+
+    return {"algorithm": cost["algorithm"], "iterations": int(cost["iterations"])}
+
+def write_cost(algorithm, target_ms, results, path=COST_FILE_PATH):
+
+    """
+    Writes the chosen algorithm with its calibrated iterations, and all
+    results for reference.
+    """
+
+    cost = {
+        "algorithm": algorithm,
+        "iterations": results[algorithm]["iterations"],
+        "target_ms": target_ms,
+        "calibrated": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "cpus": os.cpu_count(),
+        "results": results
+    }
+
+    with open(path, 'w', newline='\n') as file:
+        json.dump(cost, file, indent=2)
+        file.write('\n')
+
+def password_policy(cost, policy=None):
+
+    """
+    Returns a Keycloak password policy with the cost's hash algorithm and
+    iterations, keeping other rules of 'policy' (e.g. 'length(12)').
+    """
+
+    rules = [rule.strip() for rule in (policy or "").split(" and ") if rule.strip()]
+    rules = [rule for rule in rules if not rule.startswith(("hashAlgorithm(", "hashIterations("))]
+    rules += [f"hashAlgorithm({cost['algorithm']})", f"hashIterations({cost['iterations']})"]
+
+    return " and ".join(rules)
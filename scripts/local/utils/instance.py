@@ -0,0 +1,274 @@
+"""
+instance.py
+
+Isolated stack instances, e.g. for parallel test shards on one host.
+
+The default instance (no ID) is the stack as is: Compose project
+'avalanchecms', '.secrets', fixed host ports and 'environments/local/.env'.
+An instance with an ID gets its own:
+- Compose project 'avalanchecms-<id>', hence its own volumes and network.
+- Container names with the suffix '-<id>'.
+- Secrets directory '.secrets-<id>'.
+- Free host ports, allocated on first setup and kept until cleanup.
+- Compose env file '.secrets-<id>/compose.env' with all of the above,
+  passed to every 'docker compose' call of the instance.
+
+- select/current: Selects the instance for this process, all scripts
+  called in-process (e.g. start.py calling setup.py) share it.
+- add_instance_argument: '-i/--instance' option, default $AV_INSTANCE.
+- compose_command: 'docker compose' command line for the instance.
+- compose_profiles: Compose profiles the instance enables, e.g. 'pooler'.
+- allocate_ports/instance_env: Compose variables of a new instance.
+"""
+
+import os
+import re
+import socket
+import zlib
+
+# Compose project of the default instance, see docker-compose.yml
+PROJECT = "avalanchecms"
+
+# Host ports of the default instance, by compose variable
+DEFAULT_PORTS = {
+    "AV_POSTGRES_PORT": 5432,
+    "AV_PGADMIN_PORT": 5050,
+    "AV_KEYCLOAK_PORT": 8080,
+    "AV_PGBOUNCER_PORT": 6432
+}
+
+# Ports of other instances are allocated from here upwards
+PORT_RANGE_START = 20000
+PORT_RANGE_END = 30000
+
+# Instance IDs become part of container, volume and directory names
+INSTANCE_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]{0,30}$')
+
+# Compose env file of an instance, in its secrets directory
+COMPOSE_ENV_FILENAME = "compose.env"
+
+_current = None
+
+def select(instance_id):
+
+    """
+    Selects the instance for this process, None for the default instance.
+    Raises ValueError on invalid IDs.
+    """
+
+    global _current
+
+    if instance_id and not INSTANCE_ID_PATTERN.match(instance_id):
+        raise ValueError(f"Invalid instance ID: {instance_id}, use lower-case letters, digits and '-'")
+
+    _current = instance_id or None
+
+def current():
+
+    """Returns the selected instance ID, None for the default instance."""
+
+    return _current
+
+def project_root():
+
+    """Returns the project root, three levels above this module."""
+
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+def env_dir():
+
+    """Returns the directory of the docker-compose file."""
+
+    return os.path.join(project_root(), 'environments', 'local')
+
+def project_name():
+
+    """Returns the Compose project name of the instance."""
+
+    return f"{PROJECT}-{_current}" if _current else PROJECT
+
+def container_name(service):
+
+    """Returns the container name of a service in the instance."""
+
+    return f"{service}-{_current}" if _current else service
+
+def secrets_path():
+
+    """Returns the secrets directory of the instance."""
+
+    return os.path.join(project_root(), f".secrets-{_current}" if _current else ".secrets")
+
+def compose_env_path():
+
+    """Returns the Compose env file of the instance."""
+
+    if _current:
+        return os.path.join(secrets_path(), COMPOSE_ENV_FILENAME)
+    return os.path.join(env_dir(), '.env')
+
+def compose_command(*args):
+
+    """
+    Returns a 'docker compose' command line for the instance. The default
+    instance uses the plain command, Compose reads its '.env' by itself. The
+    env file of an instance is missing until setup, e.g. for the cleanup
+    of a clean start.
+    """
+
+    if not _current:
+        return ["docker", "compose", *args]
+
+    command = ["docker", "compose", "-p", project_name()]
+    if os.path.exists(compose_env_path()):
+        command += ["--env-file", compose_env_path()]
+    return command + list(args)
+
+def read_compose_env(path):
+
+    """
+    Reads a Compose env file. Returns dict, empty if there is none.
+    """
+
+    try:
+        with open(path, 'r') as file:
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        return {}
+
+    values = {}
+    for line in lines:
+        if '=' in line and not line.lstrip().startswith('#'):
+            key, value = line.split('=', 1)
+            values[key.strip()] = value.strip()
+    return values
+
+def compose_profiles():
+
+    """
+    Returns the Compose profiles of the instance, from COMPOSE_PROFILES in
+    the environment like Compose, or in its env file (see setup.py --pooler).
+    """
+
+    profiles = os.environ.get("COMPOSE_PROFILES") or read_compose_env(compose_env_path()).get("COMPOSE_PROFILES", "")
+    return [profile.strip() for profile in profiles.split(",") if profile.strip()]
+
+def ports():
+
+    """
+    Returns the host ports of the instance, by compose variable.
+    """
+
+    values = read_compose_env(compose_env_path())
+    return {key: int(values.get(key, default)) for key, default in DEFAULT_PORTS.items()}
+
+def reserved_ports():
+
+    """
+    Returns the ports recorded by all instances, running or not.
+    """
+
+    root = project_root()
+    reserved = set(DEFAULT_PORTS.values())
+
+    for name in os.listdir(root):
+        if name.startswith(".secrets-"):
+            values = read_compose_env(os.path.join(root, name, COMPOSE_ENV_FILENAME))
+            reserved.update(int(values[key]) for key in DEFAULT_PORTS if values.get(key, "").isdigit())
+
+    return reserved
+
+def is_port_free(port):
+
+    """Checks if a TCP port can be bound on all interfaces, like Docker does."""
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("", port))
+            return True
+        except OSError:
+            return False
+
+def allocate_ports():
+
+    """
+    Allocates a free host port per service, skipping ports recorded by
+    other instances, which may be stopped. The search starts at a block
+    derived from the instance ID, so shards set up concurrently don't race
+    for the same ports.
+
+    Returns dict of compose variable to port, raises RuntimeError if the
+    range is exhausted.
+    """
+
+    reserved = reserved_ports()
+    size = PORT_RANGE_END - PORT_RANGE_START
+    offset = zlib.crc32(_current.encode()) % (size // len(DEFAULT_PORTS)) * len(DEFAULT_PORTS)
+    allocated = {}
+    tried = 0
+
+    for key in DEFAULT_PORTS:
+        while True:
+            candidate = PORT_RANGE_START + (offset + tried) % size
+            tried += 1
+            if tried > size:
+                raise RuntimeError(f"No free ports in {PORT_RANGE_START}-{PORT_RANGE_END}")
+            if candidate not in reserved and is_port_free(candidate):
+                break
+        allocated[key] = candidate
+
+    return allocated
+
+def instance_env():
+
+    """
+    Returns the Compose variables of the selected instance: project,
+    container suffix, secrets directory and host ports. Ports already
+    recorded are kept, missing ones allocated. Empty for the default
+    instance.
+    """
+
+    if not _current:
+        return {}
+
+    recorded = read_compose_env(compose_env_path())
+    allocated = ports() if all(key in recorded for key in DEFAULT_PORTS) else allocate_ports()
+
+    return {
+        "COMPOSE_PROJECT_NAME": project_name(),
+        "AV_INSTANCE_SUFFIX": f"-{_current}",
+        "AV_SECRETS_DIR": secrets_path(),
+        **{key: str(port) for key, port in allocated.items()}
+    }
+
+def localize_urls(text):
+
+    """
+    Replaces the default instance's host URLs (e.g. 'host.docker.internal:5050')
+    in text with the instance's ports.
+    """
+
+    for key, port in ports().items():
+        text = text.replace(f"host.docker.internal:{DEFAULT_PORTS[key]}", f"host.docker.internal:{port}")
+    return text
+
+def add_instance_argument(parser):
+
+    """
+    Adds the '-i/--instance' option to an argparse parser.
+    """
+
+    parser.add_argument('-i', '--instance', type=str, metavar='ID', default=os.environ.get('AV_INSTANCE'),
+                        help="Isolated stack instance, e.g. a test shard (default: $AV_INSTANCE or the default stack).")
+
+def select_from_args(parser, args):
+
+    """
+    Selects the instance given by add_instance_argument, reports invalid
+    IDs as argument errors.
+    """
+
+    try:
+        select(args.instance)
+    except ValueError as e:
+        parser.error(str(e))
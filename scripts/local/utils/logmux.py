@@ -0,0 +1,169 @@
+"""
+logmux.py
+
+Multiplexes the logs of stack services into one filtered stream.
+
+- LogMultiplexer: Follows each service's logs in a reader thread, keeps the
+  most recent lines per service in a bounded ring buffer, and echoes lines
+  matching the service and level filters.
+- line_level: Detects the log level of a line.
+
+Memory stays bounded however long the stack runs: each buffer holds at most
+'buffer_lines' lines of at most MAX_LINE_LENGTH characters.
+"""
+
+import re
+import subprocess
+import threading
+from collections import deque
+from .instance import compose_command
+from .output import emit, print
+
+# Lines kept per service
+DEFAULT_BUFFER_LINES = 500
+
+# Longer lines are truncated, e.g. Keycloak dumps whole stack traces per line
+MAX_LINE_LENGTH = 4096
+
+# Log levels in ascending order of severity
+LEVELS = ("debug", "info", "warning", "error")
+
+# Level keywords of Postgres, Keycloak (Quarkus) and pgAdmin (gunicorn)
+LEVEL_KEYWORDS = {
+    "TRACE": "debug", "DEBUG": "debug",
+    "INFO": "info", "LOG": "info", "NOTICE": "info",
+    "WARN": "warning", "WARNING": "warning",
+    "ERROR": "error", "SEVERE": "error", "CRITICAL": "error", "FATAL": "error", "PANIC": "error"
+}
+
+LEVEL_PATTERN = re.compile(r'\b(' + '|'.join(LEVEL_KEYWORDS) + r')\b')
+
+def line_level(line):
+
+    """
+    Returns the level of a log line, None if it has no level keyword (e.g.
+    stack trace lines).
+    """
+
+    match = LEVEL_PATTERN.search(line)
+    return LEVEL_KEYWORDS[match.group(1)] if match else None
+
+class LogMultiplexer:
+
+    """
+    Follows 'docker compose logs' of several services concurrently.
+
+    Args:
+        services (iterable): Services to follow.
+        cwd (str): Directory of the docker-compose file.
+        echo (bool): Print matching lines as they arrive.
+        show_services (iterable, optional): Only echo these services.
+        level (str, optional): Only echo lines of this level or higher.
+        buffer_lines (int): Ring buffer size per service.
+    """
+
+    def __init__(self, services, cwd, echo=True, show_services=None, level=None, buffer_lines=DEFAULT_BUFFER_LINES):
+
+        if level is not None and level not in LEVELS:
+            raise ValueError(f"Unknown log level: {level}")
+
+        self.services = list(services)
+        self.cwd = cwd
+        self.echo = echo
+        self.show_services = set(show_services) if show_services else None
+        self.min_level = LEVELS.index(level) if level else 0
+        self.buffers = {service: deque(maxlen=buffer_lines) for service in self.services}
+        self.width = max(len(service) for service in self.services)
+        self._lock = threading.Lock()
+        self._processes = []
+        self._threads = []
+
+    def start(self):
+
+        """
+        Starts one 'docker compose logs -f' process and reader thread per
+        service. Returns immediately.
+        """
+
+        for service in self.services:
+
+            process = subprocess.Popen(compose_command("logs", "-f", "--no-color", "--no-log-prefix", service),
+                                       cwd=self.cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, errors="replace", bufsize=1)
+
+            thread = threading.Thread(target=self._read, args=(service, process.stdout), daemon=True)
+            thread.start()
+
+            self._processes.append(process)
+            self._threads.append(thread)
+
+    def _read(self, service, stream):
+
+        """
+        Reads a service's log stream until it ends, buffers and echoes lines.
+        """
+
+        level = LEVELS.index("info") # unlabeled lines inherit the last level
+
+        for line in stream:
+
+            line = line.rstrip('\n')[:MAX_LINE_LENGTH]
+            detected = line_level(line)
+            if detected:
+                level = LEVELS.index(detected)
+
+            with self._lock:
+                self.buffers[service].append((level, line))
+
+            if self.echo and level >= self.min_level and (self.show_services is None or service in self.show_services):
+                emit("service_log", f"{service:<{self.width}} | {line}", service=service, line=line,
+                     log_level=LEVELS[level])
+
+    def recent(self, service):
+
+        """Returns the buffered lines of a service, oldest first."""
+
+        with self._lock:
+            return [line for _, line in self.buffers.get(service, ())]
+
+    def dump(self, service, status=None):
+
+        """
+        Prints the buffered lines of a service, regardless of filters. Used
+        when a service fails its healthcheck.
+        """
+
+        lines = self.recent(service)
+        print(f"--- Last {len(lines)} log lines of {service}{f' ({status})' if status else ''} ---")
+        for line in lines:
+            print(f"{service:<{self.width}} | {line}")
+        print(f"--- End of {service} logs ---")
+
+    def wait(self):
+
+        """
+        Blocks until all log streams ended, e.g. the containers stopped.
+        """
+
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(0.5) # short joins keep CTRL+C responsive
+
+    def stop(self):
+
+        """
+        Stops following the logs.
+        """
+
+        for process in self._processes:
+            if process.poll() is None:
+                process.terminate()
+
+        for process in self._processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+        for thread in self._threads:
+            thread.join(timeout=1)
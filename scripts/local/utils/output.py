@@ -1,18 +1,233 @@
 """
 output.py
 
-Improves logging.
+Output layer of the lifecycle scripts.
 
-- print: Flushes print messages instantly.
+- print: Prints a message at a level, drop-in for builtins.print.
+- emit: Emits a structured event, as its text message or, in JSON mode, as
+  one JSON object per line with the event's fields.
+- configure: Sets the minimum level, flush policy and format.
+- add_output_arguments/configure_output: '-q/--quiet', '--json' and
+  '--flush' options.
+- streams_commands/command_output: Whether external commands may write to
+  the terminal, and forwarding of their captured output otherwise.
+
+Flush policies: 'line' flushes every message, 'interval' at most every
+FLUSH_INTERVAL seconds and 'end' only on exit. The default is 'line' on a
+terminal and 'interval' otherwise (e.g. CI logs), which saves a write per
+line. Writes are serialized, so threads never interleave within a line.
 """
 
+import atexit
 import builtins
+import json
+import os
+import sys
+import threading
+import time
+
+# Levels in ascending order of severity
+LEVELS = ("debug", "info", "warning", "error")
+
+FLUSH_POLICIES = ("line", "interval", "end")
+
+# Max seconds between flushes with the 'interval' policy
+FLUSH_INTERVAL = 1.0
+
+_config = {"level": "info", "flush": None, "json": False}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_pending = False
+_flusher = None
+
+def configure(level=None, flush=None, json_mode=None):
+
+    """
+    Sets output options, arguments left None are unchanged.
+
+    Args:
+        level (str): Minimum level of printed messages and events.
+        flush (str): Flush policy, see FLUSH_POLICIES.
+        json_mode (bool): Write events as JSON lines instead of text.
+    """
+
+    if level is not None:
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level: {level}")
+        _config["level"] = level
+
+    if flush is not None:
+        if flush not in FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy: {flush}")
+        _config["flush"] = flush
+
+    if json_mode is not None:
+        _config["json"] = json_mode
+
+def is_json():
+
+    """Returns True if events are written as JSON lines."""
+
+    return _config["json"]
+
+def enabled(level):
+
+    """Returns True if messages of a level are printed."""
+
+    return LEVELS.index(level) >= LEVELS.index(_config["level"])
 
-def print(*args, **kwargs):
-    
+def flush_policy():
+
+    """Returns the flush policy, resolving the default for the stream."""
+
+    if _config["flush"]:
+        return _config["flush"]
+    try:
+        return "line" if sys.stdout.isatty() else "interval"
+    except (AttributeError, ValueError):
+        return "line"
+
+def _flush_periodically():
+
+    """
+    Flushes pending output every FLUSH_INTERVAL seconds, so the last lines
+    before a long wait show up with the 'interval' policy.
+    """
+
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if _pending:
+            flush()
+
+def _write(text, force_flush=False):
+
+    """
+    Writes text to stdout and flushes per the flush policy.
     """
-    Modified print for instant output. Adds 'flush=True'.
+
+    global _last_flush, _pending, _flusher
+
+    with _lock:
+        sys.stdout.write(text)
+
+        policy = flush_policy()
+        now = time.monotonic()
+
+        if force_flush or policy == "line" or (policy == "interval" and now - _last_flush >= FLUSH_INTERVAL):
+            sys.stdout.flush()
+            _last_flush = now
+            _pending = False
+        else:
+            _pending = True
+
+        if policy == "interval" and _flusher is None:
+            _flusher = threading.Thread(target=_flush_periodically, daemon=True)
+            _flusher.start()
+
+def emit(event, message=None, level="info", **fields):
+
+    """
+    Emits a structured event.
+
+    Args:
+        event (str): Event name, e.g. 'image_pulled'.
+        message (str, optional): Text form, events without one are silent
+            in text mode.
+        level (str): Event level, filtered by the minimum level.
+        fields: JSON-serializable event data.
     """
-    
-    kwargs.setdefault('flush', True)
-    return builtins.print(*args, **kwargs)
+
+    if not enabled(level):
+        return
+
+    if _config["json"]:
+        record = {"ts": round(time.time(), 3), "level": level, "event": event, **fields}
+        if message is not None:
+            record["message"] = message
+        _write(json.dumps(record, default=str) + "\n")
+    elif message is not None:
+        _write(f"{message}\n")
+
+def print(*args, level="info", **kwargs):
+
+    """
+    Modified print, writes through the output layer: filtered by level,
+    flushed per the flush policy, a 'message' event in JSON mode.
+    Prints to other files (e.g. stderr) are passed through.
+    """
+
+    file = kwargs.pop('file', None)
+    force_flush = kwargs.pop('flush', False)
+
+    if file is not None and file is not sys.stdout:
+        return builtins.print(*args, file=file, flush=force_flush, **kwargs)
+
+    if not enabled(level):
+        return
+
+    message = kwargs.get('sep', ' ').join(str(arg) for arg in args)
+
+    if _config["json"]:
+        emit("message", message, level=level)
+    else:
+        _write(message + kwargs.get('end', '\n'), force_flush=force_flush)
+
+def streams_commands():
+
+    """
+    Returns True if external commands may write to the terminal directly,
+    i.e. in text mode without '--quiet'.
+    """
+
+    return not _config["json"] and enabled("info")
+
+def command_output(command, returncode, stdout=None, stderr=None):
+
+    """
+    Forwards the captured output of an external command: as an event in JSON
+    mode, and in full on failure, so '--quiet' still shows why it failed.
+    """
+
+    level = "info" if returncode == 0 else "error"
+    text = "\n".join(part.strip() for part in (stdout, stderr) if part and part.strip())
+
+    if _config["json"]:
+        emit("command_output", level=level, command=" ".join(command), returncode=returncode, output=text)
+    elif returncode != 0 and text:
+        emit("command_output", text, level=level)
+
+def add_output_arguments(parser):
+
+    """
+    Adds the '-q/--quiet', '--json' and '--flush' options to an argparse
+    parser.
+    """
+
+    parser.add_argument('-q', '--quiet', action='store_true', help="Prints warnings and errors only.")
+    parser.add_argument('--json', action='store_true', help="Writes output as a JSON event stream, one object per line.")
+    parser.add_argument('--flush', choices=FLUSH_POLICIES, default=os.environ.get('AV_OUTPUT_FLUSH'),
+                        help="Output flush policy (default: line on a terminal, interval otherwise).")
+
+def configure_output(args):
+
+    """
+    Applies the options added by add_output_arguments.
+    """
+
+    configure(level="warning" if args.quiet else "info", flush=args.flush, json_mode=args.json)
+
+def flush():
+
+    """Flushes pending output, e.g. before a command writes to the terminal."""
+
+    global _last_flush, _pending
+
+    with _lock:
+        try:
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            pass
+        _last_flush = time.monotonic()
+        _pending = False
+
+atexit.register(flush)
@@ -0,0 +1,170 @@
+"""
+pgtuning.py
+
+Derives a PostgreSQL tuning profile from the resources available to Docker.
+
+- host_resources: CPU count and memory, from the Docker engine if reachable
+  (the VM size on Docker Desktop), otherwise from the host OS.
+- tune: Settings for memory, WAL, parallel workers and connections.
+- format_config: Renders settings as a postgresql.conf file.
+"""
+
+import os
+from .engine import DockerEngineError, get_engine
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# Assumed memory if neither the engine nor the OS reports it
+FALLBACK_MEMORY = 4 * GB
+
+# Tuning profiles:
+# - memory_share: Share of memory given to Postgres, the rest of the stack
+#   (Keycloak, pgAdmin, IDE) needs the remainder.
+# - memory_cap: Upper bound for the Postgres memory budget.
+# - max_connections: Connection limit, load tests run many concurrent clients.
+# - max_parallel_per_gather: Upper bound for parallel workers per query.
+# - min/max_wal_size: WAL kept between checkpoints.
+PROFILES = {
+    "laptop": {
+        "memory_share": 0.25,
+        "memory_cap": 2 * GB,
+        "max_connections": 50,
+        "max_parallel_per_gather": 2,
+        "min_wal_size": 256 * MB,
+        "max_wal_size": 1 * GB
+    },
+    "load-test": {
+        "memory_share": 0.5,
+        "memory_cap": 16 * GB,
+        "max_connections": 200,
+        "max_parallel_per_gather": 4,
+        "min_wal_size": 1 * GB,
+        "max_wal_size": 4 * GB
+    }
+}
+
+DEFAULT_PROFILE = "laptop"
+
+def host_resources():
+
+    """
+    Detects CPU count and memory available to containers.
+
+    Returns tuple (cpus, memory bytes, source), source is 'docker', 'os' or
+    'fallback'.
+    """
+
+    engine = get_engine()
+
+    if engine is not None:
+        try:
+            info = engine.info()
+            if info.get("NCPU") and info.get("MemTotal"):
+                return info["NCPU"], info["MemTotal"], "docker"
+        except DockerEngineError:
+            pass
+
+    cpus = os.cpu_count() or 1
+
+    try:
+        return cpus, os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"), "os"
+    except (AttributeError, ValueError, OSError):
+        return cpus, FALLBACK_MEMORY, "fallback" # no sysconf on Windows
+
+def format_size(size):
+
+    """
+    Formats bytes as a Postgres memory unit, e.g. '512MB', '64kB'.
+    """
+
+    for unit, factor in (("GB", GB), ("MB", MB)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+
+    return f"{max(64, size // 1024)}kB"
+
+def round_mb(size, minimum=MB):
+
+    """Rounds bytes down to whole MB, at least 'minimum'."""
+
+    return max(minimum, size // MB * MB)
+
+def tune(cpus, memory, profile=DEFAULT_PROFILE):
+
+    """
+    Calculates Postgres settings for the given resources and profile.
+
+    Args:
+        cpus (int): CPUs available.
+        memory (int): Memory available in bytes.
+        profile (str): Key of PROFILES.
+
+    Returns dict of setting to value, sizes in bytes.
+    """
+
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown Postgres profile: {profile}")
+
+    params = PROFILES[profile]
+
+    budget = min(int(memory * params["memory_share"]), params["memory_cap"])
+    connections = params["max_connections"]
+    per_gather = max(1, min(params["max_parallel_per_gather"], cpus // 2))
+
+    shared_buffers = round_mb(budget // 4, 32 * MB)
+
+    # each connection may run a few sorts/hashes at once, per parallel worker
+    work_mem = max(4 * MB, (budget - shared_buffers) // (connections * 3 * per_gather) // MB * MB)
+
+    return {
+        "max_connections": connections,
+        "shared_buffers": shared_buffers,
+        "effective_cache_size": round_mb(budget * 3 // 4),
+        "work_mem": work_mem,
+        "maintenance_work_mem": min(2 * GB, round_mb(budget // 16, 64 * MB)),
+        "wal_buffers": min(16 * MB, max(64 * 1024, shared_buffers // 32)),
+        "min_wal_size": params["min_wal_size"],
+        "max_wal_size": params["max_wal_size"],
+        "checkpoint_completion_target": 0.9,
+        "max_worker_processes": max(8, cpus),
+        "max_parallel_workers": cpus,
+        "max_parallel_workers_per_gather": per_gather,
+        "max_parallel_maintenance_workers": per_gather,
+        "random_page_cost": 1.1, # container volumes live on SSDs
+        "effective_io_concurrency": 200
+    }
+
+# Settings rendered with memory units
+SIZE_SETTINGS = ("shared_buffers", "effective_cache_size", "work_mem", "maintenance_work_mem",
+                 "wal_buffers", "min_wal_size", "max_wal_size")
+
+def format_settings(settings):
+
+    """
+    Formats settings as 'name = value' lines, sizes with memory units.
+    """
+
+    return [f"{name} = {format_size(value) if name in SIZE_SETTINGS else value}"
+            for name, value in settings.items()]
+
+def format_config(settings, profile, cpus, memory, base_config=None):
+
+    """
+    Renders a postgresql.conf. The file replaces the server's config file,
+    so it first includes 'base_config' (the config written by initdb) and
+    overrides it with the tuned settings.
+    """
+
+    lines = [
+        "# Generated by setup.py, changes are overwritten.",
+        f"# Profile: {profile}, CPUs: {cpus}, memory: {format_size(round_mb(memory))}",
+        ""
+    ]
+
+    if base_config:
+        lines += [f"include_if_exists '{base_config}'", ""]
+
+    lines += ["listen_addresses = '*'"] + format_settings(settings)
+
+    return "\n".join(lines) + "\n"
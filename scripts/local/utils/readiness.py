@@ -0,0 +1,150 @@
+"""
+readiness.py
+
+Waits for stack containers to report healthy via their Docker healthchecks.
+
+- active_services: Stack services of the selected instance, incl. those of
+  enabled compose profiles (pgbouncer with the pooler).
+- container_status: Current status of a service's container ('healthy',
+  'starting', 'unhealthy', 'exited', 'missing', ...), in the selected
+  instance, see instance.py.
+- wait_for_services: Watches containers concurrently, returns time-to-ready
+  per service.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .engine import DockerEngineError, get_engine
+from .instance import compose_profiles, container_name
+from .output import emit, print
+from .tracing import phase, run
+
+# Stack services with healthchecks, container names of the default instance
+STACK_SERVICES = ("postgres", "keycloak", "pgadmin")
+
+# Services of optional compose profiles, by profile
+PROFILE_SERVICES = {"pooler": ("pgbouncer",)}
+
+# All services, e.g. for argument choices
+ALL_SERVICES = STACK_SERVICES + tuple(service for services in PROFILE_SERVICES.values() for service in services)
+
+# Default time to wait for all services, Keycloak's first realm import is slow
+DEFAULT_READY_TIMEOUT = 300
+
+# Statuses after which waiting is pointless
+FAILED_STATUSES = ("unhealthy", "exited", "dead", "missing")
+
+def active_services():
+
+    """
+    Returns the services the instance's stack runs: STACK_SERVICES and those
+    of its compose profiles, see instance.compose_profiles.
+    """
+
+    services = list(STACK_SERVICES)
+    for profile in compose_profiles():
+        services += PROFILE_SERVICES.get(profile, ())
+    return tuple(services)
+
+def container_status(name):
+
+    """
+    Fetches a service container's health status, or its state if it is not
+    running or has no healthcheck. Returns 'missing' if the container
+    doesn't exist.
+    """
+
+    name = container_name(name)
+    engine = get_engine()
+
+    if engine is not None:
+        try:
+            state = engine.inspect_container(name)["State"]
+        except DockerEngineError as e:
+            if e.status == 404:
+                return "missing"
+            raise
+    else:
+        result = run(["docker", "inspect", "--format", "{{json .State}}", name], capture_output=True, text=True)
+        if result.returncode != 0:
+            return "missing"
+        state = json.loads(result.stdout)
+
+    if state.get("Status") != "running":
+        return state.get("Status", "missing")
+
+    health = state.get("Health")
+    return health["Status"] if health else "running"
+
+def wait_for_service(name, started, deadline, interval):
+
+    """
+    Polls one container until it is healthy, failed or the deadline passes.
+
+    Returns tuple (name, status, seconds since 'started').
+    """
+
+    with phase(f"wait {name}", category="readiness"):
+        while True:
+
+            status = container_status(name)
+
+            # containers without healthcheck count as ready once running
+            if status in ("healthy", "running") or status in FAILED_STATUSES:
+                return name, status, time.perf_counter() - started
+
+            if time.perf_counter() >= deadline:
+                return name, "timeout", time.perf_counter() - started
+
+            time.sleep(interval)
+
+def wait_for_services(services=None, timeout=DEFAULT_READY_TIMEOUT, interval=1.0, started=None, on_failure=None):
+
+    """
+    Waits concurrently for services to become healthy and reports
+    time-to-ready per service as each one settles.
+
+    Args:
+        services (iterable, optional): Container names, active_services() by default.
+        timeout (float): Seconds to wait overall.
+        interval (float): Seconds between status polls per service.
+        started (float, optional): perf_counter() reference, e.g. when
+            'compose up' was issued. Defaults to now.
+        on_failure (callable, optional): Called with (name, status) for each
+            service that doesn't become ready, e.g. to dump its logs.
+
+    Returns dict of service to (status, seconds).
+    """
+
+    services = services or active_services()
+    started = started if started is not None else time.perf_counter()
+    deadline = time.perf_counter() + timeout
+    results = {}
+
+    print(f"Waiting for services: {', '.join(services)}")
+
+    with ThreadPoolExecutor(max_workers=len(services)) as executor:
+
+        futures = [executor.submit(wait_for_service, name, started, deadline, interval) for name in services]
+
+        for future in as_completed(futures):
+            name, status, seconds = future.result()
+            results[name] = (status, seconds)
+            if status in ("healthy", "running"):
+                emit("service_ready", f"Ready: {name} in {seconds:.1f}s", service=name, status=status, seconds=round(seconds, 3))
+            else:
+                emit("service_not_ready", f"Not ready: {name} is {status} after {seconds:.1f}s", level="error",
+                     service=name, status=status, seconds=round(seconds, 3))
+                if on_failure:
+                    on_failure(name, status)
+
+    return results
+
+def all_ready(results):
+
+    """
+    Checks if all results of wait_for_services are ready.
+    """
+
+    return all(status in ("healthy", "running") for status, _ in results.values())
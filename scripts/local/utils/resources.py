@@ -0,0 +1,238 @@
+"""
+resources.py
+
+CPU and memory limits and usage of the stack's containers.
+
+- load_profiles/compose_env: Per-service limits of a profile in
+  './config/resource_limits.json', as the compose variables read by
+  docker-compose.yml.
+- parse_size: Docker memory sizes like '512m' in bytes.
+- StatsReader: CPU and memory usage per container, from the engine's stats
+  endpoint or 'docker stats' without engine socket.
+- summarize: Average and peak per service of a series of samples.
+"""
+
+import json
+import math
+import os
+import re
+import statistics
+from .engine import DockerEngineError, get_engine
+from . import instance
+from . import tracing
+
+# Limit profiles, by name, of service to {"cpus": float, "memory": size}
+LIMITS_PATH = os.path.join(instance.project_root(), 'scripts', 'local', 'config', 'resource_limits.json')
+
+# No limits, the stack may use all resources of Docker
+DEFAULT_PROFILE = "none"
+
+# Services with limit variables in docker-compose.yml
+LIMITED_SERVICES = ("postgres", "pgbouncer", "pgadmin", "keycloak")
+
+MB = 1024 * 1024
+
+# Docker memory units, case-insensitive, optional 'b' suffix (e.g. '2g', '512MB')
+SIZE_PATTERN = re.compile(r'^\s*([0-9.]+)\s*([kmgt]?)i?b?\s*$', re.IGNORECASE)
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+def load_profiles(path=LIMITS_PATH):
+
+    """Returns the limit profiles, by name."""
+
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def parse_size(size):
+
+    """
+    Parses a memory size, a number of bytes or a string like '1536m' or
+    'docker stats' output like '512MiB'.
+    Raises ValueError on invalid sizes.
+    """
+
+    if isinstance(size, (int, float)):
+        return int(size)
+
+    match = SIZE_PATTERN.match(str(size))
+    if not match:
+        raise ValueError(f"Invalid memory size: {size}")
+
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+def service_limits(profile, path=LIMITS_PATH):
+
+    """
+    Returns the limits of a profile, by service, memory in bytes. Raises
+    ValueError on unknown profiles, services or sizes.
+    """
+
+    profiles = load_profiles(path)
+    if profile not in profiles:
+        raise ValueError(f"Unknown resource profile: {profile}, see {path}")
+
+    limits = {}
+    for service, limit in profiles[profile].items():
+        if service not in LIMITED_SERVICES:
+            raise ValueError(f"Unknown service in resource profile {profile}: {service}")
+        limits[service] = {
+            "cpus": float(limit["cpus"]) if limit.get("cpus") else None,
+            "memory": parse_size(limit["memory"]) if limit.get("memory") else None
+        }
+
+    return limits
+
+def compose_env(limits, max_cpus=None):
+
+    """
+    Returns the compose variables of limits, e.g. 'AV_POSTGRES_CPUS' and
+    'AV_POSTGRES_MEMORY'. Unlimited services get None, i.e. the variable is
+    removed. CPUs are capped at 'max_cpus', Docker rejects more than the
+    engine has.
+    """
+
+    values = {}
+    for service in LIMITED_SERVICES:
+        limit = limits.get(service, {})
+        cpus = limit.get("cpus")
+        if cpus and max_cpus:
+            cpus = min(cpus, max_cpus)
+        values[f"AV_{service.upper()}_CPUS"] = f"{cpus:g}" if cpus else None
+        values[f"AV_{service.upper()}_MEMORY"] = f"{limit['memory'] // MB}m" if limit.get("memory") else None
+    return values
+
+def cap_resources(cpus, memory, limit):
+
+    """
+    Returns the CPUs and memory a container gets within a host's 'cpus' and
+    'memory' under a service limit, e.g. for Postgres tuning.
+    """
+
+    if limit and limit.get("cpus"):
+        cpus = min(cpus, max(1, math.ceil(limit["cpus"])))
+    if limit and limit.get("memory"):
+        memory = min(memory, limit["memory"])
+    return cpus, memory
+
+def cpu_percent(previous, current):
+
+    """
+    Calculates CPU usage in percent of one core, like 'docker stats', from
+    two engine stats of a container. None without previous stats.
+    """
+
+    if not previous:
+        return None
+
+    cpu_delta = current["cpu_stats"]["cpu_usage"]["total_usage"] - previous["cpu_stats"]["cpu_usage"]["total_usage"]
+    system_delta = current["cpu_stats"].get("system_cpu_usage", 0) - previous["cpu_stats"].get("system_cpu_usage", 0)
+    online = current["cpu_stats"].get("online_cpus") or len(current["cpu_stats"]["cpu_usage"].get("percpu_usage") or [1])
+
+    if cpu_delta < 0 or system_delta <= 0:
+        return 0.0
+    return cpu_delta / system_delta * online * 100
+
+def memory_usage(stats):
+
+    """
+    Returns the memory used by a container without its page cache, like
+    'docker stats' (cgroup v2: inactive_file, v1: total_inactive_file).
+    """
+
+    memory = stats.get("memory_stats", {})
+    usage = memory.get("usage", 0)
+    details = memory.get("stats", {})
+    inactive = details.get("inactive_file", details.get("total_inactive_file", 0))
+    return usage - inactive if inactive < usage else usage
+
+class StatsReader:
+
+    """
+    Reads CPU and memory usage of containers. Keeps the previous engine
+    stats per container, CPU usage is the average since the last read.
+    """
+
+    def __init__(self):
+        self.engine = get_engine()
+        self.previous = {}
+
+    def read(self, container):
+
+        """
+        Reads one container via the engine.
+
+        Returns dict with 'cpu' (percent of one core, None on the first read),
+        'memory' and 'memory_limit' in bytes, or None if the container is
+        not running.
+        """
+
+        try:
+            stats = self.engine.container_stats(container)
+        except DockerEngineError as e:
+            if e.status in (404, 409):
+                return None
+            raise
+
+        if not stats or not stats.get("memory_stats"): # stopped containers report empty stats
+            return None
+
+        sample = {
+            "cpu": cpu_percent(self.previous.get(container), stats),
+            "memory": memory_usage(stats),
+            "memory_limit": stats["memory_stats"].get("limit")
+        }
+        self.previous[container] = stats
+        return sample
+
+    def read_cli(self, containers):
+
+        """
+        Reads containers in one 'docker stats' call, which averages CPU
+        usage over about a second itself. Returns dict of container to
+        sample, running containers only.
+        """
+
+        # all running containers, named missing ones would fail the call
+        result = tracing.run(["docker", "stats", "--no-stream", "--format", "{{json .}}"], capture_output=True, text=True)
+
+        samples = {}
+        for line in result.stdout.splitlines():
+            try:
+                stats = json.loads(line)
+                if stats["Name"] not in containers:
+                    continue
+                used, limit = stats["MemUsage"].split(" / ")
+                samples[stats["Name"]] = {
+                    "cpu": float(stats["CPUPerc"].rstrip("%")),
+                    "memory": parse_size(used),
+                    "memory_limit": parse_size(limit)
+                }
+            except (ValueError, KeyError):
+                continue # e.g. '--' of a starting container
+        return samples
+
+def summarize(samples):
+
+    """
+    Summarizes samples, dicts with 'service', 'cpu' and 'memory_mb'.
+
+    Returns dict of service to dict with 'samples', 'cpu_avg', 'cpu_peak',
+    'memory_avg_mb' and 'memory_peak_mb'.
+    """
+
+    by_service = {}
+    for sample in samples:
+        by_service.setdefault(sample["service"], []).append(sample)
+
+    summary = {}
+    for service, rows in by_service.items():
+        cpu = [row["cpu"] for row in rows if row["cpu"] is not None]
+        memory = [row["memory_mb"] for row in rows]
+        summary[service] = {
+            "samples": len(rows),
+            "cpu_avg": round(statistics.mean(cpu), 1) if cpu else None,
+            "cpu_peak": round(max(cpu), 1) if cpu else None,
+            "memory_avg_mb": round(statistics.mean(memory), 1),
+            "memory_peak_mb": round(max(memory), 1)
+        }
+    return summary
@@ -0,0 +1,180 @@
+"""
+taskgraph.py
+
+Runs lifecycle steps as a dependency graph of tasks, independent tasks run
+concurrently in threads.
+
+- TaskGraph: Tasks with dependencies, run until all are settled.
+- TaskGraphError: Raised if a task failed, dependents are cancelled.
+
+Tasks must not change process-wide state such as the working directory,
+pass 'cwd' to subprocesses instead.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .output import emit, print
+from .tracing import phase
+
+class TaskGraphError(RuntimeError):
+
+    """
+    Raised if tasks failed. 'failed' and 'cancelled' list task names.
+    """
+
+    def __init__(self, failed, cancelled):
+        message = f"Tasks failed: {', '.join(failed)}"
+        if cancelled:
+            message += f", cancelled: {', '.join(cancelled)}"
+        super().__init__(message)
+        self.failed = failed
+        self.cancelled = cancelled
+
+class TaskGraph:
+
+    """
+    Dependency graph of tasks. Dependencies must be added before their
+    dependents, which keeps the graph acyclic.
+    """
+
+    def __init__(self):
+        self.tasks = {} # name to (func, deps), in insertion order
+        self.results = {} # name to dict with 'status', 'start', 'end', 'error'
+
+    def add(self, name, func, deps=()):
+
+        """
+        Adds a task.
+
+        Args:
+            name (str): Unique task name.
+            func (callable): Called without arguments, a task fails if it
+                raises (including SystemExit).
+            deps (iterable): Names of tasks that must succeed first, unknown
+                names are ignored so optional tasks can be referenced.
+        """
+
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task: {name}")
+
+        self.tasks[name] = (func, [dep for dep in deps if dep in self.tasks])
+
+    def _run_task(self, name):
+
+        """
+        Runs one task, returns its result dict.
+        """
+
+        func, _ = self.tasks[name]
+        start = time.perf_counter()
+
+        try:
+            with phase(f"task {name}", category="task"):
+                func()
+            return {"status": "done", "start": start, "end": time.perf_counter(), "error": None}
+        except BaseException as e: # sys.exit in a task must not end the worker thread silently
+            error = f"exit code {e.code}" if isinstance(e, SystemExit) else str(e) or type(e).__name__
+            return {"status": "failed", "start": start, "end": time.perf_counter(), "error": error}
+
+    def _ready(self, pending):
+
+        """
+        Cancels pending tasks with a failed or cancelled dependency, until
+        nothing changes. Returns pending tasks whose dependencies are done.
+        """
+
+        changed = True
+        while changed:
+            changed = False
+            for name in list(pending):
+                if any(self.results.get(dep, {}).get("status") in ("failed", "cancelled") for dep in self.tasks[name][1]):
+                    self.results[name] = {"status": "cancelled", "start": None, "end": None, "error": None}
+                    pending.remove(name)
+                    emit("task", f"Task cancelled: {name}", level="warning", task=name, status="cancelled")
+                    changed = True
+
+        return [name for name in pending
+                if all(self.results.get(dep, {}).get("status") == "done" for dep in self.tasks[name][1])]
+
+    def run(self, workers=None):
+
+        """
+        Runs all tasks, each as soon as its dependencies are done, and
+        reports the critical path.
+
+        Args:
+            workers (int, optional): Max concurrent tasks, default all.
+
+        Returns dict of task name to result. Raises TaskGraphError if a
+        task failed.
+        """
+
+        pending = list(self.tasks)
+        running = {}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=workers or max(1, len(self.tasks))) as executor:
+            while True:
+
+                for name in self._ready(pending):
+                    pending.remove(name)
+                    running[executor.submit(self._run_task, name)] = name
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    name = running.pop(future)
+                    result = self.results[name] = future.result()
+                    seconds = round(result["end"] - result["start"], 3)
+                    if result["status"] == "done":
+                        emit("task", f"Task done: {name} in {seconds:.1f}s", task=name, status="done", seconds=seconds)
+                    else:
+                        emit("task", f"Task failed: {name}, {result['error']}", level="error",
+                             task=name, status="failed", seconds=seconds, error=result["error"])
+
+        self.report(time.perf_counter() - start)
+
+        failed = [name for name, result in self.results.items() if result["status"] == "failed"]
+        if failed:
+            cancelled = [name for name, result in self.results.items() if result["status"] == "cancelled"]
+            raise TaskGraphError(failed, cancelled)
+
+        return self.results
+
+    def critical_path(self):
+
+        """
+        Returns the chain of finished tasks that determined the total time:
+        from the last finished task, back through the dependency that
+        finished last.
+        """
+
+        finished = {name: result for name, result in self.results.items() if result["end"] is not None}
+        if not finished:
+            return []
+
+        path = [max(finished, key=lambda name: finished[name]["end"])]
+
+        while True:
+            deps = [dep for dep in self.tasks[path[-1]][1] if dep in finished]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda dep: finished[dep]["end"]))
+
+        return path[::-1]
+
+    def report(self, total):
+
+        """
+        Prints the critical path with per-task durations.
+        """
+
+        path = self.critical_path()
+        if not path:
+            return
+
+        steps = " -> ".join(f"{name} ({self.results[name]['end'] - self.results[name]['start']:.1f}s)" for name in path)
+        emit("critical_path", f"Critical path: {steps}, total {total:.1f}s.", tasks=path, seconds=round(total, 3))
@@ -0,0 +1,164 @@
+"""
+tracing.py
+
+Phase-level tracing for the lifecycle scripts.
+
+- phase: Context manager timing a named phase.
+- traced: Decorator timing a function as a phase.
+- run: subprocess.run wrapper timing external commands, see output.py for
+  their terminal output.
+- add_profile_argument/start_profile: '--profile' flag, writes all recorded
+  events as Chrome trace JSON (chrome://tracing, Perfetto) on exit.
+
+Recording is off unless enabled, the wrappers then only add a flag check.
+"""
+
+import atexit
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from . import output
+from .output import print
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+def enable():
+
+    """
+    Enables event recording for this process.
+    """
+
+    global _enabled
+    _enabled = True
+
+def is_enabled():
+
+    """Returns True if events are recorded."""
+
+    return _enabled
+
+def record(name, category, start, end, args=None):
+
+    """
+    Records a complete event, times from time.perf_counter().
+    """
+
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X", # complete event: start and duration
+        "ts": round((start - _origin) * 1e6),
+        "dur": round((end - start) * 1e6),
+        "pid": os.getpid(),
+        "tid": threading.get_ident()
+    }
+    if args:
+        event["args"] = args
+
+    with _lock:
+        _events.append(event)
+
+@contextmanager
+def phase(name, category="phase", **args):
+
+    """
+    Times the enclosed block as a named phase.
+    """
+
+    if not _enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, category, start, time.perf_counter(), args)
+
+def traced(func):
+
+    """
+    Decorator timing each call of func as a phase named after it.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with phase(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+def run(command, **kwargs):
+
+    """
+    Runs an external command like subprocess.run and times it.
+
+    Output not redirected by the caller is captured and forwarded through
+    the output layer if commands must not write to the terminal ('--json',
+    '--quiet').
+    """
+
+    with phase(" ".join(command[:2]), category="command", command=" ".join(command)):
+
+        if output.streams_commands() or any(key in kwargs for key in ("stdout", "stderr", "capture_output")):
+            output.flush() # keeps buffered lines ahead of the command's output
+            return subprocess.run(command, **kwargs)
+
+        check = kwargs.pop("check", False)
+        result = subprocess.run(command, capture_output=True, text=True, errors="replace", **kwargs)
+        output.command_output(command, result.returncode, result.stdout, result.stderr)
+
+        if check:
+            result.check_returncode()
+        return result
+
+def events():
+
+    """Returns a copy of the recorded events."""
+
+    with _lock:
+        return list(_events)
+
+def write_profile(path):
+
+    """
+    Writes recorded events as Chrome trace JSON to path.
+    """
+
+    with open(path, 'w', newline='\n') as file:
+        json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, file)
+
+def add_profile_argument(parser):
+
+    """
+    Adds the '--profile' option to an argparse parser.
+    """
+
+    parser.add_argument('--profile', type=str, metavar='PATH',
+                        help="Writes a Chrome trace JSON profile of all phases and commands.")
+
+def start_profile(path):
+
+    """
+    Enables recording and writes the profile to path on exit. No-op if path
+    is None.
+    """
+
+    if not path:
+        return
+
+    enable()
+    path = os.path.abspath(path) # scripts change directories while running
+
+    def write():
+        write_profile(path)
+        print(f"Profile written: {path}")
+
+    atexit.register(write)